@@ -0,0 +1,198 @@
+"""冷数据归档：开场已久的场次，其订单和订单座位搬到单独的 SQLite 文件。
+
+    ARCHIVE_DB_URL=sqlite:///./archive.db python -m app.archive [--days 90] [--batch 50] [--vacuum]
+
+归档库以 schema 名 archive 挂在每个连接上（见 database._attach_archive），表结构同
+orders / order_seats，多一列 archived_at，不带外键。搬迁按场次分批，每批一个事务：
+
+    INSERT OR REPLACE INTO archive.xxx SELECT ... FROM xxx   然后删掉热表里的这些行
+
+- 只搬已是终态的订单（PAID / CANCELED / EXPIRED）；未支付订单留在热表，等 reaper 处理后下次再搬。
+- 场次、影厅、座位这些维度表不动：行数有限，汇总、导出和订单历史都要和它们 JOIN。
+- seat_holds / hold_groups / ga_holds 是临时数据，开跑前按过期清理删掉，不归档。
+- section_counters、seat_bitmaps、ga_inventories 的已售计数保留；选座场次归档后不再接受锁座
+  （已售座位不在热表里了，见 is_archived）。
+
+读订单的地方通过 order_models() 同时读热表和归档表：订单历史、管理端导出、销售汇总重建。
+已归档的订单不能再支付或取消，按订单不存在处理。
+"""
+import logging
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import DateTime, Index, Integer, String, delete, insert, literal, select
+from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column
+
+from .config import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH, ARCHIVE_DB_URL
+from .models import Order, OrderSeat, Showtime
+from .time_utils import now_utc
+
+log = logging.getLogger(__name__)
+
+SCHEMA = "archive"
+
+
+class ArchiveBase(DeclarativeBase):
+    """归档表单独一份元数据：没配归档库时 Base.metadata.create_all 不会去建它们。"""
+
+
+class ArchivedOrder(ArchiveBase):
+    __tablename__ = "orders"
+    id: Mapped[str] = mapped_column(String(40), primary_key=True)
+    user_id: Mapped[int] = mapped_column(Integer)
+    showtime_id: Mapped[int] = mapped_column(Integer, index=True)
+    status: Mapped[str] = mapped_column(String(20))
+    total_cents: Mapped[int] = mapped_column(Integer, default=0)
+    ticket_code: Mapped[str] = mapped_column(String(64), default="")
+    created_at: Mapped[datetime] = mapped_column(DateTime)
+    quantity: Mapped[int] = mapped_column(Integer, default=0)
+    pay_deadline: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    paid_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    archived_at: Mapped[datetime] = mapped_column(DateTime)
+
+    # 订单历史按用户倒序翻
+    __table_args__ = (Index("ix_archive_orders_user_created", "user_id", "created_at"), {"schema": SCHEMA})
+
+
+class ArchivedOrderSeat(ArchiveBase):
+    __tablename__ = "order_seats"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    order_id: Mapped[str] = mapped_column(String(40), index=True)
+    showtime_id: Mapped[int] = mapped_column(Integer)
+    seat_id: Mapped[int] = mapped_column(Integer)
+
+    __table_args__ = {"schema": SCHEMA}
+
+
+_ORDER_COLUMNS = [c.name for c in Order.__table__.columns]
+_SEAT_COLUMNS = [c.name for c in OrderSeat.__table__.columns]
+
+
+def enabled() -> bool:
+    return bool(ARCHIVE_DB_URL)
+
+
+def ensure_schema() -> None:
+    """在归档库里建表和索引（已存在的跳过）。"""
+    from .database import engine
+
+    ArchiveBase.metadata.create_all(engine)
+
+
+def order_models() -> list[tuple[type, type]]:
+    """(订单模型, 订单座位模型)：热表在前，启用归档时再加上归档表。两边列名一致，可以同样查询。"""
+    models: list[tuple[type, type]] = [(Order, OrderSeat)]
+    if enabled():
+        models.append((ArchivedOrder, ArchivedOrderSeat))
+    return models
+
+
+def horizon(days: float = ARCHIVE_AFTER_DAYS) -> datetime:
+    """开场时间早于这个时刻的场次可以归档（naive UTC）。"""
+    return now_utc() - timedelta(days=days)
+
+
+def is_archived(show: Showtime) -> bool:
+    """场次是否已过归档期限。归档随时可能在跑，过了期限就按已归档对待。"""
+    return enabled() and show.start_time < horizon()
+
+
+def _candidates(sess: Session, before: datetime) -> list[int]:
+    return list(
+        sess.scalars(
+            select(Order.showtime_id)
+            .join(Showtime, Order.showtime_id == Showtime.id)
+            .where(Showtime.start_time < before, Order.status != "CREATED")
+            .distinct()
+            .order_by(Order.showtime_id)
+        )
+    )
+
+
+def archive_batch(sess: Session, showtime_ids: list[int], archived_at: datetime) -> tuple[int, int]:
+    """把这些场次的终态订单连同订单座位搬进归档库，返回 (订单数, 座位数)。调用方提交。"""
+    moved = select(Order.id).where(Order.showtime_id.in_(showtime_ids), Order.status != "CREATED")
+    # 先写归档再删热表，同一事务；OR REPLACE 让中断后重跑不会撞主键
+    sess.execute(
+        insert(ArchivedOrderSeat)
+        .prefix_with("OR REPLACE")
+        .from_select(_SEAT_COLUMNS, select(*(OrderSeat.__table__.c[c] for c in _SEAT_COLUMNS)).where(
+            OrderSeat.order_id.in_(moved)
+        ))
+    )
+    sess.execute(
+        insert(ArchivedOrder)
+        .prefix_with("OR REPLACE")
+        .from_select(
+            [*_ORDER_COLUMNS, "archived_at"],
+            select(*(Order.__table__.c[c] for c in _ORDER_COLUMNS), literal(archived_at, DateTime)).where(
+                Order.showtime_id.in_(showtime_ids), Order.status != "CREATED"
+            ),
+        )
+    )
+    seats = sess.execute(delete(OrderSeat).where(OrderSeat.order_id.in_(moved))).rowcount
+    orders = sess.execute(
+        delete(Order).where(Order.showtime_id.in_(showtime_ids), Order.status != "CREATED")
+    ).rowcount
+    return orders, seats
+
+
+def archive_showtimes(sess: Session, before: datetime, batch: int = ARCHIVE_BATCH) -> dict:
+    """归档开场早于 before 的场次，每 batch 个场次提交一次。"""
+    from .ga import cleanup_expired_ga_holds
+    from .utils import cleanup_expired_holds
+
+    t0 = time.perf_counter()
+    # 临时数据直接清掉：过期锁座（所有场次，不只是要归档的）
+    cleanup_expired_holds(sess)
+    cleanup_expired_ga_holds(sess)
+    sess.commit()
+
+    ids = _candidates(sess, before)
+    orders = seats = 0
+    archived_at = now_utc()
+    for i in range(0, len(ids), batch):
+        chunk = ids[i:i + batch]
+        o, s = archive_batch(sess, chunk, archived_at)
+        sess.commit()
+        orders += o
+        seats += s
+        log.info("已归档场次 %d/%d：本批订单 %d，座位 %d", min(i + batch, len(ids)), len(ids), o, s)
+    return {
+        "showtimes": len(ids),
+        "orders": orders,
+        "seats": seats,
+        "ms": round((time.perf_counter() - t0) * 1000, 1),
+    }
+
+
+def main() -> None:
+    import argparse
+
+    from .database import SessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="把开场已久的场次的订单搬进归档库")
+    parser.add_argument("--days", type=float, default=ARCHIVE_AFTER_DAYS,
+                        help="开场超过多少天的场次归档（默认 ARCHIVE_AFTER_DAYS）")
+    parser.add_argument("--batch", type=int, default=ARCHIVE_BATCH, help="每个事务搬多少个场次")
+    parser.add_argument("--vacuum", action="store_true", help="搬完后 VACUUM 主库，把空间还给文件系统")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if not enabled():
+        parser.error("未配置 ARCHIVE_DB_URL")
+    if args.days < ARCHIVE_AFTER_DAYS:
+        # 锁座拦截按 ARCHIVE_AFTER_DAYS 判断，归档更近的场次会放过对它们的锁座
+        parser.error(f"--days 不能小于 ARCHIVE_AFTER_DAYS={ARCHIVE_AFTER_DAYS:g}")
+    ensure_schema()
+    with SessionLocal() as sess:
+        report = archive_showtimes(sess, horizon(args.days), batch=args.batch)
+    log.info("归档完成：场次 %(showtimes)d，订单 %(orders)d，座位 %(seats)d，用时 %(ms).1f ms", report)
+    if args.vacuum:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            conn.exec_driver_sql("VACUUM main")
+        log.info("主库 VACUUM 完成")
+
+
+if __name__ == "__main__":
+    main()
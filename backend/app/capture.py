@@ -0,0 +1,223 @@
+"""流量录制：把线上请求按顺序追加到 NDJSON 文件，供 tools/replay.py 回放。
+
+配置 CAPTURE_PATH 才启用。每个请求一行：
+
+    {"t": 1718000000.123, "m": "POST", "p": "/showtimes/3/hold", "q": "", "r": "/showtimes/{showtime_id}/hold",
+     "u": 42, "ct": "application/json", "b": "{\\"seat_ids\\":[1,2]}", "s": 200, "ms": 12.3, "n": 96,
+     "ids": {"hold_token": "..."}}
+
+- 抽样按用户：crc32(用户 id) 决定录不录，同一用户的 hold -> checkout -> pay 整条链路
+  要么全录要么全不录，回放时才接得上；匿名请求按随机数抽。
+- 不记令牌原文，只记解出来的用户 id（"u"），回放时用目标环境的密钥重新签发；
+  令牌无效记 "invalid"。请求体里的 password 字段替换成 <redacted>。
+- 请求体超过 CAPTURE_MAX_BODY 只记长度 "bl"；二进制请求体（上传）用 base64 记在 "b64"。
+- POST 成功时从响应里摘出新生成的字符串 id（订单号、锁座令牌），记在 "ids"，
+  回放时把后续请求里的旧值替换成新值。注册、登录这类还没带令牌的请求，从响应里认出
+  是哪个用户记在 "as"，回放时和该用户后面的请求排在同一条链上。
+- 多个 worker 可以写同一个文件：缓冲满 64KB 或超过 1 秒才落盘，每次一个 O_APPEND 的 write。
+"""
+import atexit
+import base64
+import json
+import os
+import random
+import threading
+import time
+import zlib
+
+from jose import JWTError, jwt
+
+from .config import CAPTURE_MAX_BODY, CAPTURE_SAMPLE, JWT_ALG, JWT_SECRET
+from .fast_json import dumps
+from .request_metrics import route_template
+
+REDACTED = "<redacted>"
+REDACT_FIELDS = frozenset({"password"})
+# 响应里这些字段的字符串值会记下来给回放做替换
+ID_FIELDS = ("id", "hold_token")
+SKIP_PREFIXES = ("/static", "/metrics")
+_RESPONSE_PEEK = 4096
+
+
+class CaptureLog:
+    """追加写的缓冲文件，线程安全。"""
+
+    def __init__(self, path: str, flush_bytes: int = 64 * 1024, flush_seconds: float = 1.0):
+        self.path = path
+        self.flush_bytes = flush_bytes
+        self.flush_seconds = flush_seconds
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._buf: list[bytes] = []
+        self._size = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def write(self, record: dict) -> None:
+        line = dumps(record) + b"\n"
+        with self._lock:
+            self._buf.append(line)
+            self._size += len(line)
+            if self._size >= self.flush_bytes or time.monotonic() - self._last_flush >= self.flush_seconds:
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        if self._buf:
+            os.write(self._fd, b"".join(self._buf))
+            self._buf.clear()
+            self._size = 0
+        self._last_flush = time.monotonic()
+
+
+def _sampled(user, rate: float) -> bool:
+    if rate >= 1:
+        return True
+    if isinstance(user, int):
+        return zlib.crc32(str(user).encode()) / 0xFFFFFFFF < rate
+    return random.random() < rate
+
+
+def _redact(value):
+    if isinstance(value, dict):
+        return {k: REDACTED if k in REDACT_FIELDS else _redact(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_redact(v) for v in value]
+    return value
+
+
+def _encode_body(body: bytes, content_type: str) -> dict:
+    if not body:
+        return {}
+    if "json" in content_type:
+        try:
+            return {"b": json.dumps(_redact(json.loads(body)), ensure_ascii=False, separators=(",", ":"))}
+        except ValueError:
+            pass
+    try:
+        text = body.decode("utf-8")
+    except UnicodeDecodeError:
+        return {"b64": base64.b64encode(body).decode("ascii")}
+    if "password=" in text:  # 表单登录
+        return {"b": REDACTED}
+    return {"b": text}
+
+
+def _user_from_token(token: str):
+    try:
+        return int(jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALG])["sub"])
+    except (JWTError, KeyError, ValueError):
+        return "invalid"
+
+
+def _user_of(headers: dict):
+    auth = headers.get(b"authorization")
+    if not auth:
+        return None
+    scheme, _, token = auth.decode("latin-1").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return "invalid"
+    return _user_from_token(token)
+
+
+def _from_response(body: bytes) -> dict:
+    """POST 成功的响应里摘出新 id，以及登录 / 注册得到的用户。"""
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+    out = {}
+    ids = {k: data[k] for k in ID_FIELDS if isinstance(data.get(k), str)}
+    if ids:
+        out["ids"] = ids
+    if isinstance(data.get("access_token"), str):
+        user = _user_from_token(data["access_token"])
+        if isinstance(user, int):
+            out["as"] = user
+    elif isinstance(data.get("id"), int) and "email" in data:
+        out["as"] = data["id"]
+    return out
+
+
+class TrafficCapture:
+    """ASGI 中间件：抽中的请求结束后写一行录制记录。"""
+
+    def __init__(self, app, path: str, sample: float = CAPTURE_SAMPLE, max_body: int = CAPTURE_MAX_BODY):
+        self.app = app
+        self.log = CaptureLog(path)
+        self.sample = sample
+        self.max_body = max_body
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(SKIP_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        user = _user_of(headers)
+        if not _sampled(user, self.sample):
+            await self.app(scope, receive, send)
+            return
+
+        body = bytearray()
+        body_len = 0
+        status = 500
+        size = 0
+        resp_json = False
+        resp_peek = bytearray()
+
+        async def receive_wrapper():
+            nonlocal body_len
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                body_len += len(chunk)
+                if body_len <= self.max_body:
+                    body.extend(chunk)
+            return message
+
+        async def send_wrapper(message):
+            nonlocal status, size, resp_json
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                ctype = dict(message.get("headers", [])).get(b"content-type", b"")
+                resp_json = b"json" in ctype
+            elif message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                if resp_json and len(resp_peek) < _RESPONSE_PEEK:
+                    resp_peek.extend(chunk[: _RESPONSE_PEEK - len(resp_peek)])
+            await send(message)
+
+        root_path = scope.get("root_path", "")
+        wall = time.time()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            ctype = headers.get(b"content-type", b"").decode("latin-1")
+            record = {
+                "t": round(wall, 3),
+                "m": scope["method"],
+                "p": scope["path"],
+                "q": scope["query_string"].decode("latin-1"),
+                "r": route_template(scope, root_path),
+                "u": user,
+                "ct": ctype,
+                "s": status,
+                "ms": round(elapsed_ms, 2),
+                "n": size,
+            }
+            if body_len > self.max_body:
+                record["bl"] = body_len
+            else:
+                record.update(_encode_body(bytes(body), ctype))
+            if scope["method"] == "POST" and 200 <= status < 300 and resp_json and size <= _RESPONSE_PEEK:
+                record.update(_from_response(bytes(resp_peek)))
+            self.log.write(record)
@@ -0,0 +1,255 @@
+"""目录批量导入：把 NDJSON / CSV 里的电影、演唱会、漫展按 (kind, title) 新建或更新。
+
+    POST /admin/catalog/import?format=csv&dry_run=true     请求体就是文件内容，边收边处理
+    python -m app.catalog_import movies.ndjson [--dry-run]
+
+每行字段同 schemas.CatalogRowIn：kind、title 必填，其余可选。CSV 第一行是表头。
+空值（CSV 的空单元格、NDJSON 的 null 或缺省）表示不改这一列，新建时取表的默认值。
+电影写 movies 表（没有 venue / price_info，这两列忽略），演唱会和漫展写 events 表。
+
+每 IMPORT_BATCH_SIZE 行一批：逐行校验，一条查询找出批内已存在的 (kind, title)，
+新的一条批量 INSERT，已有的按主键一条批量 UPDATE，然后提交。
+- 批内同一 (kind, title) 出现多次时合并成一条，后面的值覆盖前面的，计数只算一次。
+- 库里同标题有多条的老数据只更新 id 最小的那条。
+- 某批写入失败只回滚这一批，整批的行记为出错，之前提交的批次保留。
+"""
+import csv
+import json
+import logging
+from collections.abc import Iterable, Iterator
+
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from .config import IMPORT_BATCH_SIZE, IMPORT_MAX_ERRORS
+from .models import Event, Movie
+from .schemas import CatalogRowIn
+from .sql_profiler import capture_queries
+
+log = logging.getLogger(__name__)
+
+FORMATS = ("ndjson", "csv")
+MOVIE_COLUMNS = ("title", "category", "description", "poster_url", "status", "duration_min", "rating")
+EVENT_COLUMNS = (*MOVIE_COLUMNS, "venue", "price_info")
+
+
+def iter_lines(chunks: Iterable[bytes]) -> Iterator[str]:
+    """把任意切分的字节块拼成一行行文本。保留换行符，CSV 引号里的换行要靠它。"""
+    buf = bytearray()
+    first = True
+    for chunk in chunks:
+        buf += chunk
+        if b"\n" not in chunk:
+            continue
+        *lines, rest = buf.split(b"\n")
+        buf = bytearray(rest)
+        for line in lines:
+            text = line.decode("utf-8", errors="replace") + "\n"
+            if first:
+                text = text.removeprefix("\ufeff")  # 导出的 CSV 带 BOM
+                first = False
+            yield text
+    if buf:
+        text = buf.decode("utf-8", errors="replace")
+        yield text.removeprefix("\ufeff") if first else text
+
+
+def _ndjson_records(lines: Iterable[str]):
+    for no, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            raw = json.loads(line)
+        except ValueError as e:
+            yield no, None, f"不是合法的 JSON：{e}"
+            continue
+        if not isinstance(raw, dict):
+            yield no, None, "每行应是一个 JSON 对象"
+            continue
+        yield no, raw, None
+
+
+def _csv_records(lines: Iterable[str]):
+    reader = csv.DictReader(lines)
+    if reader.fieldnames:
+        reader.fieldnames = [f.strip().lower() for f in reader.fieldnames]
+    for raw in reader:
+        if None in raw:  # 多出来的单元格没有对应的表头
+            yield reader.line_num, None, "列数比表头多"
+            continue
+        yield reader.line_num, {k: v for k, v in raw.items() if v not in (None, "")}, None
+
+
+def parse_records(lines: Iterable[str], fmt: str):
+    """产出 (行号, 原始 dict 或 None, 解析错误或 None)。"""
+    return _csv_records(lines) if fmt == "csv" else _ndjson_records(lines)
+
+
+def _validation_message(e: ValidationError) -> str:
+    return "；".join(f"{'.'.join(str(p) for p in err['loc']) or '行'}: {err['msg']}" for err in e.errors())
+
+
+class CatalogImporter:
+    """逐行喂入，攒满一批就写入并提交；最后调 finish() 拿报告。"""
+
+    def __init__(self, sess: Session, dry_run: bool = False, batch_size: int = IMPORT_BATCH_SIZE,
+                 max_errors: int = IMPORT_MAX_ERRORS):
+        self.sess = sess
+        self.dry_run = dry_run
+        self.batch_size = batch_size
+        self.max_errors = max_errors
+        self.rows = self.inserted = self.updated = self.failed = 0
+        self.errors: list[dict] = []
+        self._batch: list[tuple[int, CatalogRowIn]] = []
+        # dry_run 不落库：记下前面批次"会新建"的键，后面再出现时按更新算
+        self._planned: set[tuple[str, str]] = set()
+
+    def feed(self, records) -> None:
+        for line, raw, error in records:
+            self.rows += 1
+            row = None
+            if error is None:
+                if any(isinstance(v, str) and "\ufffd" in v for v in raw.values()):
+                    error = "不是合法的 UTF-8 文本"
+                else:
+                    try:
+                        row = CatalogRowIn.model_validate(raw)
+                    except ValidationError as e:
+                        error = _validation_message(e)
+            if row is None:
+                self._error(line, error, raw)
+                continue
+            self._batch.append((line, row))
+            if len(self._batch) >= self.batch_size:
+                # 每批的语句单独计数，批数多了不算 N+1
+                with capture_queries():
+                    self._flush()
+
+    def finish(self) -> dict:
+        with capture_queries():
+            self._flush()
+        return {
+            "rows": self.rows,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "failed": self.failed,
+            "dry_run": self.dry_run,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+    def _error(self, line: int, error: str, raw: dict | None) -> None:
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            raw = raw or {}
+            self.errors.append(
+                {
+                    "line": line,
+                    "error": error,
+                    "kind": str(raw["kind"])[:20] if raw.get("kind") is not None else None,
+                    "title": str(raw["title"])[:200] if raw.get("title") is not None else None,
+                }
+            )
+
+    def _flush(self) -> None:
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+        merged: dict[tuple[str, str], dict] = {}
+        for _, row in batch:
+            merged.setdefault((row.kind, row.title), {}).update(row.model_dump(exclude={"kind"}, exclude_none=True))
+        counts = [0, 0]  # 新建、更新，提交成功后才计入
+        try:
+            movies = [(key, fields) for key, fields in merged.items() if key[0] == "movie"]
+            events = [(key, fields) for key, fields in merged.items() if key[0] != "movie"]
+            if movies:
+                existing = dict(
+                    self.sess.execute(
+                        select(Movie.title, func.min(Movie.id))
+                        .where(Movie.title.in_([title for (_, title), _ in movies]))
+                        .group_by(Movie.title)
+                    ).all()
+                )
+                self._upsert(Movie, MOVIE_COLUMNS, movies, lambda key: existing.get(key[1]), counts)
+            if events:
+                existing = {
+                    (kind, title): eid
+                    for kind, title, eid in self.sess.execute(
+                        select(Event.kind, Event.title, func.min(Event.id))
+                        .where(
+                            Event.kind.in_({kind for (kind, _), _ in events}),
+                            Event.title.in_([title for (_, title), _ in events]),
+                        )
+                        .group_by(Event.kind, Event.title)
+                    )
+                }
+                self._upsert(Event, EVENT_COLUMNS, events, existing.get, counts, with_kind=True)
+            if self.dry_run:
+                self.sess.rollback()
+            else:
+                self.sess.commit()
+        except SQLAlchemyError as e:
+            self.sess.rollback()
+            log.warning("目录导入第 %d-%d 行写入失败：%s", batch[0][0], batch[-1][0], e)
+            for line, row in batch:
+                self._error(line, f"写入失败（整批回滚）：{e.__class__.__name__}", row.model_dump())
+            return
+        self.inserted += counts[0]
+        self.updated += counts[1]
+
+    def _upsert(self, model, columns, items, find_id, counts: list[int], with_kind: bool = False) -> None:
+        new, old = [], []
+        for key, fields in items:
+            values = {c: fields[c] for c in columns if c in fields}
+            row_id = find_id(key)
+            if row_id is not None:
+                old.append({"id": row_id, **values})
+            elif key in self._planned:
+                counts[1] += 1
+            else:
+                new.append({**values, "kind": key[0]} if with_kind else values)
+                if self.dry_run:
+                    self._planned.add(key)
+        if not self.dry_run:
+            # 都是 executemany：一批新建一条 INSERT，一批更新一条按主键的 UPDATE
+            if new:
+                self.sess.execute(insert(model), new)
+            if old:
+                self.sess.execute(update(model), old)
+        counts[0] += len(new)
+        counts[1] += len(old)
+
+
+def import_catalog(sess: Session, chunks: Iterable[bytes], fmt: str, dry_run: bool = False) -> dict:
+    importer = CatalogImporter(sess, dry_run=dry_run)
+    importer.feed(parse_records(iter_lines(chunks), fmt))
+    return importer.finish()
+
+
+def main() -> None:
+    import argparse
+
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="批量导入电影 / 演唱会 / 漫展")
+    parser.add_argument("path", help="NDJSON 或 CSV 文件")
+    parser.add_argument("--format", choices=FORMATS, help="不填按扩展名判断")
+    parser.add_argument("--dry-run", action="store_true", help="只校验并统计，不写库")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    fmt = args.format or ("csv" if args.path.lower().endswith(".csv") else "ndjson")
+    with open(args.path, "rb") as f, SessionLocal() as sess:
+        report = import_catalog(sess, iter(lambda: f.read(1024 * 1024), b""), fmt, dry_run=args.dry_run)
+    for err in report["errors"]:
+        log.warning("第 %d 行：%s", err["line"], err["error"])
+    log.info(
+        "共 %d 行：新建 %d，更新 %d，出错 %d%s",
+        report["rows"], report["inserted"], report["updated"], report["failed"], "（dry run，未写库）" if args.dry_run else "",
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,79 @@
 import os
+from pathlib import Path
 
 DB_URL = os.getenv("DB_URL", "sqlite:///./app.db")
+# 只读副本；不配置时读写都走主库
+REPLICA_DB_URL = os.getenv("REPLICA_DB_URL", "")
+# 用户写入后这段时间内的读请求仍走主库（read-your-writes）
+REPLICA_STICKY_SECONDS = float(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+# 本地两个 SQLite 文件时，模拟复制的同步间隔（秒），0 表示不启动
+REPLICA_SYNC_SECONDS = float(os.getenv("REPLICA_SYNC_SECONDS", "0"))
+# 连接池参数（主库和副本共用）
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "-1"))  # 秒，-1 表示不回收
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "0").lower() in ("1", "true", "yes")
+# 启动时发现库未初始化是否自动执行 seed；默认关闭，部署前单独跑 python -m app.seed（本地开发可设 AUTO_SEED=1）
+AUTO_SEED = os.getenv("AUTO_SEED", "0").lower() in ("1", "true", "yes")
+# 并发 seed 时没抢到锁的进程等对方完成的最长时间（秒）
+SEED_WAIT_SECONDS = float(os.getenv("SEED_WAIT_SECONDS", "120"))
+# worker 启动（不含 import）的耗时预算，超出会打 warning
+STARTUP_BUDGET_MS = int(os.getenv("STARTUP_BUDGET_MS", "100"))
+# SQL 统计：按请求记查询次数和耗时，返回 Server-Timing 头
+SQL_PROFILE = os.getenv("SQL_PROFILE", "1").lower() in ("1", "true", "yes")
+# 单条语句超过这个耗时（毫秒）连同参数打日志
+SQL_SLOW_MS = float(os.getenv("SQL_SLOW_MS", "100"))
+# 同一请求里同一条语句执行到这个次数就按 N+1 报警
+SQL_N_PLUS_ONE = int(os.getenv("SQL_N_PLUS_ONE", "5"))
+# 流量录制：写到这个 NDJSON 文件，空表示关闭（回放见 tools/replay.py）
+CAPTURE_PATH = os.getenv("CAPTURE_PATH", "")
+# 按用户抽样的比例，同一用户的请求要么全录要么全不录
+CAPTURE_SAMPLE = float(os.getenv("CAPTURE_SAMPLE", "1"))
+# 请求体超过这个字节数只记长度，回放时跳过
+CAPTURE_MAX_BODY = int(os.getenv("CAPTURE_MAX_BODY", str(64 * 1024)))
 JWT_SECRET = os.getenv("JWT_SECRET", "dev-secret-change-me")
 JWT_ALG = "HS256"
 HOLD_MINUTES = int(os.getenv("HOLD_MINUTES", "15"))
+# 下单后多少分钟内必须支付，超时订单由 reaper 取消并释放座位
+ORDER_PAY_MINUTES = int(os.getenv("ORDER_PAY_MINUTES", "15"))
+# reaper 后台扫描间隔（秒），0 表示不在 worker 里跑（改用 python -m app.reaper 定时执行）
+REAPER_INTERVAL_SECONDS = float(os.getenv("REAPER_INTERVAL_SECONDS", "30"))
+# 变更流：NDJSON 长连接轮询 outbox 的间隔（秒）和每页条数
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "0.5"))
+OUTBOX_PAGE_SIZE = int(os.getenv("OUTBOX_PAGE_SIZE", "500"))
+# reaper 每个事务最多处理的订单数
+REAPER_BATCH = int(os.getenv("REAPER_BATCH", "500"))
+# 订单导出每次从游标取多少行；座位和标题按这个粒度批量补齐
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "2000"))
+# 座位库存服务的 Unix socket，空表示不用（座位状态全走数据库），见 app/inventory.py
+INVENTORY_SOCKET = os.getenv("INVENTORY_SOCKET", "")
+# worker 等库存服务回应的超时（秒）；超时或连不上时这次请求退回数据库路径
+INVENTORY_TIMEOUT = float(os.getenv("INVENTORY_TIMEOUT", "0.5"))
+# 库存服务跟读 outbox 的间隔（秒）和内存里最多保留的场次数（按最近使用淘汰，用到再加载）
+INVENTORY_POLL_SECONDS = float(os.getenv("INVENTORY_POLL_SECONDS", "0.05"))
+INVENTORY_MAX_SHOWTIMES = int(os.getenv("INVENTORY_MAX_SHOWTIMES", "20000"))
+# 库存服务里的占位先只保留这么久（秒），等 hold.created 事件跟读到了才延长到锁座的过期时间；
+# worker 占位后没能提交（进程挂掉、事务出错）时，座位最多被空占这么久
+INVENTORY_RESERVE_SECONDS = float(os.getenv("INVENTORY_RESERVE_SECONDS", "30"))
+# 座位状态的存储方式：rows 每个锁座/已售座位一行；bitmap 每个场次一行位图，按版本号 CAS 更新，
+# seat_holds 明细改为后台异步写（只作审计），见 app/seat_bitmap.py
+SEAT_STORE = os.getenv("SEAT_STORE", "rows")
+# 位图模式下审计明细的批量写入间隔（秒）和每批最多处理的操作数
+SEAT_AUDIT_FLUSH_SECONDS = float(os.getenv("SEAT_AUDIT_FLUSH_SECONDS", "0.2"))
+SEAT_AUDIT_BATCH = int(os.getenv("SEAT_AUDIT_BATCH", "500"))
+# 归档库（单独的 SQLite 文件），空表示不归档；开场超过 ARCHIVE_AFTER_DAYS 天的场次，
+# 其订单和订单座位由 python -m app.archive 每批 ARCHIVE_BATCH 个场次搬过去
+ARCHIVE_DB_URL = os.getenv("ARCHIVE_DB_URL", "")
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVE_BATCH = int(os.getenv("ARCHIVE_BATCH", "50"))
+# 目录批量导入：每批校验、写入并提交的行数；报告里最多列出的出错行数
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+IMPORT_MAX_ERRORS = int(os.getenv("IMPORT_MAX_ERRORS", "1000"))
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+STATIC_DIR = BASE_DIR / "static"
+UPLOAD_DIR = STATIC_DIR / "uploads"
+# 上传文件对外访问的地址前缀
+PUBLIC_BASE_URL = os.getenv("PUBLIC_BASE_URL", "http://localhost:8000")
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(10 * 1024 * 1024)))
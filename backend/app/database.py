@@ -1,19 +1,132 @@
-from sqlalchemy import create_engine
+import math
+import time
+from contextvars import ContextVar
+
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import DeclarativeBase, Session, sessionmaker
 
-from .config import DB_URL
+from .config import ARCHIVE_DB_URL, DB_URL, REPLICA_DB_URL, REPLICA_STICKY_SECONDS
+from . import sql_profiler
+from .db_pool import instrument, pool_kwargs
+
+
+def _make_engine(url: str, name: str):
+    eng = create_engine(
+        url,
+        connect_args={"check_same_thread": False} if url.startswith("sqlite") else {},
+        **pool_kwargs(url),
+    )
+    instrument(eng, name)
+    sql_profiler.attach(eng)
+    if ARCHIVE_DB_URL and url.startswith("sqlite"):
+        _attach_archive(eng, make_url(ARCHIVE_DB_URL).database)
+    return eng
+
+
+def _attach_archive(eng, path: str) -> None:
+    """归档库挂到每个连接上（schema 名 archive），热表和归档表可以在一条 SQL 里读写，见 archive.py。"""
+
+    @event.listens_for(eng, "connect")
+    def _attach(dbapi_conn, connection_record):
+        dbapi_conn.execute("ATTACH DATABASE ? AS archive", (path,))
+
+
+engine = _make_engine(DB_URL, "primary")
+# 没有配置副本时，副本就是主库本身
+replica_engine = _make_engine(REPLICA_DB_URL, "replica") if REPLICA_DB_URL else engine
 
-engine = create_engine(DB_URL, connect_args={"check_same_thread": False} if DB_URL.startswith("sqlite") else {})
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
+ReplicaSessionLocal = sessionmaker(bind=replica_engine, autoflush=False, autocommit=False)
+
+# read-your-writes：写入提交后在响应里种 cookie（写入时刻，毫秒时间戳），读请求带着它回来时
+# REPLICA_STICKY_SECONDS 内走主库。放在客户端而不是进程内存里，多 worker 时下一次读落到
+# 别的进程也认得。前端跨域请求要带上 credentials（见 frontend/src/api.js）。
+STICKY_COOKIE = "rw_at"
+# ReadYourWrites 中间件给每个请求放一个列表，提交了写事务就往里追加时间
+_request_writes: ContextVar[list[float] | None] = ContextVar("request_writes", default=None)
 
 
 class Base(DeclarativeBase):
     pass
 
 
+def mark_write() -> None:
+    writes = _request_writes.get()
+    if writes is not None:
+        writes.append(time.time())
+
+
+def recently_wrote(request: Request) -> bool:
+    try:
+        wrote_at = int(request.cookies.get(STICKY_COOKIE, "")) / 1000
+    except ValueError:
+        return False
+    # 多台机器的时钟不完全一致，时间戳比本机还晚一点也算
+    return abs(time.time() - wrote_at) <= REPLICA_STICKY_SECONDS
+
+
+class ReadYourWrites:
+    """ASGI 中间件：请求里提交过写事务时，响应带上 STICKY_COOKIE。没有副本时什么也不做。"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or replica_engine is engine:
+            await self.app(scope, receive, send)
+            return
+
+        writes: list[float] = []
+        token = _request_writes.set(writes)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and writes:
+                cookie = (
+                    f"{STICKY_COOKIE}={int(writes[-1] * 1000)}; Max-Age={math.ceil(REPLICA_STICKY_SECONDS)}; "
+                    "Path=/; HttpOnly; SameSite=Lax"
+                )
+                message["headers"] = [*message.get("headers", []), (b"set-cookie", cookie.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_writes.reset(token)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _flag_flush(sess: Session, flush_context) -> None:
+    sess.info["wrote"] = True
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _flag_dml(orm_execute_state) -> None:
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _remember_write(sess: Session) -> None:
+    if sess.info.pop("wrote", False):
+        mark_write()
+
+
 def db() -> Session:
+    """主库会话：所有写操作（锁座、下单、后台管理）都用它。"""
     s = SessionLocal()
     try:
         yield s
     finally:
         s.close()
+
+
+def read_db(request: Request) -> Session:
+    """只读会话：优先走副本；该客户端刚写过的话短时间内仍走主库。"""
+    factory = SessionLocal if recently_wrote(request) else ReplicaSessionLocal
+    s = factory()
+    try:
+        yield s
+    finally:
+        s.close()
@@ -0,0 +1,98 @@
+"""连接池配置与埋点：统计取连接等待时间、占用数和溢出次数。"""
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+from .config import DB_MAX_OVERFLOW, DB_POOL_PRE_PING, DB_POOL_RECYCLE, DB_POOL_SIZE, DB_POOL_TIMEOUT
+from .metrics import Histogram
+
+# 取连接等待时间分桶（毫秒）
+WAIT_BUCKETS_MS = (0.1, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class PoolStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.wait_ms = Histogram(WAIT_BUCKETS_MS)
+        self.checkouts = 0
+        self.overflow_events = 0
+        self.timeouts = 0
+        self.peak_in_use = 0
+        self.pool = None
+
+    def snapshot(self) -> dict:
+        pool = self.pool
+        return {
+            "name": self.name,
+            "size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "timeout": pool.timeout(),
+            "in_use": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "peak_in_use": self.peak_in_use,
+            "checkouts": self.checkouts,
+            "overflow_events": self.overflow_events,
+            "timeouts": self.timeouts,
+            "checkout_wait_ms": self.wait_ms.snapshot(),
+        }
+
+
+class InstrumentedQueuePool(QueuePool):
+    stats: PoolStats
+
+    def _do_get(self):
+        stats = self.stats
+        overflow_before = self.overflow()
+        t0 = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            stats.timeouts += 1
+            raise
+        finally:
+            stats.wait_ms.observe((time.perf_counter() - t0) * 1000)
+        stats.checkouts += 1
+        if self.overflow() > max(overflow_before, 0):
+            stats.overflow_events += 1
+        stats.peak_in_use = max(stats.peak_in_use, self.checkedout())
+        return conn
+
+    def recreate(self):
+        new = super().recreate()
+        new.stats = self.stats
+        self.stats.pool = new
+        return new
+
+
+# name -> PoolStats，给 /admin/metrics/db-pool 用
+POOL_STATS: dict[str, PoolStats] = {}
+
+
+def pool_kwargs(url: str) -> dict:
+    # SQLite 内存库只能用单连接池，不做配置
+    if url.startswith("sqlite") and (":memory:" in url or url.rstrip("/") == "sqlite:"):
+        return {}
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def instrument(engine, name: str) -> None:
+    pool = engine.pool
+    if not isinstance(pool, InstrumentedQueuePool):
+        return
+    stats = PoolStats(name)
+    stats.pool = pool
+    pool.stats = stats
+    POOL_STATS[name] = stats
+
+
+def pool_snapshot() -> list[dict]:
+    return [s.snapshot() for s in POOL_STATS.values()]
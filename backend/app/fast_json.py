@@ -0,0 +1,39 @@
+"""热点接口的 JSON 快速返回。
+
+FastAPI 默认流程：处理函数构造 Pydantic 模型 -> 按 response_model 再校验一遍 ->
+jsonable_encoder -> json.dumps。座位图、列表这类几百行的响应，大部分 CPU 花在这两次校验上。
+
+热点接口改为直接拼好 dict，用 FastJSONResponse 包起来返回：FastAPI 看到返回值本身
+就是 Response 时会跳过 response_model 的校验和编码，只序列化一次。response_model
+仍然保留在路由上，OpenAPI 文档不变。字段形状由 tools/bench_json.py 对照 schema 检查。
+
+装了 orjson 就用 orjson，否则退回标准库 json。
+"""
+import json
+from typing import Any
+
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # 可选依赖
+    orjson = None
+
+
+if orjson is not None:
+
+    def dumps(content: Any) -> bytes:
+        return orjson.dumps(content)
+
+else:
+    _encoder = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"))
+
+    def dumps(content: Any) -> bytes:
+        return _encoder.encode(content).encode("utf-8")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,148 @@
+"""通票库存：按数量锁票/下单，不占用 Seat/SeatHold/OrderSeat 行。
+
+所有变更都是一条带条件的 UPDATE，并发下不会超卖：
+    reserved + sold + 数量 <= capacity
+"""
+import uuid
+from collections import defaultdict
+from datetime import timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import delete, update
+from sqlalchemy.orm import Session
+
+from .config import HOLD_MINUTES, ORDER_PAY_MINUTES
+from .metrics import CHECKOUTS, HOLD_CONFLICTS, HOLDS_EXPIRED
+from .models import GaHold, GaInventory, Order, Showtime
+from .outbox import emit, emit_many
+from .time_utils import iso_utc_z, now_utc
+
+
+def inventory_out(inv: GaInventory) -> dict:
+    return {
+        "showtime_id": inv.showtime_id,
+        "capacity": inv.capacity,
+        "reserved": inv.reserved,
+        "sold": inv.sold,
+        "available": max(inv.capacity - inv.reserved - inv.sold, 0),
+    }
+
+
+def ga_seat_labels(quantity: int) -> list[str]:
+    return [f"通票 x{quantity}"]
+
+
+def cleanup_expired_ga_holds(sess: Session, showtime_id: int | None = None) -> None:
+    # DELETE ... RETURNING 保证并发清理时同一条锁票只会被退回一次
+    q = delete(GaHold).where(GaHold.expires_at < now_utc())
+    if showtime_id is not None:
+        q = q.where(GaHold.showtime_id == showtime_id)
+    freed: dict[int, int] = defaultdict(int)
+    expired = sess.execute(q.returning(GaHold.id, GaHold.showtime_id, GaHold.user_id, GaHold.quantity)).all()
+    for _, sid, _, qty in expired:
+        freed[sid] += qty
+    if freed:
+        HOLDS_EXPIRED.inc("ga", amount=sum(freed.values()))
+        emit_many(sess, "hold.expired", ((sid, uid, token, {"quantity": qty}) for token, sid, uid, qty in expired))
+    for sid, qty in freed.items():
+        sess.execute(
+            update(GaInventory).where(GaInventory.showtime_id == sid).values(reserved=GaInventory.reserved - qty)
+        )
+
+
+def set_capacity(sess: Session, showtime_id: int, capacity: int) -> GaInventory:
+    inv = sess.get(GaInventory, showtime_id)
+    if inv is None:
+        inv = GaInventory(showtime_id=showtime_id, capacity=capacity, reserved=0, sold=0)
+        sess.add(inv)
+        return inv
+    res = sess.execute(
+        update(GaInventory)
+        .where(GaInventory.showtime_id == showtime_id, GaInventory.reserved + GaInventory.sold <= capacity)
+        .values(capacity=capacity)
+    )
+    if res.rowcount == 0:
+        raise HTTPException(409, "容量不能小于已锁定和已售出的票数")
+    sess.refresh(inv)
+    return inv
+
+
+def hold(sess: Session, show: Showtime, user_id: int, quantity: int) -> GaHold:
+    cleanup_expired_ga_holds(sess, showtime_id=show.id)
+    res = sess.execute(
+        update(GaInventory)
+        .where(
+            GaInventory.showtime_id == show.id,
+            GaInventory.reserved + GaInventory.sold + quantity <= GaInventory.capacity,
+        )
+        .values(reserved=GaInventory.reserved + quantity)
+    )
+    if res.rowcount == 0:
+        if sess.get(GaInventory, show.id) is None:
+            raise HTTPException(404, "该场次未开放通票")
+        HOLD_CONFLICTS.inc("ga", "sold_out")
+        raise HTTPException(409, "余票不足")
+
+    gh = GaHold(
+        id=uuid.uuid4().hex,
+        showtime_id=show.id,
+        user_id=user_id,
+        quantity=quantity,
+        expires_at=now_utc() + timedelta(minutes=HOLD_MINUTES),
+    )
+    sess.add(gh)
+    emit(sess, "hold.created", showtime_id=show.id, user_id=user_id, ref=gh.id,
+         quantity=quantity, expires_at=iso_utc_z(gh.expires_at))
+    return gh
+
+
+def release(sess: Session, gh: GaHold) -> None:
+    row = sess.execute(delete(GaHold).where(GaHold.id == gh.id).returning(GaHold.quantity)).first()
+    if row:
+        sess.execute(
+            update(GaInventory)
+            .where(GaInventory.showtime_id == gh.showtime_id)
+            .values(reserved=GaInventory.reserved - row[0])
+        )
+        emit(sess, "hold.released", showtime_id=gh.showtime_id, user_id=gh.user_id, ref=gh.id, quantity=row[0])
+
+
+def checkout(sess: Session, gh: GaHold, show: Showtime, user_id: int) -> Order:
+    """把锁票转成订单：删锁票 + 一条 UPDATE（reserved -> sold）+ 一行订单。"""
+    if gh.expires_at < now_utc():
+        CHECKOUTS.inc("ga", "expired")
+        raise HTTPException(409, "锁票已过期，请重新购票")
+    row = sess.execute(delete(GaHold).where(GaHold.id == gh.id).returning(GaHold.quantity)).first()
+    if not row:
+        CHECKOUTS.inc("ga", "invalid")
+        raise HTTPException(409, "锁票已失效，请重新购票")
+    quantity = row[0]
+    sess.execute(
+        update(GaInventory)
+        .where(GaInventory.showtime_id == show.id)
+        .values(reserved=GaInventory.reserved - quantity, sold=GaInventory.sold + quantity)
+    )
+    order = Order(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        showtime_id=show.id,
+        status="CREATED",
+        total_cents=show.price_cents * quantity,
+        ticket_code="",
+        quantity=quantity,
+        pay_deadline=now_utc() + timedelta(minutes=ORDER_PAY_MINUTES),
+    )
+    sess.add(order)
+    emit(sess, "order.created", showtime_id=show.id, user_id=user_id, ref=order.id,
+         hold_token=gh.id, total_cents=order.total_cents, quantity=quantity)
+    CHECKOUTS.inc("ga", "created")
+    return order
+
+
+def cancel(sess: Session, order: Order) -> None:
+    """取消未支付的通票订单，把票退回库存。"""
+    sess.execute(
+        update(GaInventory)
+        .where(GaInventory.showtime_id == order.showtime_id)
+        .values(sold=GaInventory.sold - order.quantity)
+    )
@@ -0,0 +1,544 @@
+"""座位库存服务：一个独立进程在内存里维护各场次的座位状态，多个 uvicorn worker 通过 Unix socket 共用。
+
+没有它时每个 worker 各看各的内存，锁座冲突和座位图只能靠数据库协调：查座位图要清理过期锁座
+（一次写事务）再查已售和锁座两张表。启用后：
+
+- 锁座先在服务里原子地占位（一次内存操作，冲突直接 409，不碰数据库），占到了再照常写
+  HoldGroup / SeatHold。数据库的唯一约束仍是最后一道防线：写库撞约束时让服务丢掉该场次，
+  下次用到时从库里重新加载。
+- 占位只是预留：先只保留 INVENTORY_RESERVE_SECONDS，跟读到这次锁座的 hold.created 事件
+  （说明已经提交）才延长到锁座本身的过期时间。worker 占位后没走到提交（进程被杀、请求中途出错）
+  时没有事件，预留到期自动失效，座位不会被一直空占到 HOLD_MINUTES。
+- 座位图的状态直接从服务取，数据库只查座位表（静态）和票价。
+- 数据库是持久日志：服务启动时不加载任何东西，场次第一次用到时从表里读，之后跟读 outbox
+  （下单、支付、取消、过期、释放锁座都会写事件）保持同步；进程重启后状态自然恢复。
+  加载在线程池里跑，只有同一场次的请求排队等它，别的场次照常处理。
+- 服务连不上或超时（INVENTORY_TIMEOUT）时，worker 这次请求退回原来的数据库路径并计数
+  ticketing_inventory_fallbacks_total，不影响可用性。
+
+启动：
+
+    python -m app.inventory --socket /tmp/ticketing-inventory.sock
+    INVENTORY_SOCKET=/tmp/ticketing-inventory.sock uvicorn main:app --workers 4
+
+或者由 backend/main.py 一起拉起：python main.py --workers 4 --inventory /tmp/ticketing-inventory.sock
+
+协议（小端）：请求头 <op:u8, 负载长度:u32>，响应头 <status:u8, 负载长度:u32>，后面跟负载。
+
+    HOLD     <showtime:u32 user:u32 expires:f64 n:u16 token:16s> + n*<seat:u32>  -> status, <seat:u32>（冲突座位）
+    RELEASE  <showtime:u32 token:16s>                                            -> OK
+    MAP      <showtime:u32 user:u32>         -> <n:u32> + n*<seat:u32> + n*<state:u8>（0 可选 1 他人锁 2 自己锁 3 已售）
+    DROP     <showtime:u32>                                                      -> OK
+    STATS                                                                        -> JSON
+"""
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import struct
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from sqlalchemy import func, select
+
+from . import seat_bitmap
+from .config import (
+    INVENTORY_MAX_SHOWTIMES,
+    INVENTORY_POLL_SECONDS,
+    INVENTORY_RESERVE_SECONDS,
+    INVENTORY_SOCKET,
+    INVENTORY_TIMEOUT,
+    OUTBOX_PAGE_SIZE,
+)
+from .metrics import INVENTORY_FALLBACKS
+from .models import OrderSeat, OutboxEvent, Showtime
+from .outbox import read_changes
+from .pricing import hall_seat_index
+from .time_utils import parse_iso_to_utc_naive
+
+log = logging.getLogger(__name__)
+
+HEADER = struct.Struct("<BI")
+HOLD_REQ = struct.Struct("<IIdH16s")
+RELEASE_REQ = struct.Struct("<I16s")
+MAP_REQ = struct.Struct("<II")
+ID = struct.Struct("<I")
+
+OP_HOLD, OP_RELEASE, OP_MAP, OP_DROP, OP_STATS = range(1, 6)
+OK, SOLD, HELD, UNKNOWN_SEAT, NOT_FOUND, ERROR = range(6)
+
+STATE_NAMES = ("AVAILABLE", "HELD", "HELD_BY_ME", "SOLD")
+_SOLD_TO_STATE = bytes([0, 3]) + bytes(254)  # sold 标记 0/1 -> 状态 AVAILABLE/SOLD
+
+
+def _epoch(dt: datetime) -> float:
+    return dt.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _token(hex_token: str) -> bytes:
+    try:
+        return bytes.fromhex(hex_token)[:16].ljust(16, b"\0")
+    except ValueError:
+        return hex_token.encode()[:16].ljust(16, b"\0")
+
+
+def _le_ids(ids: array) -> bytes:
+    if sys.byteorder != "little":
+        ids = array("I", ids)
+        ids.byteswap()
+    return ids.tobytes()
+
+
+# ---------------------------------------------------------------- 服务端
+
+
+class _ShowState:
+    __slots__ = ("index", "ids_blob", "sold", "holds", "loaded_at")
+
+    def __init__(self, seat_ids, loaded_at: int):
+        self.index = {sid: i for i, sid in enumerate(seat_ids)}
+        self.ids_blob = ID.pack(len(seat_ids)) + _le_ids(array("I", seat_ids))
+        self.sold = bytearray(len(seat_ids))
+        self.holds: dict[int, tuple[int, float, bytes]] = {}  # 座位下标 -> (用户, 过期时间, 令牌)
+        # 加载前 outbox 的最大 id：不大于它的事件已经反映在读到的表里
+        self.loaded_at = loaded_at
+
+    def live_hold(self, i: int, now: float):
+        h = self.holds.get(i)
+        if h is not None and h[1] < now:
+            del self.holds[i]
+            return None
+        return h
+
+
+class Inventory:
+    """各场次座位状态。只在服务进程的事件循环线程里访问，不加锁；load 例外，它在线程池里
+    读库并返回新对象，由 InventoryServer 在事件循环里 put 上去。"""
+
+    def __init__(self, session_factory, max_showtimes: int = INVENTORY_MAX_SHOWTIMES,
+                 reserve_seconds: float = INVENTORY_RESERVE_SECONDS):
+        self.session_factory = session_factory
+        self.max_showtimes = max_showtimes
+        self.reserve_seconds = reserve_seconds
+        self._shows: OrderedDict[int, _ShowState] = OrderedDict()
+        self.loads = 0
+
+    def _get(self, showtime_id: int) -> _ShowState | None:
+        show = self._shows.get(showtime_id)
+        if show is not None:
+            self._shows.move_to_end(showtime_id)
+        return show
+
+    def loaded(self, showtime_id: int) -> bool:
+        return showtime_id in self._shows
+
+    def put(self, showtime_id: int, show: _ShowState) -> None:
+        self._shows[showtime_id] = show
+        self.loads += 1
+        if len(self._shows) > self.max_showtimes:
+            self._shows.popitem(last=False)
+
+    def load(self, showtime_id: int) -> _ShowState | None:
+        """从库里读一个场次，只碰数据库和新建的对象，在线程池里跑；挂上去由 put 在事件循环里做。"""
+        with self.session_factory() as sess:
+            # 先记 outbox 位置再读表：之后的事件跟读时会再应用一遍，都是幂等的"置状态"操作
+            loaded_at = sess.scalar(select(func.coalesce(func.max(OutboxEvent.id), 0)))
+            hall_id = sess.scalar(select(Showtime.hall_id).where(Showtime.id == showtime_id))
+            if hall_id is None:
+                return None
+            show = _ShowState(list(hall_seat_index(sess, hall_id)), loaded_at)
+            for seat_id in sess.scalars(select(OrderSeat.seat_id).where(OrderSeat.showtime_id == showtime_id)):
+                i = show.index.get(seat_id)
+                if i is not None:
+                    show.sold[i] = 1
+            now = time.time()
+            for seat_id, user_id, expires_at, token in seat_bitmap.live_holds(sess, showtime_id):
+                i = show.index.get(seat_id)
+                expires = _epoch(expires_at)
+                if i is not None and expires >= now:
+                    show.holds[i] = (user_id, expires, _token(token))
+        return show
+
+    def hold(self, showtime_id: int, user_id: int, expires: float, token: bytes, seat_ids) -> tuple[int, int]:
+        show = self._get(showtime_id)
+        if show is None:
+            return NOT_FOUND, 0
+        now = time.time()
+        picked = []
+        for seat_id in seat_ids:
+            i = show.index.get(seat_id)
+            if i is None:
+                return UNKNOWN_SEAT, seat_id
+            if show.sold[i]:
+                return SOLD, seat_id
+            h = show.live_hold(i, now)
+            if h is not None and h[2] != token:  # 同一令牌重试是幂等的
+                return HELD, seat_id
+            picked.append(i)
+        # 还没提交，先短期预留；hold.created 事件到了由 apply_event 换成锁座的过期时间
+        reserved_until = min(expires, now + self.reserve_seconds)
+        for i in picked:
+            show.holds[i] = (user_id, reserved_until, token)
+        return OK, 0
+
+    def release(self, showtime_id: int, token: bytes) -> None:
+        show = self._shows.get(showtime_id)
+        if show is not None:
+            for i in [i for i, h in show.holds.items() if h[2] == token]:
+                del show.holds[i]
+
+    def seat_map(self, showtime_id: int, user_id: int) -> bytes | None:
+        show = self._get(showtime_id)
+        if show is None:
+            return None
+        states = show.sold.translate(_SOLD_TO_STATE)
+        now = time.time()
+        for i in list(show.holds):
+            h = show.live_hold(i, now)
+            if h is not None and not states[i]:
+                states[i] = 2 if user_id and h[0] == user_id else 1
+        return show.ids_blob + bytes(states)
+
+    def drop(self, showtime_id: int) -> None:
+        self._shows.pop(showtime_id, None)
+
+    def apply(self, event: dict) -> None:
+        """应用一条 outbox 事件；没加载的场次和加载前已经包含的事件跳过。"""
+        show = self._shows.get(event["showtime_id"])
+        if show is not None:
+            apply_event(show, event)
+
+    def stats(self) -> dict:
+        return {
+            "showtimes": len(self._shows),
+            "holds": sum(len(s.holds) for s in self._shows.values()),
+            "loads": self.loads,
+        }
+
+
+def apply_event(show: _ShowState, event: dict) -> None:
+    """把一条 outbox 事件应用到场次上；加载前已经包含的事件跳过。"""
+    if event["id"] <= show.loaded_at:
+        return
+    seat_ids = event["data"].get("seat_ids")
+    if not seat_ids:
+        return  # 通票
+    idx = [show.index[s] for s in seat_ids if s in show.index]
+    kind = event["type"]
+    if kind == "hold.created":
+        expires = _epoch(parse_iso_to_utc_naive(event["data"]["expires_at"]))
+        token = _token(event["ref"])
+        for i in idx:
+            if not show.sold[i]:
+                show.holds[i] = (event["user_id"], expires, token)
+    elif kind in ("hold.released", "hold.expired"):
+        token = _token(event["ref"])
+        for i in idx:
+            h = show.holds.get(i)
+            if h is not None and h[2] == token:
+                del show.holds[i]
+    elif kind == "order.created":
+        for i in idx:
+            show.sold[i] = 1
+            show.holds.pop(i, None)
+    elif kind in ("order.canceled", "order.expired"):
+        for i in idx:
+            show.sold[i] = 0
+
+
+class InventoryServer:
+    def __init__(self, path: str, inventory: Inventory, poll_seconds: float = INVENTORY_POLL_SECONDS):
+        self.path = path
+        self.inventory = inventory
+        self.poll_seconds = poll_seconds
+        self.cursor: int | None = None
+        self.requests = 0
+        self._clients: dict[asyncio.Task, asyncio.StreamWriter] = {}
+        # 正在加载的场次：同一场次的请求都等这一次加载，别的场次照常处理
+        self._loading: dict[int, asyncio.Future] = {}
+
+    async def serve(self, stop: asyncio.Event) -> None:
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # 上次没清理掉的 socket 文件
+        server = await asyncio.start_unix_server(self._client, path=self.path)
+        tail = asyncio.create_task(self._tail())
+        log.info("库存服务已启动：%s", self.path)
+        try:
+            await stop.wait()
+        finally:
+            server.close()
+            # worker 的长连接不会自己断开，关掉它们让各连接的协程正常结束
+            clients = dict(self._clients)
+            for writer in clients.values():
+                writer.close()
+            await asyncio.gather(*clients, return_exceptions=True)
+            await server.wait_closed()
+            tail.cancel()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    async def _client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._clients[task] = writer
+        try:
+            while True:
+                op, size = HEADER.unpack(await reader.readexactly(HEADER.size))
+                payload = await reader.readexactly(size) if size else b""
+                status, body = await self._dispatch(op, payload)
+                writer.write(HEADER.pack(status, len(body)) + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._clients.pop(task, None)
+            writer.close()
+
+    async def _dispatch(self, op: int, payload: bytes) -> tuple[int, bytes]:
+        self.requests += 1
+        inv = self.inventory
+        try:
+            if op == OP_HOLD:
+                showtime_id, user_id, expires, n, token = HOLD_REQ.unpack_from(payload)
+                seat_ids = struct.unpack_from(f"<{n}I", payload, HOLD_REQ.size)
+                await self._ensure_loaded(showtime_id)
+                status, seat_id = inv.hold(showtime_id, user_id, expires, token, seat_ids)
+                return status, ID.pack(seat_id)
+            if op == OP_RELEASE:
+                inv.release(*RELEASE_REQ.unpack(payload))
+                return OK, b""
+            if op == OP_MAP:
+                showtime_id, user_id = MAP_REQ.unpack(payload)
+                await self._ensure_loaded(showtime_id)
+                body = inv.seat_map(showtime_id, user_id)
+                return (OK, body) if body is not None else (NOT_FOUND, b"")
+            if op == OP_DROP:
+                inv.drop(*ID.unpack(payload))
+                return OK, b""
+            if op == OP_STATS:
+                return OK, json.dumps({**inv.stats(), "cursor": self.cursor, "requests": self.requests}).encode()
+            return ERROR, f"未知操作 {op}".encode()
+        except Exception as e:
+            log.exception("库存服务处理 op=%d 失败", op)
+            return ERROR, str(e).encode()
+
+    async def _ensure_loaded(self, showtime_id: int) -> None:
+        """场次没在内存里就到线程池里加载：三条查询不占事件循环，别的场次的请求不受影响。"""
+        if self.inventory.loaded(showtime_id):
+            return
+        pending = self._loading.get(showtime_id)
+        if pending is not None:
+            await asyncio.shield(pending)
+            return
+        pending = self._loading[showtime_id] = asyncio.get_running_loop().create_future()
+        try:
+            show = await self._load(showtime_id)
+            if show is not None:
+                self.inventory.put(showtime_id, show)
+            pending.set_result(None)
+        except Exception as e:
+            pending.set_exception(e)
+            pending.exception()  # 没有别的请求在等时也不报 "never retrieved"
+            raise
+        finally:
+            if not pending.done():
+                pending.cancel()  # 加载被取消（服务关闭），等它的请求也跟着结束
+            del self._loading[showtime_id]
+
+    async def _load(self, showtime_id: int) -> _ShowState | None:
+        loop = asyncio.get_running_loop()
+        show = await loop.run_in_executor(None, self.inventory.load, showtime_id)
+        if show is None:
+            return None
+        # 加载期间跟读可能已经越过 loaded_at：那段事件因为场次还没挂上被跳过了，这里补上。
+        # 补完后同步地 put，中间不会再有跟读插进来
+        after = show.loaded_at
+        while self.cursor is not None and after < self.cursor:
+            _, events = await loop.run_in_executor(None, self._fetch, after)
+            if not events:
+                break
+            for event in events:
+                if event["showtime_id"] == showtime_id:
+                    apply_event(show, event)
+            after = events[-1]["id"]
+        return show
+
+    def _fetch(self, after: int | None) -> tuple[int, list[dict]]:
+        with self.inventory.session_factory() as sess:
+            if after is None:
+                # 从当前位置开始跟读：之前的事件已经反映在表里，场次加载时会读到
+                return sess.scalar(select(func.coalesce(func.max(OutboxEvent.id), 0))), []
+            return after, read_changes(sess, after, OUTBOX_PAGE_SIZE)
+
+    async def _tail(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                starting = self.cursor is None
+                self.cursor, events = await loop.run_in_executor(None, self._fetch, self.cursor)
+            except Exception:
+                # 库还没建好（和 API 同时首次启动）或暂时不可用，过一会儿再试
+                log.exception("库存服务读取 outbox 失败")
+                await asyncio.sleep(1)
+                continue
+            if starting:
+                # 游标定下来之前就加载了的场次，从它们各自的加载位置接着读
+                self.cursor = min([self.cursor, *(s.loaded_at for s in self.inventory._shows.values())])
+            for event in events:
+                self.inventory.apply(event)
+            if events:
+                self.cursor = events[-1]["id"]
+            if len(events) < OUTBOX_PAGE_SIZE:
+                await asyncio.sleep(self.poll_seconds)
+
+
+def serve(path: str) -> None:
+    from .database import SessionLocal
+
+    async def run():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        await InventoryServer(path, Inventory(SessionLocal)).serve(stop)
+
+    asyncio.run(run())
+
+
+# ---------------------------------------------------------------- worker 端
+
+
+class InventoryUnavailable(Exception):
+    pass
+
+
+class InventoryClient:
+    """每个线程一条长连接，同步请求-响应。"""
+
+    def __init__(self, path: str, timeout: float = INVENTORY_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            raise
+        self._local.sock = sock
+        return sock
+
+    @staticmethod
+    def _recv(sock: socket.socket, size: int) -> bytes:
+        buf = bytearray()
+        while len(buf) < size:
+            chunk = sock.recv(size - len(buf))
+            if not chunk:
+                raise ConnectionError("库存服务断开了连接")
+            buf += chunk
+        return bytes(buf)
+
+    def call(self, op: int, payload: bytes = b"") -> tuple[int, bytes]:
+        # 缓存的连接可能已经断了（服务重启），换新连接重试一次；所有操作重放都是幂等的
+        for attempt in (0, 1):
+            sock = getattr(self._local, "sock", None)
+            fresh = sock is None
+            try:
+                if fresh:
+                    sock = self._connect()
+                sock.sendall(HEADER.pack(op, len(payload)) + payload)
+                status, size = HEADER.unpack(self._recv(sock, HEADER.size))
+                return status, self._recv(sock, size) if size else b""
+            except OSError as e:
+                self._local.sock = None
+                if sock is not None:
+                    sock.close()
+                if fresh or attempt:
+                    raise InventoryUnavailable(str(e)) from e
+        raise AssertionError("unreachable")
+
+
+_client = InventoryClient(INVENTORY_SOCKET) if INVENTORY_SOCKET else None
+_last_warning = 0.0
+
+
+def enabled() -> bool:
+    return _client is not None
+
+
+def _call(op_name: str, op: int, payload: bytes = b"") -> tuple[int, bytes] | None:
+    """服务不可用或出错时返回 None，调用方走数据库路径。"""
+    global _last_warning
+    try:
+        status, body = _client.call(op, payload)
+        if status != ERROR:
+            return status, body
+        reason = body.decode(errors="replace")
+    except InventoryUnavailable as e:
+        reason = str(e)
+    INVENTORY_FALLBACKS.inc(op_name)
+    if time.monotonic() - _last_warning > 30:  # 服务挂掉时别每个请求都刷日志
+        _last_warning = time.monotonic()
+        log.warning("库存服务不可用（%s），退回数据库路径：%s", op_name, reason)
+    return None
+
+
+def try_hold(showtime_id: int, user_id: int, seat_ids, expires_at: datetime, token: str) -> tuple[int, int] | None:
+    """在服务里占位，返回 (status, 冲突座位 id)；None 表示服务不可用。"""
+    payload = HOLD_REQ.pack(showtime_id, user_id, _epoch(expires_at), len(seat_ids), _token(token))
+    res = _call("hold", OP_HOLD, payload + struct.pack(f"<{len(seat_ids)}I", *seat_ids))
+    if res is None:
+        return None
+    status, body = res
+    return status, ID.unpack(body)[0]
+
+
+def release(showtime_id: int, token: str) -> None:
+    _call("release", OP_RELEASE, RELEASE_REQ.pack(showtime_id, _token(token)))
+
+
+def drop(showtime_id: int) -> None:
+    """让服务丢掉该场次的状态，下次用到时从数据库重新加载。"""
+    _call("drop", OP_DROP, ID.pack(showtime_id))
+
+
+def seat_states(showtime_id: int, user_id: int | None) -> dict[int, str] | None:
+    """座位 id -> AVAILABLE/HELD/HELD_BY_ME/SOLD；None 表示服务不可用或场次不存在。"""
+    res = _call("map", OP_MAP, MAP_REQ.pack(showtime_id, user_id or 0))
+    if res is None or res[0] != OK:
+        return None
+    body = res[1]
+    (n,) = ID.unpack_from(body)
+    ids = array("I", body[ID.size:ID.size + 4 * n])
+    if sys.byteorder != "little":
+        ids.byteswap()
+    states = body[ID.size + 4 * n:]
+    return {seat_id: STATE_NAMES[s] for seat_id, s in zip(ids, states)}
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="座位库存服务")
+    parser.add_argument("--socket", default=INVENTORY_SOCKET or "/tmp/ticketing-inventory.sock", help="Unix socket 路径")
+    parser.add_argument("--stats", action="store_true", help="查询运行中的服务状态后退出")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.stats:
+        status, body = InventoryClient(args.socket, timeout=2).call(OP_STATS)
+        print(body.decode())
+        return
+    serve(args.socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,14 @@
-from pathlib import Path
-
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.staticfiles import StaticFiles
 
+from .capture import TrafficCapture
+from .config import CAPTURE_PATH, STATIC_DIR, UPLOAD_DIR
+from .database import ReadYourWrites
 from .lifespan import lifespan
-from .routers import admin, auth, categories, events, holds, orders, seats, uploading
-
-BASE_DIR = Path(__file__).resolve().parent.parent
-STATIC_DIR = BASE_DIR / "static"
-UPLOAD_DIR = STATIC_DIR / "uploads"
+from .request_metrics import RequestMetrics, track_in_flight
+from .routers import admin, auth, categories, changes, events, exports, ga, holds, metrics, orders, reports, seats, uploading
+from .sql_profiler import QueryProfiler
+from .static_files import AssetStaticFiles
 
 ALLOWED_ORIGINS = ["http://localhost:5173", "http://127.0.0.1:5173"]
 
@@ -18,19 +17,30 @@ ROUTERS = (
     categories.router,
     seats.router,
     holds.router,
+    ga.router,
     orders.router,
     admin.router,
     events.router,
     uploading.router,
+    metrics.router,
+    changes.router,
+    reports.router,
+    exports.router,
 )
 
 
 def create_app() -> FastAPI:
-    app = FastAPI(title="Movie Ticketing API", version="0.1.0", lifespan=lifespan)
+    app = FastAPI(
+        title="Movie Ticketing API",
+        version="0.1.0",
+        lifespan=lifespan,
+        dependencies=[Depends(track_in_flight)],
+    )
 
     UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-    app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
+    app.mount("/static", AssetStaticFiles(directory=str(STATIC_DIR)), name="static")
 
+    app.add_middleware(uploading.UploadSizeLimit)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=ALLOWED_ORIGINS,
@@ -38,6 +48,12 @@ def create_app() -> FastAPI:
         allow_methods=["*"],
         allow_headers=["*"],
     )
+    app.add_middleware(QueryProfiler)
+    app.add_middleware(ReadYourWrites)
+    if CAPTURE_PATH:
+        app.add_middleware(TrafficCapture, path=CAPTURE_PATH)
+    # 最后注册的在最外层，耗时包含其它中间件
+    app.add_middleware(RequestMetrics)
 
     for router in ROUTERS:
         app.include_router(router)
@@ -0,0 +1,177 @@
+"""进程内指标：直方图、计数器、仪表，以及 Prometheus 文本格式输出。
+
+指标都注册在 REGISTRY 里，GET /metrics 按注册顺序输出。多 worker 部署时每个进程各自
+统计，由 Prometheus 按实例抓取后再聚合。
+"""
+import threading
+from bisect import bisect_left
+
+
+class Histogram:
+    """固定分桶的直方图，只记累计值，线程安全。"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个是 +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        cumulative = {}
+        acc = 0
+        for le, n in zip(self.buckets, counts):
+            acc += n
+            cumulative[str(le)] = acc
+        cumulative["+Inf"] = count
+        return {"buckets": cumulative, "sum": round(total, 3), "count": count}
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Family:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames=(), registry=None):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        (REGISTRY if registry is None else registry).append(self)
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Family):
+    """只增不减的计数，labels 按位置传入：COUNTER.inc("seat", "sold")"""
+
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def set(self, *labels, value: float) -> None:
+        """从外部已有的累计值同步（比如连接池统计），不要用来回退计数。"""
+        with self._lock:
+            self._values[labels] = value
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        with self._lock:
+            items = list(self._values.items())
+        for labels, v in items:
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {v}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self.inc(*labels, amount=-amount)
+
+
+class HistogramVec(_Family):
+    """按 labels 分组的 Histogram。"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets, labelnames=(), registry=None):
+        super().__init__(name, help_text, labelnames, registry)
+        self.bucket_bounds = tuple(sorted(buckets))
+
+    def labels(self, *labels) -> Histogram:
+        h = self._values.get(labels)
+        if h is None:
+            with self._lock:
+                h = self._values.setdefault(labels, Histogram(self.bucket_bounds))
+        return h
+
+    def observe(self, value: float, *labels) -> None:
+        self.labels(*labels).observe(value)
+
+    def render(self) -> list[str]:
+        lines = self._header()
+        with self._lock:
+            items = list(self._values.items())
+        for labels, h in items:
+            snap = h.snapshot()
+            for le, n in snap["buckets"].items():
+                bucket_labels = _labels(self.labelnames, labels, 'le="%s"' % le)
+                lines.append(f"{self.name}_bucket{bucket_labels} {n}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {snap['sum']}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {snap['count']}")
+        return lines
+
+
+REGISTRY: list = []
+# 输出前调用的回调，用来把外部状态（比如连接池）刷成指标
+COLLECT_HOOKS: list = []
+
+
+def render_prometheus() -> str:
+    for hook in COLLECT_HOOKS:
+        hook()
+    lines = []
+    for family in REGISTRY:
+        lines.extend(family.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- 业务指标 ---
+
+HOLD_CONFLICTS = Counter(
+    "ticketing_hold_conflicts_total",
+    "锁座/锁票被拒（409）的次数",
+    ("kind", "reason"),  # kind: seat/ga；reason: sold/held/sold_out
+)
+HOLDS_EXPIRED = Counter(
+    "ticketing_holds_expired_total",
+    "清理掉的过期锁座（按座位）和过期通票锁票（按张数）",
+    ("kind",),
+)
+ORDERS_EXPIRED = Counter(
+    "ticketing_orders_expired_total",
+    "超过支付时限被 reaper 取消的订单数",
+    ("kind",),
+)
+INVENTORY_FALLBACKS = Counter(
+    "ticketing_inventory_fallbacks_total",
+    "库存服务连不上或出错、退回数据库路径的次数",
+    ("op",),  # op: hold/release/map/drop
+)
+SEAT_CAS_RETRIES = Counter(
+    "ticketing_seat_cas_retries_total",
+    "位图模式下场次位图版本号已被别人改过、重读后重试的次数",
+    ("op",),  # op: hold/release/sell/unsell/expire
+)
+CHECKOUTS = Counter(
+    "ticketing_checkouts_total",
+    "下单结果",
+    ("kind", "outcome"),  # outcome: created/expired/invalid/conflict/not_found
+)
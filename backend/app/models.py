@@ -4,7 +4,7 @@ from .database import Base
 from datetime import datetime
 from typing import List
 
-from sqlalchemy import Boolean, DateTime, ForeignKey, Integer, String, UniqueConstraint
+from sqlalchemy import Boolean, DateTime, ForeignKey, Index, Integer, LargeBinary, String, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from .database import Base
@@ -79,12 +79,29 @@ class Seat(Base):
     row: Mapped[int] = mapped_column(Integer)
     col: Mapped[int] = mapped_column(Integer)
     label: Mapped[str] = mapped_column(String(20), index=True)
+    section: Mapped[str] = mapped_column(String(20), default="")  # 分区名，普通影厅为空
+    zone: Mapped[str] = mapped_column(String(20), default="")  # 票价区（VIP/A/B），为空按场次基础票价
 
     hall: Mapped[Hall] = relationship(back_populates="seats")
 
     __table_args__ = (UniqueConstraint("hall_id", "row", "col", name="uq_seat_pos"),)
 
 
+class HallSection(Base):
+    """影厅分区：容量和在网格中的范围，建厅时写入，老影厅首次访问时补算。"""
+    __tablename__ = "hall_sections"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    hall_id: Mapped[int] = mapped_column(ForeignKey("halls.id"), index=True)
+    name: Mapped[str] = mapped_column(String(20), default="")
+    capacity: Mapped[int] = mapped_column(Integer, default=0)
+    row_min: Mapped[int] = mapped_column(Integer, default=0)
+    row_max: Mapped[int] = mapped_column(Integer, default=0)
+    col_min: Mapped[int] = mapped_column(Integer, default=0)
+    col_max: Mapped[int] = mapped_column(Integer, default=0)
+
+    __table_args__ = (UniqueConstraint("hall_id", "name", name="uq_hall_section_name"),)
+
+
 class Showtime(Base):
     __tablename__ = "showtimes"
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
@@ -98,6 +115,22 @@ class Showtime(Base):
     hall: Mapped[Hall] = relationship(back_populates="showtimes")
 
 
+class ShowtimePrice(Base):
+    """场次的分区票价表。"""
+    __tablename__ = "showtime_prices"
+    showtime_id: Mapped[int] = mapped_column(ForeignKey("showtimes.id"), primary_key=True)
+    zone: Mapped[str] = mapped_column(String(20), primary_key=True)
+    price_cents: Mapped[int] = mapped_column(Integer)
+
+
+class PriceVector(Base):
+    """票价表编译结果：按座位在影厅内的位置（seat id 升序）排列的 int32 数组。"""
+    __tablename__ = "price_vectors"
+    showtime_id: Mapped[int] = mapped_column(ForeignKey("showtimes.id"), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=1)
+    prices: Mapped[bytes] = mapped_column(LargeBinary)
+
+
 class HoldGroup(Base):
     __tablename__ = "hold_groups"
     id: Mapped[str] = mapped_column(String(40), primary_key=True)  # token
@@ -105,6 +138,8 @@ class HoldGroup(Base):
     showtime_id: Mapped[int] = mapped_column(ForeignKey("showtimes.id"), index=True)
     expires_at: Mapped[datetime] = mapped_column(DateTime, index=True)  # naive UTC
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)  # naive UTC
+    # 锁定的座位 id（JSON 数组）；位图模式下释放、下单靠它，不再查 seat_holds
+    seat_ids: Mapped[str | None] = mapped_column(Text, nullable=True)
 
 
 class SeatHold(Base):
@@ -119,19 +154,65 @@ class SeatHold(Base):
     __table_args__ = (UniqueConstraint("showtime_id", "seat_id", name="uq_hold_seat_once"),)
 
 
+class SeatBitmap(Base):
+    """位图模式（SEAT_STORE=bitmap）下每个场次一行座位状态，见 seat_bitmap.py。
+
+    第 i 位对应影厅里 id 第 i 小的座位；held/sold 每次整体改写，version 做乐观并发控制。
+    """
+    __tablename__ = "seat_bitmaps"
+    showtime_id: Mapped[int] = mapped_column(ForeignKey("showtimes.id"), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0)
+    seat_count: Mapped[int] = mapped_column(Integer)
+    held: Mapped[bytes] = mapped_column(LargeBinary)
+    sold: Mapped[bytes] = mapped_column(LargeBinary)
+
+
+class SectionCounter(Base):
+    """每个场次每个分区的锁座/已售计数，分区汇总视图只读这张表。"""
+    __tablename__ = "section_counters"
+    showtime_id: Mapped[int] = mapped_column(ForeignKey("showtimes.id"), primary_key=True)
+    section: Mapped[str] = mapped_column(String(20), primary_key=True)
+    held: Mapped[int] = mapped_column(Integer, default=0)
+    sold: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class GaInventory(Base):
+    """通票（不选座）库存：容量 + 已锁/已售计数，锁票和下单都是一条条件 UPDATE。"""
+    __tablename__ = "ga_inventories"
+    showtime_id: Mapped[int] = mapped_column(ForeignKey("showtimes.id"), primary_key=True)
+    capacity: Mapped[int] = mapped_column(Integer, default=0)
+    reserved: Mapped[int] = mapped_column(Integer, default=0)
+    sold: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class GaHold(Base):
+    __tablename__ = "ga_holds"
+    id: Mapped[str] = mapped_column(String(40), primary_key=True)  # token
+    showtime_id: Mapped[int] = mapped_column(ForeignKey("showtimes.id"), index=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
+    quantity: Mapped[int] = mapped_column(Integer)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, index=True)  # naive UTC
+
+
 class Order(Base):
     __tablename__ = "orders"
     id: Mapped[str] = mapped_column(String(40), primary_key=True)  # UUID
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
     showtime_id: Mapped[int] = mapped_column(ForeignKey("showtimes.id"), index=True)
-    status: Mapped[str] = mapped_column(String(20), default="CREATED")  # CREATED/PAID/CANCELED
+    status: Mapped[str] = mapped_column(String(20), default="CREATED")  # CREATED/PAID/CANCELED/EXPIRED
     total_cents: Mapped[int] = mapped_column(Integer, default=0)
     ticket_code: Mapped[str] = mapped_column(String(64), default="")
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)  # naive UTC
+    quantity: Mapped[int] = mapped_column(Integer, default=0)  # 通票张数；选座订单为 0
+    # 未支付订单的支付截止时间（naive UTC），过了由 reaper 置为 EXPIRED 并释放座位
+    pay_deadline: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    paid_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)  # naive UTC
 
     user: Mapped[User] = relationship(back_populates="orders")
     seats: Mapped[List["OrderSeat"]] = relationship(back_populates="order", cascade="all, delete-orphan")
 
+    __table_args__ = (Index("ix_orders_status_pay_deadline", "status", "pay_deadline"),)
+
 
 class OrderSeat(Base):
     __tablename__ = "order_seats"
@@ -164,4 +245,45 @@ class Event(Base):
 
     # 演唱会/漫展特有
     venue = Column(String(255), nullable=True) # 场馆
-    price_info = Column(String(255), nullable=True) # 价格说明
\ No newline at end of file
+    price_info = Column(String(255), nullable=True) # 价格说明
+
+class OutboxEvent(Base):
+    """座位/订单变更事件，和业务写入在同一事务里追加；下游按自增 id 做游标增量拉取。"""
+    __tablename__ = "outbox_events"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)  # naive UTC
+    type: Mapped[str] = mapped_column(String(40))  # hold.created / order.paid ...
+    # 不建索引：每次写入都要维护，按场次过滤时从游标往后扫即可
+    showtime_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    user_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    ref: Mapped[str] = mapped_column(String(40), default="")  # 锁座令牌或订单号
+    payload: Mapped[str] = mapped_column(Text, default="{}")  # JSON
+
+    # 清理旧事件后 id 也不能复用，否则消费者的游标会跳过新事件
+    __table_args__ = ({"sqlite_autoincrement": True},)
+
+
+class SalesRollup(Base):
+    """销售汇总，按维度（dim）各一组行，下单支付/取消时增量维护，也可整体重建（见 reports.py）。
+
+    dim/key：showtime/<场次 id>、event/<event_kind>:<target_id>、cinema/<影院 id>、day/<YYYY-MM-DD>。
+    capacity 是有汇总行的场次的座位数之和（day 维度为 0），上座率 = tickets / capacity。
+    """
+    __tablename__ = "sales_rollups"
+    dim: Mapped[str] = mapped_column(String(10), primary_key=True)
+    key: Mapped[str] = mapped_column(String(40), primary_key=True)
+    paid_orders: Mapped[int] = mapped_column(Integer, default=0)
+    tickets: Mapped[int] = mapped_column(Integer, default=0)
+    revenue_cents: Mapped[int] = mapped_column(Integer, default=0)
+    canceled_orders: Mapped[int] = mapped_column(Integer, default=0)  # 取消 + 超时
+    capacity: Mapped[int] = mapped_column(Integer, default=0)
+
+    # 各维度按收入取前 N 走索引
+    __table_args__ = (Index("ix_sales_rollups_dim_revenue", "dim", "revenue_cents"),)
+
+
+class AppMeta(Base):
+    """键值元数据，目前只存 schema/种子数据版本号。"""
+    __tablename__ = "app_meta"
+    key: Mapped[str] = mapped_column(String(50), primary_key=True)
+    value: Mapped[str] = mapped_column(String(200), default="")
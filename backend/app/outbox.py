@@ -0,0 +1,125 @@
+"""事务性 outbox：锁座、释放、下单、支付、取消、过期都在业务事务里追加一条事件。
+
+下游（统计、通知、座位缓存）按 outbox_events.id 做游标增量拉取，不用再轮询整张订单表：
+
+    GET /admin/changes?after=<上次的 next>          一页 JSON
+    GET /admin/changes/stream?after=<id>            NDJSON 长连接，持续推送新事件
+
+事件类型（type）和 data：
+
+    hold.created / hold.released / hold.expired     ref=锁座令牌，data: seat_ids 或 quantity（通票）
+    order.created                                   ref=订单号，data: hold_token, total_cents, seat_ids 或 quantity
+    order.paid                                      data: total_cents
+    order.canceled / order.expired                  data: seat_ids 或 quantity
+
+id 的先后就是提交的先后：SQLite 同一时间只有一个写事务，事件 id 在事务内分配，
+消费者看到 id=n 时不会再有更小的 id 提交。表用 AUTOINCREMENT，清理旧事件后 id 也不复用。
+
+清理超过保留期的事件：
+
+    python -m app.outbox --prune-hours 72
+"""
+import json
+import logging
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from sqlalchemy import delete, select
+from sqlalchemy.orm import Session
+
+from .fast_json import dumps
+from .models import OutboxEvent
+from .time_utils import iso_utc_z, now_utc
+
+log = logging.getLogger(__name__)
+
+
+_table = OutboxEvent.__table__
+_COLUMNS = ("type", "showtime_id", "user_id", "ref", "payload", "created_at")
+# 每行 6 个参数，老版本 SQLite 单条语句最多 999 个
+_VALUES_CHUNK = 150
+# 和 SQLAlchemy 的 SQLite DateTime 存法一致，按时间比较（prune）不受影响
+_SQLITE_DT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def _row(type_: str, showtime_id, user_id, ref: str, data: dict, created_at: datetime) -> dict:
+    return {
+        "type": type_,
+        "showtime_id": showtime_id,
+        "user_id": user_id,
+        "ref": ref,
+        "payload": dumps(data).decode(),
+        "created_at": created_at,
+    }
+
+
+def emit(sess: Session, type_: str, *, showtime_id: int | None = None, user_id: int | None = None,
+         ref: str = "", **data) -> None:
+    """在当前事务里追加一条事件；事务回滚时事件一起消失。"""
+    sess.execute(_table.insert().values(**_row(type_, showtime_id, user_id, ref, data, now_utc())))
+
+
+def emit_many(sess: Session, type_: str, events) -> None:
+    """批量追加同一类事件；events 为 (showtime_id, user_id, ref, data)。"""
+    created_at = now_utc().strftime(_SQLITE_DT)
+    params = []
+    for showtime_id, user_id, ref, data in events:
+        params += (type_, showtime_id, user_id, ref, dumps(data).decode(), created_at)
+    if not params:
+        return
+    # 过期清理一次可能写几百条：拼成多行 VALUES 一条语句写一批，直接交给驱动，
+    # 省掉 SQLAlchemy 逐行处理参数的开销；语句按行数缓存
+    conn = sess.connection()
+    step = _VALUES_CHUNK * len(_COLUMNS)
+    for i in range(0, len(params), step):
+        chunk = params[i:i + step]
+        conn.exec_driver_sql(_insert_sql(len(chunk) // len(_COLUMNS)), tuple(chunk))
+
+
+@lru_cache(maxsize=64)
+def _insert_sql(n: int) -> str:
+    row = "(" + ", ".join("?" * len(_COLUMNS)) + ")"
+    return f"INSERT INTO {_table.name} ({', '.join(_COLUMNS)}) VALUES " + ", ".join([row] * n)
+
+
+def event_out(e: OutboxEvent) -> dict:
+    return {
+        "id": e.id,
+        "ts": iso_utc_z(e.created_at),
+        "type": e.type,
+        "showtime_id": e.showtime_id,
+        "user_id": e.user_id,
+        "ref": e.ref,
+        "data": json.loads(e.payload),
+    }
+
+
+def read_changes(sess: Session, after: int, limit: int, showtime_id: int | None = None) -> list[dict]:
+    q = select(OutboxEvent).where(OutboxEvent.id > after)
+    if showtime_id is not None:
+        q = q.where(OutboxEvent.showtime_id == showtime_id)
+    return [event_out(e) for e in sess.scalars(q.order_by(OutboxEvent.id).limit(limit))]
+
+
+def prune(sess: Session, older_than: datetime) -> int:
+    return sess.execute(delete(OutboxEvent).where(OutboxEvent.created_at < older_than)).rowcount
+
+
+def main() -> None:
+    import argparse
+
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="清理 outbox 里的旧事件")
+    parser.add_argument("--prune-hours", type=float, default=72, help="保留最近多少小时的事件")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    with SessionLocal() as sess:
+        n = prune(sess, now_utc() - timedelta(hours=args.prune_hours))
+        sess.commit()
+    log.info("清理 outbox 事件 %d 条", n)
+
+
+if __name__ == "__main__":
+    main()
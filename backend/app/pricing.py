@@ -0,0 +1,147 @@
+"""分区票价：票价表编译成按座位位置排列的价格数组。
+
+座位位置 = 座位在影厅内按 seat id 升序的下标。影厅建好后座位不再变化，
+位置索引可以在进程内永久缓存；价格数组带版本号，改价后其它 worker
+发现版本变化会重新加载。结账总价和座位图价格都只是按下标取数。
+清空票价表时保留 price_vectors 行、存空数组（全场统一价），版本号照常加一：
+删掉行再建会从 1 重新计数，别的 worker 缓存里的旧版本 1 会被当成最新的。
+"""
+from array import array
+
+from fastapi import HTTPException
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from .models import PriceVector, Seat, Showtime, ShowtimePrice
+from .schemas import ZoneRectIn
+
+_HALL_INDEX_MAX = 256
+_VECTOR_CACHE_MAX = 4096
+
+# hall_id -> {seat_id: 位置}
+_hall_index: dict[int, dict[int, int]] = {}
+# showtime_id -> (version, 价格数组；统一价为 None)
+_vectors: dict[int, tuple[int, array | None]] = {}
+
+
+def hall_seat_index(sess: Session, hall_id: int) -> dict[int, int]:
+    idx = _hall_index.get(hall_id)
+    if idx is None:
+        seat_ids = sess.scalars(select(Seat.id).where(Seat.hall_id == hall_id).order_by(Seat.id)).all()
+        idx = {sid: i for i, sid in enumerate(seat_ids)}
+        if len(_hall_index) >= _HALL_INDEX_MAX:
+            _hall_index.clear()
+        _hall_index[hall_id] = idx
+    return idx
+
+
+def compile_prices(sess: Session, show: Showtime) -> PriceVector | None:
+    """把场次票价表编译成价格数组并落库；没有票价表时存空数组，返回 None。"""
+    prices = dict(
+        sess.execute(select(ShowtimePrice.zone, ShowtimePrice.price_cents).where(ShowtimePrice.showtime_id == show.id)).all()
+    )
+    pv = sess.get(PriceVector, show.id)
+    if not prices:
+        if pv and pv.prices:
+            pv.prices = b""
+            pv.version += 1
+        _vectors.pop(show.id, None)
+        return None
+
+    zones = sess.scalars(select(func.coalesce(Seat.zone, "")).where(Seat.hall_id == show.hall_id).order_by(Seat.id)).all()
+    base = show.price_cents
+    vec = array("i", (prices.get(z, base) for z in zones))
+    blob = vec.tobytes()
+    if pv:
+        pv.prices = blob
+        pv.version += 1
+    else:
+        pv = PriceVector(showtime_id=show.id, version=1, prices=blob)
+        sess.add(pv)
+    return pv
+
+
+def price_vector(sess: Session, show: Showtime) -> array | None:
+    """取场次的价格数组；没有分区票价时返回 None（全场统一 show.price_cents）。"""
+    version = sess.scalar(select(PriceVector.version).where(PriceVector.showtime_id == show.id))
+    if version is None:
+        _vectors.pop(show.id, None)
+        return None
+    cached = _vectors.get(show.id)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    blob = sess.scalar(select(PriceVector.prices).where(PriceVector.showtime_id == show.id))
+    vec = None
+    if blob:
+        vec = array("i")
+        vec.frombytes(blob)
+    if len(_vectors) >= _VECTOR_CACHE_MAX:
+        _vectors.clear()
+    _vectors[show.id] = (version, vec)
+    return vec
+
+
+def seat_price_lookup(sess: Session, show: Showtime):
+    """返回 seat_id -> 票价 的函数，座位图逐座取价时用。"""
+    vec = price_vector(sess, show)
+    if vec is None:
+        base = show.price_cents
+        return lambda seat_id: base
+    idx = hall_seat_index(sess, show.hall_id)
+    return lambda seat_id: vec[idx[seat_id]]
+
+
+def total_price(sess: Session, show: Showtime, seat_ids) -> int:
+    vec = price_vector(sess, show)
+    if vec is None:
+        return show.price_cents * len(seat_ids)
+    idx = hall_seat_index(sess, show.hall_id)
+    return sum(map(vec.__getitem__, map(idx.__getitem__, seat_ids)))
+
+
+def set_showtime_prices(sess: Session, show: Showtime, prices: dict[str, int]) -> PriceVector | None:
+    if any(p < 0 for p in prices.values()):
+        raise HTTPException(400, "票价不能为负数")
+    sess.execute(delete(ShowtimePrice).where(ShowtimePrice.showtime_id == show.id))
+    if prices:
+        sess.execute(
+            insert(ShowtimePrice),
+            [{"showtime_id": show.id, "zone": z, "price_cents": p} for z, p in prices.items()],
+        )
+    return compile_prices(sess, show)
+
+
+def assign_zones(sess: Session, hall_id: int, rects: list[ZoneRectIn]) -> int:
+    """按分区/行列矩形给座位划票价区，后面的规则覆盖前面的。返回更新的座位数。
+
+    改了影厅票价区后，已编译的场次价格数组需要重新编译（见 recompile_hall）。
+    """
+    updated = 0
+    for rect in rects:
+        conds = [Seat.hall_id == hall_id]
+        if rect.section is not None:
+            conds.append(func.coalesce(Seat.section, "") == rect.section)
+        if rect.row_min is not None:
+            conds.append(Seat.row >= rect.row_min)
+        if rect.row_max is not None:
+            conds.append(Seat.row <= rect.row_max)
+        if rect.col_min is not None:
+            conds.append(Seat.col >= rect.col_min)
+        if rect.col_max is not None:
+            conds.append(Seat.col <= rect.col_max)
+        updated += sess.execute(
+            update(Seat).where(*conds).values(zone=rect.zone).execution_options(synchronize_session=False)
+        ).rowcount
+    return updated
+
+
+def recompile_hall(sess: Session, hall_id: int) -> int:
+    shows = sess.scalars(
+        select(Showtime)
+        .join(PriceVector, PriceVector.showtime_id == Showtime.id)
+        .where(Showtime.hall_id == hall_id, func.length(PriceVector.prices) > 0)
+    ).all()
+    for show in shows:
+        compile_prices(sess, show)
+    return len(shows)
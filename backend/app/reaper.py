@@ -0,0 +1,163 @@
+"""超时未支付订单的回收。
+
+下单时订单写入 pay_deadline（ORDER_PAY_MINUTES 分钟后）。过了截止时间还是 CREATED 的订单
+由这里成批置为 EXPIRED：删掉它占用的 OrderSeat（uq_sold_seat_once 随之放开），
+分区计数器 sold 回退，通票订单把张数退回 GaInventory.sold，每单写一条 order.expired 事件。
+
+置 EXPIRED 和支付都是带条件的 UPDATE（status='CREATED' 且截止时间在当前时间之前/之后），
+同一订单只会有一方成功；多个 worker 各自跑 reaper 也不会重复释放。
+
+worker 内由 OrderReaper 后台线程每 REAPER_INTERVAL_SECONDS 秒跑一次；也可以关掉它，
+用定时任务执行：
+
+    python -m app.reaper
+"""
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from . import seat_bitmap
+from .config import REAPER_BATCH
+from .database import SessionLocal
+from .metrics import ORDERS_EXPIRED
+from .models import GaInventory, Order, OrderSeat, SectionCounter
+from .outbox import emit_many
+from .reports import record_canceled
+from .sections import bump_counters
+from .time_utils import now_utc
+
+log = logging.getLogger(__name__)
+
+
+def expire_orders(sess: Session, order_ids, now: datetime) -> int:
+    """把仍未支付且已过截止时间的订单置为 EXPIRED 并释放库存，返回实际处理的订单数。
+
+    order_ids 里已支付、已取消或还没到期的订单会被条件 UPDATE 跳过。调用方负责提交。
+    """
+    if not order_ids:
+        return 0
+    rows = sess.execute(
+        update(Order)
+        .where(Order.id.in_(list(order_ids)), Order.status == "CREATED", Order.pay_deadline < now)
+        .values(status="EXPIRED")
+        .returning(Order.id, Order.showtime_id, Order.user_id, Order.quantity, Order.created_at)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if not rows:
+        return 0
+
+    ga_freed: dict[int, int] = defaultdict(int)
+    seat_orders = []
+    for oid, showtime_id, _, quantity, _ in rows:
+        if quantity:
+            ga_freed[showtime_id] += quantity
+        else:
+            seat_orders.append(oid)
+
+    for showtime_id, quantity in ga_freed.items():
+        sess.execute(
+            update(GaInventory)
+            .where(GaInventory.showtime_id == showtime_id)
+            .values(sold=GaInventory.sold - quantity)
+        )
+
+    freed_seats: dict[int, list[int]] = defaultdict(list)
+    seats_by_order: dict[str, list[int]] = defaultdict(list)
+    if seat_orders:
+        for oid, showtime_id, seat_id in sess.execute(
+            delete(OrderSeat)
+            .where(OrderSeat.order_id.in_(seat_orders))
+            .returning(OrderSeat.order_id, OrderSeat.showtime_id, OrderSeat.seat_id)
+            .execution_options(synchronize_session=False)
+        ).all():
+            freed_seats[showtime_id].append(seat_id)
+            seats_by_order[oid].append(seat_id)
+    if freed_seats and seat_bitmap.enabled():
+        seat_bitmap.unsell(sess, freed_seats)
+    if freed_seats:
+        # 只有初始化过分区计数器的场次需要回退，没初始化的首次使用时会按真实数据重算
+        counted = sess.scalars(
+            select(SectionCounter.showtime_id).where(SectionCounter.showtime_id.in_(list(freed_seats))).distinct()
+        ).all()
+        for showtime_id in counted:
+            bump_counters(sess, showtime_id, freed_seats[showtime_id], sold=-1)
+
+    emit_many(
+        sess,
+        "order.expired",
+        (
+            (showtime_id, user_id, oid, {"quantity": quantity} if quantity else {"seat_ids": seats_by_order[oid]})
+            for oid, showtime_id, user_id, quantity, _ in rows
+        ),
+    )
+    record_canceled(sess, [(showtime_id, created_at) for _, showtime_id, _, _, created_at in rows])
+
+    if seat_orders:
+        ORDERS_EXPIRED.inc("seat", amount=len(seat_orders))
+    if len(rows) > len(seat_orders):
+        ORDERS_EXPIRED.inc("ga", amount=len(rows) - len(seat_orders))
+    return len(rows)
+
+
+def reap_expired_orders(now: datetime | None = None, batch: int = REAPER_BATCH) -> int:
+    """扫出所有超时订单，每批一个事务，返回处理的订单总数。"""
+    now = now or now_utc()
+    total = 0
+    with SessionLocal() as sess:
+        while True:
+            ids = sess.scalars(
+                select(Order.id)
+                .where(Order.status == "CREATED", Order.pay_deadline < now)
+                .limit(batch)
+            ).all()
+            if not ids:
+                break
+            total += expire_orders(sess, ids, now)
+            sess.commit()
+            if len(ids) < batch:
+                break
+    if total:
+        log.info("回收超时未支付订单 %d 个", total)
+    return total
+
+
+class OrderReaper:
+    """后台线程，每隔 interval 秒回收一次超时订单。"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="order-reaper", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=self.interval + 1)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                reap_expired_orders()
+            except Exception:
+                log.exception("回收超时订单失败")
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="回收超时未支付的订单")
+    parser.add_argument("--batch", type=int, default=REAPER_BATCH, help="每个事务处理的订单数")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    reap_expired_orders(batch=args.batch)
+
+
+if __name__ == "__main__":
+    main()
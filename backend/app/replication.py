@@ -0,0 +1,118 @@
+"""本地开发用的“复制”替身：定期把主库 SQLite 文件整体拷贝到副本文件。
+
+生产环境的复制由数据库自身负责，这里只是为了在两个 SQLite 文件上
+复现主从延迟和 read-your-writes 的行为。
+
+同一时间只有一个进程往副本里拷：每个 uvicorn worker 都会起同步线程，但只有拿到副本旁边
+那个锁文件（<副本路径>.sync-lock，flock）的才真正同步，其余的每个周期再试一次，持锁的进程
+退出后自动接手。也可以让 worker 不同步（REPLICA_SYNC_SECONDS=0），单独跑一个进程：
+
+    python -m app.replication --interval 2
+"""
+import fcntl
+import logging
+import os
+import sqlite3
+import threading
+
+from sqlalchemy.engine import make_url
+
+from .config import DB_URL, REPLICA_DB_URL, REPLICA_SYNC_SECONDS
+
+log = logging.getLogger(__name__)
+
+
+def _sqlite_path(url: str) -> str | None:
+    u = make_url(url)
+    if u.get_backend_name() != "sqlite" or not u.database or u.database == ":memory:":
+        return None
+    return u.database
+
+
+def can_replicate(primary_url: str = DB_URL, replica_url: str = REPLICA_DB_URL) -> bool:
+    if not replica_url or replica_url == primary_url:
+        return False
+    return _sqlite_path(primary_url) is not None and _sqlite_path(replica_url) is not None
+
+
+def sync_replica(primary_url: str = DB_URL, replica_url: str = REPLICA_DB_URL) -> None:
+    """用 SQLite 在线备份接口把主库完整复制到副本。"""
+    src = sqlite3.connect(_sqlite_path(primary_url))
+    dst = sqlite3.connect(_sqlite_path(replica_url))
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+
+
+class ReplicaSyncer:
+    """后台线程，每隔 interval 秒同步一次副本；多个进程里只有持有锁文件的那个真正同步。"""
+
+    def __init__(self, interval: float, primary_url: str = DB_URL, replica_url: str = REPLICA_DB_URL):
+        self.interval = interval
+        self.primary_url = primary_url
+        self.replica_url = replica_url
+        self.lock_path = _sqlite_path(replica_url) + ".sync-lock"
+        self._lock = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="replica-sync", daemon=True)
+
+    def start(self) -> None:
+        # 首次同步也放到线程里，不占用 worker 启动时间
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=self.interval + 1)
+        if self._lock is not None:
+            self._lock.close()  # 关闭即释放 flock，别的进程下个周期接手
+            self._lock = None
+
+    def _acquire(self) -> bool:
+        """拿到锁后一直持有到 stop；拿不到说明别的进程在同步。"""
+        if self._lock is not None:
+            return True
+        f = open(self.lock_path, "a")
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._lock = f
+        log.info("由本进程同步副本（pid %d）", os.getpid())
+        return True
+
+    def _run(self) -> None:
+        while True:
+            try:
+                if self._acquire():
+                    sync_replica(self.primary_url, self.replica_url)
+            except (OSError, sqlite3.Error):
+                log.exception("副本同步失败")
+            if self._stop.wait(self.interval):
+                return
+
+
+def main() -> None:
+    import argparse
+    import signal
+
+    parser = argparse.ArgumentParser(description="定期把主库 SQLite 文件同步到副本（本地开发用）")
+    parser.add_argument("--interval", type=float, default=REPLICA_SYNC_SECONDS or 2, help="同步间隔（秒）")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if not can_replicate():
+        parser.error("需要 DB_URL 和 REPLICA_DB_URL 都是 SQLite 文件且不相同")
+    done = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: done.set())
+    syncer = ReplicaSyncer(args.interval)
+    syncer.start()
+    done.wait()
+    syncer.stop()
+
+
+if __name__ == "__main__":
+    main()
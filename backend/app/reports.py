@@ -0,0 +1,264 @@
+"""销售汇总：sales_rollups 的增量维护、整体重建和报表查询。
+
+每个维度一组行（见 models.SalesRollup）：
+
+    showtime  场次 id           event  <event_kind>:<target_id>
+    cinema    影院 id           day    YYYY-MM-DD（UTC）
+
+口径：
+- paid_orders / tickets / revenue_cents 只算已支付订单；tickets 是选座订单的座位数加通票张数。
+- canceled_orders 是取消和超时的订单数。
+- day 维度：支付按支付日期（老订单没有 paid_at，按下单日期），取消按下单日期。
+- capacity：场次行是该场次座位数（通票为通票容量）；影片/活动行和影院行是其下有汇总行的
+  场次容量之和，所以上座率只反映有过订单的场次。
+
+增量：支付时 record_paid，取消 / 超时时 record_canceled，和订单状态变更在同一事务里。
+重建：rebuild 用几条 GROUP BY 在库里算完，再分批写回，结果与增量维护一致；
+启用归档时归档表里的订单也算在内（见 archive.py）：
+
+    python -m app.reports --rebuild
+"""
+import logging
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import archive
+from .models import GaInventory, Hall, Order, OrderSeat, SalesRollup, Seat, Showtime
+
+log = logging.getLogger(__name__)
+
+DIMS = ("showtime", "event", "cinema", "day")
+METRICS = ("paid_orders", "tickets", "revenue_cents", "canceled_orders")
+SORTS = {
+    "revenue": (SalesRollup.revenue_cents.desc(), SalesRollup.key),
+    "tickets": (SalesRollup.tickets.desc(), SalesRollup.key),
+    "occupancy": ((SalesRollup.tickets * 1.0 / func.nullif(SalesRollup.capacity, 0)).desc(), SalesRollup.key),
+    "key": (SalesRollup.key,),
+}
+# 场次已被删除：只留场次行，不计入影片和影院
+_UNKNOWN_SHOWTIME = (None, None, 0)
+_IN_CHUNK = 5000
+_INSERT_BATCH = 10000
+
+
+def _day(dt: datetime) -> str:
+    return dt.date().isoformat()
+
+
+def _showtime_info(sess: Session, showtime_ids) -> dict[int, tuple[str, int, int]]:
+    """场次 id -> (event key, 影院 id, 容量)，分块查询。"""
+    ids = sorted(showtime_ids)
+    out = {}
+    hall_seats: dict[int, int] = {}
+    for i in range(0, len(ids), _IN_CHUNK):
+        chunk = ids[i:i + _IN_CHUNK]
+        rows = sess.execute(
+            select(Showtime.id, Showtime.event_kind, Showtime.target_id, Showtime.hall_id, Hall.cinema_id)
+            .join(Hall, Showtime.hall_id == Hall.id)
+            .where(Showtime.id.in_(chunk))
+        ).all()
+        missing = {r.hall_id for r in rows} - hall_seats.keys()
+        if missing:
+            hall_seats.update(
+                sess.execute(
+                    select(Seat.hall_id, func.count()).where(Seat.hall_id.in_(missing)).group_by(Seat.hall_id)
+                ).all()
+            )
+        ga = dict(
+            sess.execute(
+                select(GaInventory.showtime_id, GaInventory.capacity).where(GaInventory.showtime_id.in_(chunk))
+            ).all()
+        )
+        for sid, kind, target_id, hall_id, cinema_id in rows:
+            out[sid] = (f"{kind}:{target_id}", cinema_id, ga.get(sid, hall_seats.get(hall_id, 0)))
+    return out
+
+
+def _bump(sess: Session, dim: str, key: str, deltas: dict, on_insert: dict | None = None) -> bool:
+    """累加一行；行不存在时插入。返回是否新建。"""
+    values = {c: getattr(SalesRollup, c) + v for c, v in deltas.items() if v}
+    where = (SalesRollup.dim == dim, SalesRollup.key == key)
+    if values and sess.execute(update(SalesRollup).where(*where).values(**values)).rowcount:
+        return False
+    if not values and sess.scalar(select(SalesRollup.dim).where(*where)) is not None:
+        return False
+    try:
+        with sess.begin_nested():
+            sess.execute(insert(SalesRollup).values(dim=dim, key=key, **deltas, **(on_insert or {})))
+        return True
+    except IntegrityError:
+        # 并发事务刚插入了同一行
+        if values:
+            sess.execute(update(SalesRollup).where(*where).values(**values))
+        return False
+
+
+def _apply(sess: Session, facts) -> None:
+    """facts: (showtime_id, day, {指标: 增量})，按维度合并后逐行累加。"""
+    per_show: dict[int, Counter] = defaultdict(Counter)
+    per_day: dict[str, Counter] = defaultdict(Counter)
+    for showtime_id, day, deltas in facts:
+        per_show[showtime_id].update(deltas)
+        per_day[day].update(deltas)
+    if not per_show:
+        return
+
+    info = _showtime_info(sess, per_show)
+    per_event: dict[str, Counter] = defaultdict(Counter)
+    per_cinema: dict[int, Counter] = defaultdict(Counter)
+    for showtime_id, deltas in sorted(per_show.items()):
+        event_key, cinema_id, capacity = info.get(showtime_id, _UNKNOWN_SHOWTIME)
+        created = _bump(sess, "showtime", str(showtime_id), dict(deltas), on_insert={"capacity": capacity})
+        if event_key is None:
+            continue
+        rolled = Counter(deltas)
+        if created:
+            rolled["capacity"] += capacity
+        per_event[event_key].update(rolled)
+        per_cinema[cinema_id].update(rolled)
+    for event_key, deltas in sorted(per_event.items()):
+        _bump(sess, "event", event_key, dict(deltas))
+    for cinema_id, deltas in sorted(per_cinema.items()):
+        _bump(sess, "cinema", str(cinema_id), dict(deltas))
+    for day, deltas in sorted(per_day.items()):
+        _bump(sess, "day", day, dict(deltas))
+
+
+def record_paid(sess: Session, order: Order, paid_at: datetime) -> None:
+    tickets = order.quantity or sess.scalar(
+        select(func.count()).select_from(OrderSeat).where(OrderSeat.order_id == order.id)
+    )
+    _apply(
+        sess,
+        [(order.showtime_id, _day(paid_at), {"paid_orders": 1, "tickets": tickets, "revenue_cents": order.total_cents})],
+    )
+
+
+def record_canceled(sess: Session, orders) -> None:
+    """orders: (showtime_id, created_at)，取消和超时都算。"""
+    _apply(sess, [(showtime_id, _day(created_at), {"canceled_orders": 1}) for showtime_id, created_at in orders])
+
+
+def _aggregate(sess: Session, order_model, seat_model, per_show: dict, per_day: dict) -> None:
+    """按场次和按天聚合一张订单表（热表或归档表），累加进 per_show / per_day。"""
+    paid = order_model.status == "PAID"
+    seat_count = (
+        select(func.count()).select_from(seat_model).where(seat_model.order_id == order_model.id).scalar_subquery()
+    )
+    # 顺序与 METRICS 一致；选座订单 quantity 为 0 或空，张数按 order_seats 数
+    metrics = (
+        func.sum(case((paid, 1), else_=0)),
+        func.sum(case((paid, func.coalesce(func.nullif(order_model.quantity, 0), seat_count)), else_=0)),
+        func.sum(case((paid, order_model.total_cents), else_=0)),
+        func.sum(case((paid, 0), else_=1)),
+    )
+    counted = order_model.status.in_(("PAID", "CANCELED", "EXPIRED"))
+    # 两个维度各扫一遍订单表；"+ 0" 让 SQLite 顺序扫表再排序分组，
+    # 不走 showtime_id 索引逐行回表（百万订单上慢好几倍）
+    showtime = order_model.showtime_id + 0
+    day = func.date(
+        case((paid, func.coalesce(order_model.paid_at, order_model.created_at)), else_=order_model.created_at)
+    )
+    for sid, *values in sess.execute(select(showtime, *metrics).where(counted).group_by(showtime)):
+        per_show[sid].update(dict(zip(METRICS, values)))
+    for d, *values in sess.execute(select(day, *metrics).where(counted).group_by(day)):
+        per_day[str(d)].update(dict(zip(METRICS, values)))
+
+
+def rebuild(sess: Session) -> dict:
+    """清空后按订单表全量重算。聚合都在数据库里做，Python 只合并几组结果并分批写回。"""
+    t0 = time.perf_counter()
+    per_show: dict[int, Counter] = defaultdict(Counter)
+    per_day: dict[str, Counter] = defaultdict(Counter)
+    for order_model, seat_model in archive.order_models():
+        _aggregate(sess, order_model, seat_model, per_show, per_day)
+
+    info = _showtime_info(sess, per_show)
+    per_event: dict[str, Counter] = defaultdict(Counter)
+    per_cinema: dict[int, Counter] = defaultdict(Counter)
+    rows = []
+    for sid, m in per_show.items():
+        event_key, cinema_id, capacity = info.get(sid, _UNKNOWN_SHOWTIME)
+        m["capacity"] = capacity
+        rows.append(("showtime", str(sid), m))
+        if event_key is not None:
+            per_event[event_key].update(m)
+            per_cinema[cinema_id].update(m)
+    rows += [("event", k, m) for k, m in per_event.items()]
+    rows += [("cinema", str(k), m) for k, m in per_cinema.items()]
+    rows += [("day", k, m) for k, m in per_day.items()]
+
+    sess.execute(delete(SalesRollup))
+    table = SalesRollup.__table__
+    for i in range(0, len(rows), _INSERT_BATCH):
+        sess.execute(
+            table.insert(),
+            [
+                {"dim": dim, "key": key, **{c: m[c] for c in METRICS}, "capacity": m["capacity"]}
+                for dim, key, m in rows[i:i + _INSERT_BATCH]
+            ],
+        )
+    counts = Counter(dim for dim, _, _ in rows)
+    return {**{dim: counts[dim] for dim in DIMS}, "ms": round((time.perf_counter() - t0) * 1000, 1)}
+
+
+def rollup_out(r: SalesRollup) -> dict:
+    return {
+        "key": r.key,
+        "paid_orders": r.paid_orders,
+        "tickets": r.tickets,
+        "revenue_cents": r.revenue_cents,
+        "canceled_orders": r.canceled_orders,
+        "capacity": r.capacity,
+        "occupancy": round(r.tickets / r.capacity, 4) if r.capacity else None,
+    }
+
+
+def query(sess: Session, dim: str, sort: str = "revenue", limit: int = 50, offset: int = 0,
+          start: str | None = None, end: str | None = None) -> list[SalesRollup]:
+    q = select(SalesRollup).where(SalesRollup.dim == dim)
+    if start:
+        q = q.where(SalesRollup.key >= start)
+    if end:
+        q = q.where(SalesRollup.key <= end)
+    return list(sess.scalars(q.order_by(*SORTS[sort]).limit(limit).offset(offset)))
+
+
+def totals(sess: Session) -> dict:
+    # 影院维度行数很少，合计从这里出
+    row = sess.execute(
+        select(*(func.coalesce(func.sum(getattr(SalesRollup, c)), 0) for c in (*METRICS, "capacity")))
+        .where(SalesRollup.dim == "cinema")
+    ).one()
+    out = dict(zip((*METRICS, "capacity"), row))
+    out["occupancy"] = round(out["tickets"] / out["capacity"], 4) if out["capacity"] else None
+    return out
+
+
+def main() -> None:
+    import argparse
+
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="销售汇总")
+    parser.add_argument("--rebuild", action="store_true", help="按订单表全量重建")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    with SessionLocal() as sess:
+        if args.rebuild:
+            if archive.enabled():
+                archive.ensure_schema()
+            stats = rebuild(sess)
+            sess.commit()
+            log.info("重建完成：%s", stats)
+        log.info("合计：%s", totals(sess))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""按路由模板统计请求：耗时直方图、进行中请求数、状态码计数、响应大小。
+
+标签用路由模板（/showtimes/{showtime_id}/seats）而不是实际路径，避免 id 把
+时间序列数撑爆；没匹配到路由的请求统一记为 <unmatched>，/static 下的文件都记在挂载点上。
+"""
+import time
+
+from starlette.requests import Request
+
+from .db_pool import POOL_STATS
+from .metrics import COLLECT_HOOKS, Counter, Gauge, HistogramVec
+
+LATENCY_BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+UNMATCHED = "<unmatched>"
+
+REQUEST_LATENCY = HistogramVec(
+    "http_request_duration_seconds", "请求耗时", LATENCY_BUCKETS_S, ("method", "route")
+)
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "正在处理的请求数", ("method", "route"))
+RESPONSES = Counter("http_responses_total", "按状态码统计的响应数", ("method", "route", "status"))
+RESPONSE_SIZE = HistogramVec("http_response_size_bytes", "响应体大小", SIZE_BUCKETS, ("method", "route"))
+
+POOL_IN_USE = Gauge("db_pool_connections_in_use", "已借出的连接数", ("pool",))
+POOL_IDLE = Gauge("db_pool_connections_idle", "池中空闲连接数", ("pool",))
+POOL_CHECKOUTS = Counter("db_pool_checkouts_total", "累计借出连接次数", ("pool",))
+POOL_TIMEOUTS = Counter("db_pool_timeouts_total", "借连接超时次数", ("pool",))
+
+
+def _collect_pool() -> None:
+    for name, stats in POOL_STATS.items():
+        pool = stats.pool
+        if pool is None:
+            continue
+        POOL_IN_USE.set(name, value=pool.checkedout())
+        POOL_IDLE.set(name, value=pool.checkedin())
+        POOL_CHECKOUTS.set(name, value=stats.checkouts)
+        POOL_TIMEOUTS.set(name, value=stats.timeouts)
+
+
+COLLECT_HOOKS.append(_collect_pool)
+
+
+def route_template(scope, base_root_path: str = "") -> str:
+    """路由匹配完成后才能拿到模板：FastAPI 路由写在 scope["route"]，挂载的子应用
+    （/static）只能从 root_path 看出挂载点。"""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    root_path = scope.get("root_path", "")
+    if "endpoint" in scope and root_path != base_root_path:
+        return root_path[len(base_root_path):] or "/"
+    return UNMATCHED
+
+
+async def track_in_flight(request: Request):
+    """应用级依赖：进行中请求数要在处理期间就带上路由模板，中间件那时还拿不到，
+    所以放在路由匹配之后的依赖里做。"""
+    labels = (request.method, route_template(request.scope))
+    REQUESTS_IN_FLIGHT.inc(*labels)
+    try:
+        yield
+    finally:
+        REQUESTS_IN_FLIGHT.dec(*labels)
+
+
+class RequestMetrics:
+    """ASGI 中间件：请求结束后按路由模板记耗时、状态码和响应大小。"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        root_path = scope.get("root_path", "")
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            method = scope["method"]
+            route = route_template(scope, root_path)
+            REQUEST_LATENCY.observe(elapsed, method, route)
+            RESPONSES.inc(method, route, str(status))
+            RESPONSE_SIZE.observe(size, method, route)
@@ -1,12 +1,35 @@
-from fastapi import APIRouter, Depends
+from typing import Literal
+
+from anyio import from_thread
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
+from ..catalog_import import import_catalog
 from ..database import db
-from ..models import Cinema, Hall, Movie, Seat, Showtime, User
-from ..schemas import AdminCinemaIn, AdminHallIn, AdminMovieIn, AdminShowtimeIn, MovieOut
+from ..db_pool import pool_snapshot
+from ..hall_layout import create_hall_with_layout
+from ..models import Cinema, Hall, Movie, Showtime, User
+from ..pricing import assign_zones, recompile_hall, set_showtime_prices
+from ..scheduling import DEFAULT_DURATION_MIN, bulk_schedule, event_durations, find_hall_conflict
+from ..schemas import (
+    AdminCinemaIn,
+    AdminHallIn,
+    AdminHallZonesIn,
+    AdminHallLayoutIn,
+    AdminHallOut,
+    AdminMovieIn,
+    AdminShowtimeIn,
+    AdminShowtimePricesIn,
+    BulkScheduleIn,
+    BulkScheduleOut,
+    CatalogImportOut,
+    HallSectionIn,
+    MovieOut,
+    ShowtimePricesOut,
+)
 from ..security import admin_user
 from ..time_utils import parse_iso_to_utc_naive
-from ..utils import seat_label
 
 router = APIRouter()
 
@@ -28,23 +51,107 @@ def admin_create_cinema(body: AdminCinemaIn, sess: Session = Depends(db), _: Use
     return {"id": c.id}
 
 
-@router.post("/admin/halls")
+@router.post("/admin/halls", response_model=AdminHallOut)
 def admin_create_hall(body: AdminHallIn, sess: Session = Depends(db), _: User = Depends(admin_user)):
-    hall = Hall(**body.model_dump())
-    sess.add(hall)
-    sess.flush()
-    for r in range(hall.rows):
-        for c in range(hall.cols):
-            sess.add(Seat(hall_id=hall.id, row=r, col=c, label=seat_label(r, c)))
+    # 普通影厅 = 只有一个分区的布局，座位标签保持 A1/B2 形式
+    section = HallSectionIn(name="main", rows=body.rows, cols=body.cols)
+    out = create_hall_with_layout(sess, body.cinema_id, body.name, [section], legacy_labels=True)
+    sess.commit()
+    return out
+
+
+@router.post("/admin/halls/layout", response_model=AdminHallOut)
+def admin_create_hall_layout(body: AdminHallLayoutIn, sess: Session = Depends(db), _: User = Depends(admin_user)):
+    """按分区布局创建大场馆：支持过道、移除座位，返回写入行数和耗时"""
+    out = create_hall_with_layout(sess, body.cinema_id, body.name, body.sections)
     sess.commit()
-    return {"id": hall.id}
+    return out
+
+
+@router.put("/admin/halls/{hall_id}/zones")
+def admin_set_hall_zones(hall_id: int, body: AdminHallZonesIn, sess: Session = Depends(db), _: User = Depends(admin_user)):
+    """给影厅座位划票价区（VIP/A/B...），已设置分区票价的场次会重新编译价格数组"""
+    if not sess.get(Hall, hall_id):
+        raise HTTPException(404, "影厅不存在")
+    updated = assign_zones(sess, hall_id, body.zones)
+    recompiled = recompile_hall(sess, hall_id)
+    sess.commit()
+    return {"ok": True, "seats_updated": updated, "showtimes_recompiled": recompiled}
+
+
+@router.put("/admin/showtimes/{showtime_id}/prices", response_model=ShowtimePricesOut)
+def admin_set_showtime_prices(
+    showtime_id: int,
+    body: AdminShowtimePricesIn,
+    sess: Session = Depends(db),
+    _: User = Depends(admin_user),
+):
+    """设置场次分区票价；未列出的票价区按场次基础票价 price_cents"""
+    show = sess.get(Showtime, showtime_id)
+    if not show:
+        raise HTTPException(404, "场次不存在")
+    pv = set_showtime_prices(sess, show, body.prices)
+    sess.commit()
+    return ShowtimePricesOut(
+        showtime_id=show.id,
+        base_price_cents=show.price_cents,
+        prices=body.prices,
+        version=pv.version if pv else 0,
+        seats=len(pv.prices) // 4 if pv else 0,
+    )
 
 
 @router.post("/admin/showtimes")
 def admin_create_showtime(body: AdminShowtimeIn, sess: Session = Depends(db), _: User = Depends(admin_user)):
     # 允许前端传 Z 或 +09:00 等，统一落库为 naive UTC
     start = parse_iso_to_utc_naive(body.start_time)
+    duration = event_durations(sess, {(body.event_kind, body.target_id)}).get(
+        (body.event_kind, body.target_id), DEFAULT_DURATION_MIN
+    )
+    conflict = find_hall_conflict(sess, body.hall_id, start, duration)
+    if conflict is not None:
+        raise HTTPException(409, f"影厅时间冲突：与场次 {conflict} 重叠")
     st = Showtime(target_id=body.target_id,event_kind=body.event_kind, hall_id=body.hall_id, start_time=start, price_cents=body.price_cents)
     sess.add(st)
     sess.commit()
     return {"id": st.id}
+
+
+@router.post("/admin/showtimes/bulk", response_model=BulkScheduleOut)
+def admin_bulk_schedule(body: BulkScheduleIn, sess: Session = Depends(db), _: User = Depends(admin_user)):
+    """按 日期 × 时刻 × 影厅 批量排片，冲突的时段跳过并在报告里列出；dry_run 只出报告"""
+    out = bulk_schedule(sess, body)
+    sess.commit()
+    return out
+
+
+@router.post("/admin/catalog/import", response_model=CatalogImportOut)
+async def admin_import_catalog(
+    request: Request,
+    format: Literal["ndjson", "csv"] | None = Query(None, description="不填按 Content-Type 判断"),
+    dry_run: bool = False,
+    sess: Session = Depends(db),
+    _: User = Depends(admin_user),
+):
+    """批量导入电影/演唱会/漫展：请求体是 NDJSON 或 CSV 文件内容，边收边分批写入，返回逐行错误报告。
+
+    curl --data-binary @movies.csv -H 'Content-Type: text/csv' .../admin/catalog/import
+    """
+    fmt = format or ("csv" if "csv" in request.headers.get("content-type", "") else "ndjson")
+    stream = request.stream()
+
+    async def next_chunk():
+        return await anext(stream, None)
+
+    def chunks():
+        # 导入在线程池里同步执行，请求体按块从事件循环取，整个文件不会先读进内存
+        while (chunk := from_thread.run(next_chunk)) is not None:
+            yield chunk
+
+    return await run_in_threadpool(import_catalog, sess, chunks(), fmt, dry_run)
+
+
+@router.get("/admin/metrics/db-pool")
+def admin_db_pool_metrics(_: User = Depends(admin_user)):
+    # 连接池等待时间直方图、占用数、溢出次数，用于按数据库连接数规划 worker 数
+    return {"pools": pool_snapshot()}
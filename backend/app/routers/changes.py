@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+from fastapi import APIRouter, Depends, Query, Request
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
+
+from ..config import OUTBOX_PAGE_SIZE, OUTBOX_POLL_SECONDS
+from ..database import SessionLocal, db
+from ..fast_json import FastJSONResponse, dumps
+from ..models import User
+from ..outbox import read_changes
+from ..security import admin_user
+from ..sql_profiler import capture_queries
+
+router = APIRouter()
+
+# 长连接空闲时每隔这么久发一个空行，防止被中间的代理当成死连接断开
+HEARTBEAT_SECONDS = 15
+
+
+@router.get("/admin/changes")
+def list_changes(
+    after: int = Query(0, ge=0, description="上次拿到的 next，从 0 开始"),
+    limit: int = Query(OUTBOX_PAGE_SIZE, ge=1, le=5000),
+    showtime_id: int | None = None,
+    sess: Session = Depends(db),
+    _: User = Depends(admin_user),
+):
+    """按 id 游标增量拉取变更事件；下次用返回的 next 作为 after。"""
+    events = read_changes(sess, after, limit, showtime_id)
+    return FastJSONResponse(
+        {"events": events, "next": events[-1]["id"] if events else after, "has_more": len(events) == limit}
+    )
+
+
+def _page(after: int, showtime_id: int | None) -> list[dict]:
+    # 每次轮询单独开会话，长连接期间不占着连接池里的连接；
+    # 轮询的查询单独计数，不算进这个长连接请求，否则会被当成 N+1
+    with capture_queries(), SessionLocal() as sess:
+        return read_changes(sess, after, OUTBOX_PAGE_SIZE, showtime_id)
+
+
+async def _tail(request: Request, after: int, showtime_id: int | None):
+    last_sent = time.monotonic()
+    while not await request.is_disconnected():
+        events = await run_in_threadpool(_page, after, showtime_id)
+        if events:
+            after = events[-1]["id"]
+            yield b"".join(dumps(e) + b"\n" for e in events)
+            last_sent = time.monotonic()
+            if len(events) == OUTBOX_PAGE_SIZE:
+                continue  # 还有积压，不等待
+        elif time.monotonic() - last_sent >= HEARTBEAT_SECONDS:
+            yield b"\n"
+            last_sent = time.monotonic()
+        await asyncio.sleep(OUTBOX_POLL_SECONDS)
+
+
+@router.get("/admin/changes/stream")
+def stream_changes(
+    request: Request,
+    after: int = Query(0, ge=0),
+    showtime_id: int | None = None,
+    sess: Session = Depends(db),
+    _: User = Depends(admin_user),
+):
+    """NDJSON 长连接：先补发 after 之后的积压事件，再持续推送新事件，每行一个事件。
+
+    断线后用收到的最后一个 id 作为 after 重连即可续上；空行是心跳，解析时跳过。
+    """
+    sess.close()  # 鉴权用完就还连接，流式响应可能持续很久
+    return StreamingResponse(_tail(request, after, showtime_id), media_type="application/x-ndjson")
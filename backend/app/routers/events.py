@@ -4,14 +4,16 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from ..database import db
+from ..database import db, read_db
+from ..fast_json import FastJSONResponse
 # 确保引入了相关的模型和Schema
 # 注意：这里假设 Showtime 模型中有一个 event_id 字段来关联 Event 表
 # 如果你的数据库还在用 movie_id，请将下文的 Showtime.event_id 改为 Showtime.movie_id
 from ..models import Event, User, Showtime, Hall, Cinema, Movie
 from ..schemas import EventOut, EventCreate, EventUpdate, ShowtimeOut, AdminShowtimeIn
+from ..scheduling import DEFAULT_DURATION_MIN, event_durations, find_hall_conflict
 from ..security import admin_user
-from ..time_utils import iso_utc_z # 确保你有这个工具函数，如果没有请手动处理时间
+from ..time_utils import iso_utc_z, parse_iso_to_utc_naive # 确保你有这个工具函数，如果没有请手动处理时间
 
 router = APIRouter()
 
@@ -19,16 +21,24 @@ router = APIRouter()
 # 0. 通用逻辑辅助函数 (Helper Functions)
 # ==========================================
 
+# 列表接口只取 EventOut 需要的列，直接拼 dict 返回（见 fast_json）
+EVENT_OUT_FIELDS = (
+    "id", "kind", "title", "category", "description", "poster_url", "status",
+    "duration_min", "rating", "venue", "price_info",
+)
+
+
 def list_events_by_kind(kind: str, sess: Session, q: str = "", category: Optional[str] = None):
     """按类型查询列表，支持标题搜索"""
-    stmt = select(Event).where(Event.kind == kind).where(Event.status == "ON")
+    cols = [getattr(Event, f) for f in EVENT_OUT_FIELDS]
+    stmt = select(*cols).where(Event.kind == kind).where(Event.status == "ON")
     if q and q.strip():
         stmt = stmt.where(Event.title.contains(q.strip()))
     if category and category.strip():
         stmt = stmt.where(Event.category == category)
     # 按 ID 倒序排列
-    items = sess.scalars(stmt.order_by(Event.id.desc())).all()
-    return items
+    rows = sess.execute(stmt.order_by(Event.id.desc())).all()
+    return [dict(zip(EVENT_OUT_FIELDS, row)) for row in rows]
 
 def get_event_by_id(kind: str, id: int, sess: Session):
     """查询单个事件，校验类型"""
@@ -41,7 +51,16 @@ def get_event_by_id(kind: str, id: int, sess: Session):
 def get_event_showtimes(id: int, sess: Session, kind: str):
     """查询事件关联的场次 (关联 Hall 和 Cinema)"""
     stmt = (
-        select(Showtime, Hall, Cinema)
+        select(
+            Showtime.id,
+            Showtime.target_id,
+            Showtime.event_kind,
+            Showtime.hall_id,
+            Showtime.start_time,
+            Showtime.price_cents,
+            Hall.name,
+            Cinema.name,
+        )
         .join(Hall, Showtime.hall_id == Hall.id)
         .join(Cinema, Hall.cinema_id == Cinema.id)
         # 🔥 注意：这里假设 Showtime 表里有一个 event_id 字段关联 Event 表
@@ -52,22 +71,20 @@ def get_event_showtimes(id: int, sess: Session, kind: str):
         .order_by(Showtime.start_time.asc())
     )
     rows = sess.execute(stmt).all()
-    out = []
-    for st, hall, cinema in rows:
-        out.append(
-            ShowtimeOut(
-                id=st.id,
-                # 统一返回 event_id，Schema 中可能叫 movie_id，需注意兼容
-                target_id=st.target_id,
-                event_kind=st.event_kind,
-                hall_id=st.hall_id,
-                start_time=iso_utc_z(st.start_time),
-                price_cents=st.price_cents,
-                hall_name=hall.name,
-                cinema_name=cinema.name,
-            )
-        )
-    return out
+    return [
+        {
+            "id": st_id,
+            # 统一返回 event_id，Schema 中可能叫 movie_id，需注意兼容
+            "target_id": target_id,
+            "event_kind": event_kind,
+            "hall_id": hall_id,
+            "start_time": iso_utc_z(start_time),
+            "price_cents": price_cents,
+            "hall_name": hall_name,
+            "cinema_name": cinema_name,
+        }
+        for st_id, target_id, event_kind, hall_id, start_time, price_cents, hall_name, cinema_name in rows
+    ]
 
 def create_event_by_kind(kind: str, body: EventCreate, sess: Session):
     """创建逻辑"""
@@ -107,15 +124,18 @@ def delete_event_logic(id: int, sess: Session):
 # 1. 电影 (Movies) 接口 - 独立逻辑 (操作 Movie 表)
 # ==========================================
 
+MOVIE_FIELDS = ("id", "title", "category", "description", "poster_url", "status", "duration_min", "rating")
+
 @router.get("/movies", response_model=List[EventOut])
-def list_movies(q: str = "", category: Optional[str] = None, sess: Session = Depends(db)):
+def list_movies(q: str = "", category: Optional[str] = None, sess: Session = Depends(read_db)):
     """
     查询电影列表
     - 支持按标题搜索 (q)
     - 支持按分类筛选 (category)
     """
-    # 1. 查询 Movie 表
-    stmt = select(Movie).where(Movie.status == "ON")
+    # 1. 查询 Movie 表（Movie 没有 venue / price_info 列）
+    cols = [getattr(Movie, f) for f in MOVIE_FIELDS]
+    stmt = select(*cols).where(Movie.status == "ON")
 
     # 2. 标题搜索
     if q and q.strip():
@@ -126,14 +146,16 @@ def list_movies(q: str = "", category: Optional[str] = None, sess: Session = Dep
         stmt = stmt.where(Movie.category == category)
 
     # 4. 执行查询
-    items = sess.scalars(stmt.order_by(Movie.id.desc())).all()
+    rows = sess.execute(stmt.order_by(Movie.id.desc())).all()
 
     # 5. 返回数据 (手动补充 kind="movie")
-    return [EventOut(**m.__dict__, kind="movie") for m in items]
+    return FastJSONResponse(
+        [{**dict(zip(MOVIE_FIELDS, row)), "kind": "movie", "venue": None, "price_info": None} for row in rows]
+    )
 
 
 @router.get("/movies/{id}", response_model=EventOut)
-def get_movie(id: int, sess: Session = Depends(db)):
+def get_movie(id: int, sess: Session = Depends(read_db)):
     """查询单个电影详情"""
     m = sess.get(Movie, id)
     if not m or m.status != "ON":
@@ -142,25 +164,9 @@ def get_movie(id: int, sess: Session = Depends(db)):
 
 
 @router.get("/movies/{id}/showtimes", response_model=List[ShowtimeOut])
-def movie_showtimes(id: int, sess: Session = Depends(db)):
+def movie_showtimes(id: int, sess: Session = Depends(read_db)):
     """查询电影场次"""
-    stmt = (
-        select(Showtime, Hall, Cinema)
-        .join(Hall, Showtime.hall_id == Hall.id)
-        .join(Cinema, Hall.cinema_id == Cinema.id)
-        .where(Showtime.target_id == id) # 电影表使用 movie_id 关联
-        .where(Showtime.event_kind == "movie")
-        .order_by(Showtime.start_time.asc())
-    )
-    rows = sess.execute(stmt).all()
-    out = []
-    for st, hall, cinema in rows:
-        out.append(ShowtimeOut(
-            id=st.id, target_id=st.target_id,event_kind=st.event_kind, hall_id=st.hall_id,
-            start_time=iso_utc_z(st.start_time), price_cents=st.price_cents,
-            hall_name=hall.name, cinema_name=cinema.name
-        ))
-    return out
+    return FastJSONResponse(get_event_showtimes(id, sess, kind="movie"))
 
 
 # --- 电影管理接口 (独立逻辑) ---
@@ -226,17 +232,17 @@ def delete_movie(id: int, sess: Session = Depends(db), _: User = Depends(admin_u
 # ==========================================
 
 @router.get("/concerts", response_model=List[EventOut])
-def list_concerts(q: str = "", category: Optional[str] = None, sess: Session = Depends(db)):
+def list_concerts(q: str = "", category: Optional[str] = None, sess: Session = Depends(read_db)):
 
-    return list_events_by_kind("concert", sess, q, category)
+    return FastJSONResponse(list_events_by_kind("concert", sess, q, category))
 
 @router.get("/concerts/{id}", response_model=EventOut)
-def get_concert(id: int, sess: Session = Depends(db)):
+def get_concert(id: int, sess: Session = Depends(read_db)):
     return get_event_by_id("concert", id, sess)
 
 @router.get("/concerts/{id}/showtimes", response_model=List[ShowtimeOut])
-def concert_showtimes(id: int, sess: Session = Depends(db)):
-    return get_event_showtimes(id, sess, kind="concert")
+def concert_showtimes(id: int, sess: Session = Depends(read_db)):
+    return FastJSONResponse(get_event_showtimes(id, sess, kind="concert"))
 
 @router.post("/admin/concerts", response_model=EventOut)
 def create_concert(body: EventCreate, sess: Session = Depends(db), _: User = Depends(admin_user)):
@@ -256,16 +262,16 @@ def delete_concert(id: int, sess: Session = Depends(db), _: User = Depends(admin
 # ==========================================
 
 @router.get("/exhibitions", response_model=List[EventOut])
-def list_exhibitions(q: str = "", category: Optional[str] = None, sess: Session = Depends(db)):
-    return list_events_by_kind("exhibition", sess, q, category)
+def list_exhibitions(q: str = "", category: Optional[str] = None, sess: Session = Depends(read_db)):
+    return FastJSONResponse(list_events_by_kind("exhibition", sess, q, category))
 
 @router.get("/exhibitions/{id}", response_model=EventOut)
-def get_exhibition(id: int, sess: Session = Depends(db)):
+def get_exhibition(id: int, sess: Session = Depends(read_db)):
     return get_event_by_id("exhibition", id, sess)
 
 @router.get("/exhibitions/{id}/showtimes", response_model=List[ShowtimeOut])
-def exhibition_showtimes(id: int, sess: Session = Depends(db)):
-    return get_event_showtimes(id, sess, kind="exhibition")
+def exhibition_showtimes(id: int, sess: Session = Depends(read_db)):
+    return FastJSONResponse(get_event_showtimes(id, sess, kind="exhibition"))
 
 @router.post("/admin/exhibitions", response_model=EventOut)
 def create_exhibition(body: EventCreate, sess: Session = Depends(db), _: User = Depends(admin_user)):
@@ -289,11 +295,19 @@ def create_showtime(
     通用场次创建接口
     必须接收 target_id 和 event_kind 才能唯一确定归属
     """
+    start = parse_iso_to_utc_naive(body.start_time)
+    duration = event_durations(sess, {(body.event_kind, body.target_id)}).get(
+        (body.event_kind, body.target_id), DEFAULT_DURATION_MIN
+    )
+    conflict = find_hall_conflict(sess, body.hall_id, start, duration)
+    if conflict is not None:
+        raise HTTPException(409, f"影厅时间冲突：与场次 {conflict} 重叠")
+
     st = Showtime(
         target_id=body.target_id,   # ✅ 存入通用 ID
         event_kind=body.event_kind, # ✅ 存入类型
         hall_id=body.hall_id,
-        start_time=body.start_time,
+        start_time=start,
         price_cents=body.price_cents
     )
 
@@ -0,0 +1,226 @@
+"""订单导出：按条件把订单（或逐张票）流式写成 CSV / NDJSON。
+
+    GET /admin/exports/orders?format=csv&start=2024-06-01&end=2024-07-01
+    GET /admin/exports/tickets?format=ndjson&event_kind=movie&target_id=3
+
+查询走只读副本，用 yield_per 按 EXPORT_CHUNK_SIZE 行一批从游标取，每批补一次座位和标题
+（两条查询）就写出去，内存占用只跟批大小有关，和导出总量无关。
+查询不加 ORDER BY（数据库不必先排好全部结果才出第一行），同一场次的订单大体连在一起。
+启用归档时先导热表再导归档表（见 archive.py），条件相同。
+CSV 带 UTF-8 BOM，Excel 直接打开不乱码。
+"""
+import csv
+import io
+from datetime import datetime
+from typing import Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from starlette.responses import StreamingResponse
+
+from .. import archive, ga
+from ..config import EXPORT_CHUNK_SIZE
+from ..database import ReplicaSessionLocal, db
+from ..fast_json import dumps
+from ..models import Cinema, Hall, Order, Showtime, User
+from ..security import admin_user
+from ..sql_profiler import capture_queries
+from ..time_utils import now_utc, parse_iso_to_utc_naive
+from .orders import event_titles, seat_labels_by_order
+
+router = APIRouter()
+
+ORDER_FIELDS = (
+    "order_id", "status", "user_id", "user_email", "total_cents", "tickets", "seats", "ticket_code",
+    "created_at", "paid_at", "showtime_id", "start_time", "event_kind", "event_title", "hall_name", "cinema_name",
+)
+TICKET_FIELDS = (
+    "ticket_code", "order_id", "status", "seat", "user_email", "showtime_id", "start_time", "event_kind",
+    "event_title", "hall_name", "cinema_name", "paid_at",
+)
+MEDIA_TYPES = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+
+Format = Literal["csv", "ndjson"]
+
+
+def _time(dt: datetime | None) -> str | None:
+    # 库里都是 naive UTC，结果和 iso_utc_z 相同；每行三个时间，省掉时区换算
+    return dt.isoformat() + "Z" if dt else None
+
+
+def _parse_time(value: str | None, name: str) -> datetime | None:
+    if not value:
+        return None
+    try:
+        return parse_iso_to_utc_naive(value)
+    except ValueError:
+        raise HTTPException(400, f"{name} 不是合法的 ISO 时间：{value}")
+
+
+class ExportFilter:
+    """导出条件，作为依赖注入；时间范围按下单时间，含 start 不含 end。"""
+
+    def __init__(
+        self,
+        showtime_id: int | None = None,
+        event_kind: str | None = Query(None, description="movie / concert / exhibition"),
+        target_id: int | None = Query(None, description="电影或活动 id，和 event_kind 一起用"),
+        start: str | None = Query(None, description="ISO 时间或日期，如 2024-06-01"),
+        end: str | None = Query(None, description="ISO 时间或日期，不含"),
+        status: str | None = Query(None, description="CREATED / PAID / CANCELED / EXPIRED"),
+    ):
+        if target_id is not None and not event_kind:
+            raise HTTPException(400, "按活动筛选需要同时指定 event_kind 和 target_id")
+        self.showtime_id = showtime_id
+        self.event_kind = event_kind
+        self.target_id = target_id
+        self.start = _parse_time(start, "start")
+        self.end = _parse_time(end, "end")
+        self.status = status
+
+    def apply(self, stmt, order_model=Order):
+        """order_model 是热表或归档表（archive.ArchivedOrder），两者列名相同。"""
+        if self.showtime_id is not None:
+            stmt = stmt.where(order_model.showtime_id == self.showtime_id)
+        if self.event_kind:
+            stmt = stmt.where(Showtime.event_kind == self.event_kind)
+        if self.target_id is not None:
+            stmt = stmt.where(Showtime.target_id == self.target_id)
+        if self.start:
+            stmt = stmt.where(order_model.created_at >= self.start)
+        if self.end:
+            stmt = stmt.where(order_model.created_at < self.end)
+        if self.status:
+            stmt = stmt.where(order_model.status == self.status)
+        return stmt
+
+
+def _chunks(flt: ExportFilter):
+    """逐批产出 [(订单行, 座位标签列表, 活动标题)]。"""
+    with ReplicaSessionLocal() as sess:
+        for order_model, seat_model in archive.order_models():
+            yield from _model_chunks(sess, flt, order_model, seat_model)
+
+
+def _model_chunks(sess: Session, flt: ExportFilter, order_model, seat_model):
+    stmt = flt.apply(
+        select(
+            order_model.id, order_model.status, order_model.user_id, User.email, order_model.total_cents,
+            order_model.quantity, order_model.ticket_code, order_model.created_at, order_model.paid_at,
+            order_model.showtime_id, Showtime.start_time, Showtime.event_kind, Showtime.target_id, Hall.name.label("hall_name"), Cinema.name.label("cinema_name"),
+        )
+        .join(Showtime, order_model.showtime_id == Showtime.id)
+        .join(Hall, Showtime.hall_id == Hall.id)
+        .join(Cinema, Hall.cinema_id == Cinema.id)
+        .join(User, order_model.user_id == User.id),
+        order_model,
+    ).execution_options(yield_per=EXPORT_CHUNK_SIZE)
+    for rows in sess.execute(stmt).partitions():
+        # 每批的补充查询单独计数，不算进导出请求，否则批数一多就被当成 N+1
+        with capture_queries():
+            labels = seat_labels_by_order(sess, [r.id for r in rows if not r.quantity], seat_model)
+            titles = event_titles(sess, rows)
+        yield [
+            (
+                r,
+                ga.ga_seat_labels(r.quantity) if r.quantity else labels.get(r.id, []),
+                titles.get((r.event_kind, r.target_id), "未知活动"),
+            )
+            for r in rows
+        ]
+
+
+def _order_record(r, seats: list[str], title: str) -> dict:
+    return {
+        "order_id": r.id,
+        "status": r.status,
+        "user_id": r.user_id,
+        "user_email": r.email,
+        "total_cents": r.total_cents,
+        "tickets": r.quantity or len(seats),
+        "seats": " ".join(seats),
+        "ticket_code": r.ticket_code,
+        "created_at": _time(r.created_at),
+        "paid_at": _time(r.paid_at),
+        "showtime_id": r.showtime_id,
+        "start_time": _time(r.start_time),
+        "event_kind": r.event_kind,
+        "event_title": title,
+        "hall_name": r.hall_name,
+        "cinema_name": r.cinema_name,
+    }
+
+
+def _ticket_records(r, seats: list[str], title: str):
+    for seat in seats:
+        yield {
+            "ticket_code": r.ticket_code,
+            "order_id": r.id,
+            "status": r.status,
+            "seat": seat,
+            "user_email": r.email,
+            "showtime_id": r.showtime_id,
+            "start_time": _time(r.start_time),
+            "event_kind": r.event_kind,
+            "event_title": title,
+            "hall_name": r.hall_name,
+            "cinema_name": r.cinema_name,
+            "paid_at": _time(r.paid_at),
+        }
+
+
+def _encode(records, fmt: str, fields: tuple[str, ...]):
+    """records 是一批批的 dict 列表，每批编码成一块字节输出。"""
+    if fmt == "ndjson":
+        for batch in records:
+            yield b"".join(dumps(rec) + b"\n" for rec in batch)
+        return
+    buf = io.StringIO()
+    writer = csv.writer(buf, lineterminator="\n")
+    buf.write("\ufeff")
+    writer.writerow(fields)
+    for batch in records:
+        # 记录的键顺序就是 fields 的顺序
+        writer.writerows(rec.values() for rec in batch)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+def _stream(sess: Session, name: str, fmt: str, fields: tuple[str, ...], records) -> StreamingResponse:
+    sess.close()  # 鉴权用完就还连接，导出期间只占副本的一个连接
+    filename = f"{name}-{now_utc():%Y%m%d%H%M%S}.{fmt}"
+    return StreamingResponse(
+        _encode(records, fmt, fields),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.get("/admin/exports/orders")
+def export_orders(
+    format: Format = "csv",
+    flt: ExportFilter = Depends(),
+    sess: Session = Depends(db),
+    _: User = Depends(admin_user),
+):
+    """每个订单一行，座位标签用空格连接。"""
+    records = ([_order_record(*item) for item in chunk] for chunk in _chunks(flt))
+    return _stream(sess, "orders", format, ORDER_FIELDS, records)
+
+
+@router.get("/admin/exports/tickets")
+def export_tickets(
+    format: Format = "csv",
+    flt: ExportFilter = Depends(),
+    sess: Session = Depends(db),
+    _: User = Depends(admin_user),
+):
+    """每张票一行（选座订单每个座位一行，通票订单一行）；不指定 status 时只导出已支付的。"""
+    if not flt.status:
+        flt.status = "PAID"
+    records = ([rec for item in chunk for rec in _ticket_records(*item)] for chunk in _chunks(flt))
+    return _stream(sess, "tickets", format, TICKET_FIELDS, records)
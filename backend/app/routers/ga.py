@@ -0,0 +1,56 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+
+from .. import ga
+from ..database import db
+from ..models import GaHold, GaInventory, Showtime, User
+from ..schemas import GaHoldIn, GaHoldOut, GaInventoryIn, GaInventoryOut
+from ..security import admin_user, current_user
+from ..time_utils import iso_utc_z
+
+router = APIRouter()
+
+
+@router.put("/admin/showtimes/{showtime_id}/ga", response_model=GaInventoryOut)
+def admin_set_ga_inventory(
+    showtime_id: int,
+    body: GaInventoryIn,
+    sess: Session = Depends(db),
+    _: User = Depends(admin_user),
+):
+    """把场次设为通票并设置容量（可重复调用调整容量）"""
+    if not sess.get(Showtime, showtime_id):
+        raise HTTPException(404, "场次不存在")
+    inv = ga.set_capacity(sess, showtime_id, body.capacity)
+    sess.commit()
+    return ga.inventory_out(inv)
+
+
+@router.get("/showtimes/{showtime_id}/ga", response_model=GaInventoryOut)
+def ga_inventory(showtime_id: int, sess: Session = Depends(db)):
+    ga.cleanup_expired_ga_holds(sess, showtime_id=showtime_id)
+    sess.commit()
+    inv = sess.get(GaInventory, showtime_id)
+    if not inv:
+        raise HTTPException(404, "该场次未开放通票")
+    return ga.inventory_out(inv)
+
+
+@router.post("/showtimes/{showtime_id}/ga/hold", response_model=GaHoldOut)
+def ga_hold(showtime_id: int, body: GaHoldIn, sess: Session = Depends(db), u: User = Depends(current_user)):
+    show = sess.get(Showtime, showtime_id)
+    if not show:
+        raise HTTPException(404, "场次不存在")
+    gh = ga.hold(sess, show, u.id, body.quantity)
+    sess.commit()
+    return GaHoldOut(hold_token=gh.id, expires_at=iso_utc_z(gh.expires_at), quantity=gh.quantity)
+
+
+@router.post("/ga-holds/{hold_token}/release")
+def ga_release(hold_token: str, sess: Session = Depends(db), u: User = Depends(current_user)):
+    gh = sess.get(GaHold, hold_token)
+    if not gh or gh.user_id != u.id:
+        raise HTTPException(404, "锁票不存在")
+    ga.release(sess, gh)
+    sess.commit()
+    return {"ok": True}
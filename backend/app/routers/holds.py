@@ -2,14 +2,20 @@ import uuid
 from datetime import timedelta
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import and_, delete, select
+from sqlalchemy import delete, select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from .. import archive, inventory, seat_bitmap
 from ..config import HOLD_MINUTES
 from ..database import db
-from ..models import Hall, HoldGroup, Order, OrderSeat, Seat, SeatHold, Showtime, User
+from ..fast_json import dumps
+from ..metrics import HOLD_CONFLICTS
+from ..models import GaInventory, HoldGroup, OrderSeat, SeatHold, Showtime, User
+from ..outbox import emit
+from ..pricing import hall_seat_index
 from ..schemas import HoldIn, HoldOut
+from ..sections import bump_counters
 from ..security import current_user
 from ..time_utils import iso_utc_z, now_utc
 from ..utils import cleanup_expired_holds
@@ -24,48 +30,83 @@ def hold_seats(showtime_id: int, body: HoldIn, sess: Session = Depends(db), u: U
         raise HTTPException(404, "场次不存在")
     if not body.seat_ids:
         raise HTTPException(400, "请选择座位")
+    if sess.get(GaInventory, showtime_id):
+        raise HTTPException(400, "该场次为通票，请按数量购票")
+    if archive.is_archived(show):
+        # 订单座位已搬进归档库，热表里查不出已售座位
+        raise HTTPException(400, "场次已归档，不能再锁座")
 
     cleanup_expired_holds(sess, showtime_id=showtime_id)
     sess.flush()
 
-    hall = sess.get(Hall, show.hall_id)
-    valid_seat_ids = set(sess.scalars(select(Seat.id).where(Seat.hall_id == hall.id)).all())
+    valid_seat_ids = hall_seat_index(sess, show.hall_id)
     for sid in body.seat_ids:
         if sid not in valid_seat_ids:
             raise HTTPException(400, f"非法座位: {sid}")
 
-    sold = set(
-        sess.scalars(
-            select(OrderSeat.seat_id)
-            .join(Order, OrderSeat.order_id == Order.id)
-            .where(and_(OrderSeat.showtime_id == showtime_id, Order.status == "PAID"))
-        ).all()
-    )
-    if any(sid in sold for sid in body.seat_ids):
-        raise HTTPException(409, "包含已售座位，请刷新")
-
     hold_token = uuid.uuid4().hex
     expires_at = now_utc() + timedelta(minutes=HOLD_MINUTES)
 
-    hg = HoldGroup(id=hold_token, user_id=u.id, showtime_id=showtime_id, expires_at=expires_at)
-    sess.add(hg)
-    sess.flush()
+    # 启用了库存服务时先在服务里原子占位，冲突直接返回，不用再查已售座位
+    reserved = None
+    if inventory.enabled():
+        reserved = inventory.try_hold(showtime_id, u.id, body.seat_ids, expires_at, hold_token)
+        if reserved is not None and reserved[0] == inventory.SOLD:
+            HOLD_CONFLICTS.inc("seat", "sold")
+            raise HTTPException(409, "包含已售座位，请刷新")
+        if reserved is not None and reserved[0] == inventory.HELD:
+            HOLD_CONFLICTS.inc("seat", "held")
+            raise HTTPException(409, "座位已被他人锁定，请换座或刷新")
+        if reserved is not None and reserved[0] != inventory.OK:
+            reserved = None  # 服务里的场次数据和库里对不上，按数据库路径处理
+    if reserved is None and not seat_bitmap.enabled():
+        # 未支付订单占用的座位同样不可再锁（checkout 时会撞 uq_sold_seat_once）
+        sold = set(sess.scalars(select(OrderSeat.seat_id).where(OrderSeat.showtime_id == showtime_id)).all())
+        if any(sid in sold for sid in body.seat_ids):
+            HOLD_CONFLICTS.inc("seat", "sold")
+            raise HTTPException(409, "包含已售座位，请刷新")
 
     try:
-        for sid in body.seat_ids:
-            sess.add(
-                SeatHold(
-                    hold_group_id=hold_token,
-                    showtime_id=showtime_id,
-                    seat_id=sid,
-                    user_id=u.id,
-                    expires_at=expires_at,
+        if seat_bitmap.enabled():
+            # 位图模式：一次 CAS 更新代替逐座位插入 seat_holds，明细提交后异步补写
+            seat_bitmap.hold(sess, showtime_id, show.hall_id, body.seat_ids)
+        hg = HoldGroup(id=hold_token, user_id=u.id, showtime_id=showtime_id, expires_at=expires_at,
+                       seat_ids=dumps(body.seat_ids).decode())
+        sess.add(hg)
+        sess.flush()
+        if seat_bitmap.enabled():
+            seat_bitmap.audit_hold(sess, hold_token, showtime_id, u.id, expires_at, body.seat_ids)
+        else:
+            for sid in body.seat_ids:
+                sess.add(
+                    SeatHold(
+                        hold_group_id=hold_token,
+                        showtime_id=showtime_id,
+                        seat_id=sid,
+                        user_id=u.id,
+                        expires_at=expires_at,
+                    )
                 )
-            )
+            sess.flush()
+        bump_counters(sess, showtime_id, body.seat_ids, held=1)
+        emit(sess, "hold.created", showtime_id=showtime_id, user_id=u.id, ref=hold_token,
+             seat_ids=list(body.seat_ids), expires_at=iso_utc_z(expires_at))
         sess.commit()
-    except IntegrityError:
+    except (IntegrityError, seat_bitmap.SeatTaken) as e:
         sess.rollback()
+        if reserved is not None:
+            # 服务放行了但库里有冲突：服务里的状态过时了，让它重新加载
+            inventory.drop(showtime_id)
+        if isinstance(e, seat_bitmap.SeatTaken) and e.reason == "sold":
+            HOLD_CONFLICTS.inc("seat", "sold")
+            raise HTTPException(409, "包含已售座位，请刷新")
+        HOLD_CONFLICTS.inc("seat", "held")
         raise HTTPException(409, "座位已被他人锁定，请换座或刷新")
+    except Exception:
+        # 进程直接被杀时走不到这里：服务里的占位没有 hold.created 确认，INVENTORY_RESERVE_SECONDS 后自动失效
+        if reserved is not None:
+            inventory.release(showtime_id, hold_token)
+        raise
 
     return HoldOut(hold_token=hold_token, expires_at=iso_utc_z(expires_at), seat_ids=body.seat_ids)
 
@@ -75,7 +116,19 @@ def release_hold(hold_token: str, sess: Session = Depends(db), u: User = Depends
     hg = sess.get(HoldGroup, hold_token)
     if not hg or hg.user_id != u.id:
         raise HTTPException(404, "锁座不存在")
-    sess.execute(delete(SeatHold).where(SeatHold.hold_group_id == hold_token))
-    sess.execute(delete(HoldGroup).where(HoldGroup.id == hold_token))
+    seat_ids = seat_bitmap.group_seat_ids(sess, hg)
+    # 先删锁座行：删到了才说明过期清理没有抢先处理它，这些座位的锁定状态还归这次释放
+    if sess.execute(delete(HoldGroup).where(HoldGroup.id == hold_token)).rowcount:
+        bump_counters(sess, hg.showtime_id, seat_ids, held=-1)
+        if seat_bitmap.enabled():
+            seat_bitmap.release(sess, hg.showtime_id, sess.get(Showtime, hg.showtime_id).hall_id, seat_ids)
+            seat_bitmap.audit_drop(sess, [hold_token])
+        else:
+            sess.execute(delete(SeatHold).where(SeatHold.hold_group_id == hold_token))
+        emit(sess, "hold.released", showtime_id=hg.showtime_id, user_id=u.id, ref=hold_token,
+             seat_ids=list(seat_ids))
     sess.commit()
+    if inventory.enabled():
+        # outbox 跟读也会释放，这里直接通知让座位立刻可选
+        inventory.release(hg.showtime_id, hold_token)
     return {"ok": True}
@@ -0,0 +1,12 @@
+from fastapi import APIRouter
+from starlette.responses import PlainTextResponse
+
+from ..metrics import render_prometheus
+
+router = APIRouter()
+
+
+@router.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Prometheus 抓取入口（文本格式 0.0.4）"""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
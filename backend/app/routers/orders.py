@@ -1,15 +1,25 @@
 import uuid
+from datetime import timedelta
 from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy import delete, select
+from sqlalchemy import delete, or_, select, update
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from ..database import db
+from .. import archive, ga, seat_bitmap
+from ..config import ORDER_PAY_MINUTES
+from ..database import db, read_db
+from ..fast_json import FastJSONResponse
+from ..metrics import CHECKOUTS
 # ✅ 1. 引入所有活动相关的模型
-from ..models import Cinema, Hall, HoldGroup, Movie, Order, OrderSeat, Seat, SeatHold, Showtime, User, Event
+from ..models import Cinema, Event, GaHold, Hall, HoldGroup, Movie, Order, OrderSeat, Seat, SeatHold, Showtime, User
+from ..outbox import emit
+from ..pricing import total_price
+from ..reaper import expire_orders
+from ..reports import record_canceled, record_paid
 from ..schemas import CheckoutIn, OrderOut
+from ..sections import bump_counters
 from ..security import current_user
 from ..time_utils import iso_utc_z, now_utc
 from ..utils import cleanup_expired_holds
@@ -30,20 +40,98 @@ def get_event_title(sess: Session, show: Showtime) -> str:
         if e: title = e.title
     return title
 
+def event_titles(sess: Session, shows) -> dict[tuple[str, int], str]:
+    """批量版 get_event_title：(event_kind, target_id) -> 标题，最多两条查询。"""
+    movie_ids = {s.target_id for s in shows if s.event_kind == "movie"}
+    event_ids = {s.target_id for s in shows if s.event_kind in ("concert", "exhibition")}
+    out = {}
+    if movie_ids:
+        for mid, title in sess.execute(select(Movie.id, Movie.title).where(Movie.id.in_(movie_ids))).all():
+            out[("movie", mid)] = title
+    if event_ids:
+        # 与 get_event_title 一致：演唱会和漫展都按 id 查 Event 表，不校验 kind
+        for eid, title in sess.execute(select(Event.id, Event.title).where(Event.id.in_(event_ids))).all():
+            out[("concert", eid)] = out[("exhibition", eid)] = title
+    return out
+
+
+def seat_labels_by_order(sess: Session, order_ids, seat_model=OrderSeat) -> dict[str, list[str]]:
+    """批量取多个订单的座位标签，一条查询，按排、列排序。seat_model 可以是归档表。"""
+    out: dict[str, list[str]] = {}
+    if not order_ids:
+        return out
+    rows = sess.execute(
+        select(seat_model.order_id, Seat.label)
+        .join(Seat, seat_model.seat_id == Seat.id)
+        .where(seat_model.order_id.in_(list(order_ids)))
+        .order_by(Seat.row, Seat.col)
+    ).all()
+    for oid, label in rows:
+        out.setdefault(oid, []).append(label)
+    return out
+
+
+def pay_deadline_out(order: Order) -> str | None:
+    return iso_utc_z(order.pay_deadline) if order.pay_deadline else None
+
+
+def order_seat_labels(sess: Session, order: Order) -> list[str]:
+    if order.quantity:
+        return ga.ga_seat_labels(order.quantity)
+    seat_ids = sess.scalars(select(OrderSeat.seat_id).where(OrderSeat.order_id == order.id)).all()
+    seats = sess.scalars(select(Seat).where(Seat.id.in_(seat_ids))).all()
+    return [s.label for s in sorted(seats, key=lambda x: (x.row, x.col))]
+
+
+def _ga_checkout(sess: Session, gh: GaHold, u: User) -> OrderOut:
+    show = sess.get(Showtime, gh.showtime_id)
+    order = ga.checkout(sess, gh, show, u.id)
+    sess.commit()
+
+    hall = sess.get(Hall, show.hall_id)
+    cinema = sess.get(Cinema, hall.cinema_id)
+    return OrderOut(
+        id=order.id,
+        status=order.status,
+        total_cents=order.total_cents,
+        created_at=iso_utc_z(order.created_at),
+        movie_title=get_event_title(sess, show),
+        start_time=iso_utc_z(show.start_time),
+        hall_name=hall.name,
+        cinema_name=cinema.name,
+        seats=ga.ga_seat_labels(order.quantity),
+        ticket_code=order.ticket_code,
+        pay_deadline=pay_deadline_out(order),
+    )
+
+
 @router.post("/orders/checkout", response_model=OrderOut)
 def checkout(body: CheckoutIn, sess: Session = Depends(db), u: User = Depends(current_user)):
     hg = sess.get(HoldGroup, body.hold_token)
+    if not hg:
+        # 通票锁票和选座锁座共用同一个下单接口
+        gh = sess.get(GaHold, body.hold_token)
+        if gh and gh.user_id == u.id:
+            return _ga_checkout(sess, gh, u)
     if not hg or hg.user_id != u.id:
+        CHECKOUTS.inc("seat", "not_found")
         raise HTTPException(404, "锁座不存在")
 
     if hg.expires_at < now_utc():
+        CHECKOUTS.inc("seat", "expired")
         raise HTTPException(409, "锁座已过期，请重新选座")
 
     cleanup_expired_holds(sess, showtime_id=hg.showtime_id)
     sess.flush()
 
-    holds = sess.scalars(select(SeatHold).where(SeatHold.hold_group_id == body.hold_token)).all()
-    if not holds:
+    if seat_bitmap.enabled():
+        # 位图模式没有同步的 seat_holds，座位列表在锁座行里；行被过期清理删掉了就是失效
+        live = sess.scalar(select(HoldGroup.id).where(HoldGroup.id == body.hold_token))
+        seat_ids = seat_bitmap.group_seat_ids(sess, hg) if live else []
+    else:
+        seat_ids = sess.scalars(select(SeatHold.seat_id).where(SeatHold.hold_group_id == body.hold_token)).all()
+    if not seat_ids:
+        CHECKOUTS.inc("seat", "invalid")
         raise HTTPException(409, "锁座已失效，请重新选座")
 
     show = sess.get(Showtime, hg.showtime_id)
@@ -53,12 +141,11 @@ def checkout(body: CheckoutIn, sess: Session = Depends(db), u: User = Depends(cu
     # ✅ 2. 修复：不再硬编码 Movie，而是动态获取标题
     event_title = get_event_title(sess, show)
 
-    seat_ids = [h.seat_id for h in holds]
     seats = sess.scalars(select(Seat).where(Seat.id.in_(seat_ids))).all()
     seat_labels = [s.label for s in sorted(seats, key=lambda x: (x.row, x.col))]
 
     order_id = uuid.uuid4().hex
-    total = show.price_cents * len(seat_ids)
+    total = total_price(sess, show, seat_ids)
 
     order = Order(
         id=order_id,
@@ -67,21 +154,34 @@ def checkout(body: CheckoutIn, sess: Session = Depends(db), u: User = Depends(cu
         status="CREATED",
         total_cents=total,
         ticket_code="",
+        pay_deadline=now_utc() + timedelta(minutes=ORDER_PAY_MINUTES),
     )
     sess.add(order)
     sess.flush()
 
     try:
+        # 先删锁座行：同一锁座被并发释放或下单时只有一方删得到
+        if not sess.execute(delete(HoldGroup).where(HoldGroup.id == body.hold_token)).rowcount:
+            raise seat_bitmap.SeatTaken("held")
+        if seat_bitmap.enabled():
+            seat_bitmap.sell(sess, show.id, show.hall_id, seat_ids)
+            seat_bitmap.audit_drop(sess, [body.hold_token])
+        else:
+            sess.execute(delete(SeatHold).where(SeatHold.hold_group_id == body.hold_token))
         for sid in seat_ids:
             sess.add(OrderSeat(order_id=order_id, showtime_id=show.id, seat_id=sid))
-
-        sess.execute(delete(SeatHold).where(SeatHold.hold_group_id == body.hold_token))
-        sess.execute(delete(HoldGroup).where(HoldGroup.id == body.hold_token))
+        sess.flush()
+        bump_counters(sess, show.id, seat_ids, held=-1, sold=1)
+        emit(sess, "order.created", showtime_id=show.id, user_id=u.id, ref=order_id,
+             hold_token=body.hold_token, total_cents=total, seat_ids=list(seat_ids))
         sess.commit()
-    except IntegrityError:
+    except (IntegrityError, seat_bitmap.SeatTaken):
         sess.rollback()
+        CHECKOUTS.inc("seat", "conflict")
         raise HTTPException(409, "座位已被抢，请重新选座")
 
+    CHECKOUTS.inc("seat", "created")
+
     return OrderOut(
         id=order.id,
         status=order.status,
@@ -93,6 +193,7 @@ def checkout(body: CheckoutIn, sess: Session = Depends(db), u: User = Depends(cu
         cinema_name=cinema.name,
         seats=seat_labels,
         ticket_code=order.ticket_code,
+        pay_deadline=pay_deadline_out(order),
     )
 
 
@@ -102,14 +203,40 @@ def mock_pay(order_id: str, sess: Session = Depends(db), u: User = Depends(curre
     if not order or order.user_id != u.id:
         raise HTTPException(404, "订单不存在")
 
+    now = now_utc()
+    if order.status == "CREATED" and order.pay_deadline is not None and order.pay_deadline < now:
+        # reaper 还没扫到这一单，这里直接回收
+        expire_orders(sess, [order.id], now)
+        sess.commit()
+        raise HTTPException(409, "订单已超过支付时限，座位已释放，请重新选座下单")
+    if order.status == "EXPIRED":
+        raise HTTPException(409, "订单已超过支付时限，座位已释放，请重新选座下单")
+
+    ticket_code = f"TKT-{uuid.uuid4().hex[:10].upper()}"
     if order.status == "PAID":
-        pass
+        order.ticket_code = ticket_code
     elif order.status != "CREATED":
         raise HTTPException(409, f"订单状态不可支付：{order.status}")
-
-    order.status = "PAID"
-    order.ticket_code = f"TKT-{uuid.uuid4().hex[:10].upper()}"
+    else:
+        # 带条件更新：和 reaper 的 CREATED -> EXPIRED 只会有一方成功
+        res = sess.execute(
+            update(Order)
+            .where(
+                Order.id == order.id,
+                Order.status == "CREATED",
+                or_(Order.pay_deadline.is_(None), Order.pay_deadline >= now),
+            )
+            .values(status="PAID", ticket_code=ticket_code, paid_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        if res.rowcount == 0:
+            sess.rollback()
+            raise HTTPException(409, "订单已超过支付时限，座位已释放，请重新选座下单")
+        record_paid(sess, order, now)
+        emit(sess, "order.paid", showtime_id=order.showtime_id, user_id=u.id, ref=order.id,
+             total_cents=order.total_cents)
     sess.commit()
+    sess.refresh(order)
 
     show = sess.get(Showtime, order.showtime_id)
     hall = sess.get(Hall, show.hall_id)
@@ -117,10 +244,7 @@ def mock_pay(order_id: str, sess: Session = Depends(db), u: User = Depends(curre
 
     # ✅ 3. 修复：这里原来有 show.movie_id，已修改为动态获取
     event_title = get_event_title(sess, show)
-
-    seat_ids = [x.seat_id for x in order.seats]
-    seats = sess.scalars(select(Seat).where(Seat.id.in_(seat_ids))).all()
-    seat_labels = [s.label for s in sorted(seats, key=lambda x: (x.row, x.col))]
+    seat_labels = order_seat_labels(sess, order)
 
     return OrderOut(
         id=order.id,
@@ -133,6 +257,7 @@ def mock_pay(order_id: str, sess: Session = Depends(db), u: User = Depends(curre
         cinema_name=cinema.name,
         seats=seat_labels,
         ticket_code=order.ticket_code,
+        pay_deadline=pay_deadline_out(order),
     )
 
 
@@ -146,48 +271,85 @@ def cancel_order(order_id: str, sess: Session = Depends(db), u: User = Depends(c
     if order.status != "CREATED":
         return {"ok": True}
 
-    sess.execute(delete(OrderSeat).where(OrderSeat.order_id == order_id))
-    order.status = "CANCELED"
+    # 先抢状态：reaper 同时回收这一单时，库存只退一次
+    res = sess.execute(
+        update(Order)
+        .where(Order.id == order_id, Order.status == "CREATED")
+        .values(status="CANCELED")
+        .execution_options(synchronize_session=False)
+    )
+    if res.rowcount == 0:
+        sess.rollback()
+        return {"ok": True}
+
+    if order.quantity:
+        ga.cancel(sess, order)
+        released = {"quantity": order.quantity}
+    else:
+        seat_ids = sess.scalars(select(OrderSeat.seat_id).where(OrderSeat.order_id == order_id)).all()
+        bump_counters(sess, order.showtime_id, seat_ids, sold=-1)
+        sess.execute(delete(OrderSeat).where(OrderSeat.order_id == order_id))
+        if seat_bitmap.enabled():
+            seat_bitmap.unsell(sess, {order.showtime_id: list(seat_ids)})
+        released = {"seat_ids": list(seat_ids)}
+    emit(sess, "order.canceled", showtime_id=order.showtime_id, user_id=u.id, ref=order_id, **released)
+    record_canceled(sess, [(order.showtime_id, order.created_at)])
     sess.commit()
     return {"ok": True}
 
 
 @router.get("/orders", response_model=List[OrderOut])
-def list_orders(sess: Session = Depends(db), u: User = Depends(current_user)):
+def list_orders(sess: Session = Depends(read_db), u: User = Depends(current_user)):
     # ✅ 4. 修复：移除 .join(Movie, ...)
     # 以前是强制 JOIN Movie，现在 showtime 可能是 concert，JOIN Movie 会过滤掉非电影订单或报错
-    stmt = (
-        select(Order, Showtime, Hall, Cinema)
-        .join(Showtime, Order.showtime_id == Showtime.id)
-        .join(Hall, Showtime.hall_id == Hall.id)
-        .join(Cinema, Hall.cinema_id == Cinema.id)
-        .where(Order.user_id == u.id)
-        .order_by(Order.created_at.desc())
-    )
-    rows = sess.execute(stmt).all()
+    # 热表和归档表各查一次再合并；归档正好提交在两次查询之间时同一订单会出现两次，只留先查到的
+    rows = []
+    seen: set[str] = set()
+    labels: dict[str, list[str]] = {}
+    for order_model, seat_model in archive.order_models():
+        part = sess.execute(
+            select(order_model, Showtime, Hall, Cinema)
+            .join(Showtime, order_model.showtime_id == Showtime.id)
+            .join(Hall, Showtime.hall_id == Hall.id)
+            .join(Cinema, Hall.cinema_id == Cinema.id)
+            .where(order_model.user_id == u.id)
+            .order_by(order_model.created_at.desc())
+        ).all()
+        part = [r for r in part if r[0].id not in seen]
+        seen.update(order.id for order, _, _, _ in part)
+        # 座位标签批量取，查询次数不随订单数增长
+        order_ids = [order.id for order, _, _, _ in part if not order.quantity]
+        labels.update(seat_labels_by_order(sess, order_ids, seat_model))
+        rows += part
+    if len(rows) > 1:
+        rows.sort(key=lambda r: r[0].created_at, reverse=True)
+
+    titles = event_titles(sess, [show for _, show, _, _ in rows])
 
     out = []
     # 结果不再包含 movie 对象，需要手动获取 title
     for order, show, hall, cinema in rows:
-        seat_ids = sess.scalars(select(OrderSeat.seat_id).where(OrderSeat.order_id == order.id)).all()
-        seats = sess.scalars(select(Seat).where(Seat.id.in_(seat_ids))).all()
-        seat_labels = [s.label for s in sorted(seats, key=lambda x: (x.row, x.col))]
+        if order.quantity:
+            seat_labels = ga.ga_seat_labels(order.quantity)
+        else:
+            seat_labels = labels.get(order.id, [])
 
         # ✅ 5. 动态获取标题
-        event_title = get_event_title(sess, show)
+        event_title = titles.get((show.event_kind, show.target_id), "未知活动")
 
         out.append(
-            OrderOut(
-                id=order.id,
-                status=order.status,
-                total_cents=order.total_cents,
-                created_at=iso_utc_z(order.created_at),
-                movie_title=event_title, # 前端字段名没变，但内容是动态的
-                start_time=iso_utc_z(show.start_time),
-                hall_name=hall.name,
-                cinema_name=cinema.name,
-                seats=seat_labels,
-                ticket_code=order.ticket_code,
-            )
+            {
+                "id": order.id,
+                "status": order.status,
+                "total_cents": order.total_cents,
+                "created_at": iso_utc_z(order.created_at),
+                "movie_title": event_title, # 前端字段名没变，但内容是动态的
+                "start_time": iso_utc_z(show.start_time),
+                "hall_name": hall.name,
+                "cinema_name": cinema.name,
+                "seats": seat_labels,
+                "ticket_code": order.ticket_code,
+                "pay_deadline": pay_deadline_out(order),
+            }
         )
-    return out
\ No newline at end of file
+    return FastJSONResponse(out)
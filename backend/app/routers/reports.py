@@ -0,0 +1,127 @@
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .. import reports
+from ..database import db, read_db
+from ..fast_json import FastJSONResponse
+from ..models import Cinema, Hall, Showtime, User
+from ..security import admin_user
+from ..time_utils import iso_utc_z
+from .orders import event_titles
+
+router = APIRouter()
+
+Sort = Literal["revenue", "tickets", "occupancy", "key"]
+
+
+class _EventKey:
+    """给 event_titles 用的最小"场次"：只有 event_kind 和 target_id。"""
+    __slots__ = ("event_kind", "target_id")
+
+    def __init__(self, event_kind: str, target_id: int):
+        self.event_kind = event_kind
+        self.target_id = target_id
+
+
+def _page(sess: Session, dim: str, sort: str, limit: int, offset: int, **kw) -> list[dict]:
+    return [reports.rollup_out(r) for r in reports.query(sess, dim, sort, limit, offset, **kw)]
+
+
+@router.get("/admin/reports/summary")
+def report_summary(sess: Session = Depends(read_db), _: User = Depends(admin_user)):
+    return FastJSONResponse(reports.totals(sess))
+
+
+@router.get("/admin/reports/showtimes")
+def report_showtimes(
+    sort: Sort = "revenue",
+    limit: int = Query(50, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    sess: Session = Depends(read_db),
+    _: User = Depends(admin_user),
+):
+    items = _page(sess, "showtime", sort, limit, offset)
+    ids = [int(i["key"]) for i in items]
+    shows = {
+        s.id: (s, hall_name, cinema_name)
+        for s, hall_name, cinema_name in sess.execute(
+            select(Showtime, Hall.name, Cinema.name)
+            .join(Hall, Showtime.hall_id == Hall.id)
+            .join(Cinema, Hall.cinema_id == Cinema.id)
+            .where(Showtime.id.in_(ids))
+        )
+    }
+    titles = event_titles(sess, [s for s, _, _ in shows.values()])
+    for item in items:
+        found = shows.get(int(item["key"]))
+        if found:
+            show, hall_name, cinema_name = found
+            item.update(
+                showtime_id=show.id,
+                title=titles.get((show.event_kind, show.target_id), "未知活动"),
+                start_time=iso_utc_z(show.start_time),
+                hall_name=hall_name,
+                cinema_name=cinema_name,
+            )
+    return FastJSONResponse(items)
+
+
+@router.get("/admin/reports/events")
+def report_events(
+    sort: Sort = "revenue",
+    limit: int = Query(50, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    sess: Session = Depends(read_db),
+    _: User = Depends(admin_user),
+):
+    items = _page(sess, "event", sort, limit, offset)
+    for item in items:
+        kind, _, target_id = item["key"].partition(":")
+        item.update(event_kind=kind, target_id=int(target_id))
+    titles = event_titles(sess, [_EventKey(i["event_kind"], i["target_id"]) for i in items])
+    for item in items:
+        item["title"] = titles.get((item["event_kind"], item["target_id"]), "未知活动")
+    return FastJSONResponse(items)
+
+
+@router.get("/admin/reports/cinemas")
+def report_cinemas(
+    sort: Sort = "revenue",
+    limit: int = Query(50, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    sess: Session = Depends(read_db),
+    _: User = Depends(admin_user),
+):
+    items = _page(sess, "cinema", sort, limit, offset)
+    names = dict(
+        sess.execute(select(Cinema.id, Cinema.name).where(Cinema.id.in_([int(i["key"]) for i in items]))).all()
+    )
+    for item in items:
+        item["cinema_id"] = int(item["key"])
+        item["cinema_name"] = names.get(item["cinema_id"], "")
+    return FastJSONResponse(items)
+
+
+@router.get("/admin/reports/days")
+def report_days(
+    start: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$", description="含，YYYY-MM-DD（UTC）"),
+    end: str | None = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$", description="含"),
+    limit: int = Query(366, ge=1, le=5000),
+    sess: Session = Depends(read_db),
+    _: User = Depends(admin_user),
+):
+    items = _page(sess, "day", "key", limit, 0, start=start, end=end)
+    for item in items:
+        item["day"] = item["key"]
+    return FastJSONResponse(items)
+
+
+@router.post("/admin/reports/rebuild")
+def rebuild_reports(sess: Session = Depends(db), _: User = Depends(admin_user)):
+    """按订单表全量重算汇总（增量维护出问题或口径调整后用）。"""
+    stats = reports.rebuild(sess)
+    sess.commit()
+    return stats
@@ -1,12 +1,16 @@
 from typing import Dict, List
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy import and_, select
 from sqlalchemy.orm import Session
 
+from .. import inventory, seat_bitmap
 from ..database import db
-from ..models import Hall, Order, OrderSeat, Seat, SeatHold, Showtime, User
-from ..schemas import SeatState
+from ..fast_json import FastJSONResponse
+from ..models import OrderSeat, Seat, SeatHold, Showtime, User
+from ..pricing import seat_price_lookup
+from ..schemas import SeatState, SectionSummary
+from ..sections import section_summary, tile_seats
 from ..security import current_user
 from ..time_utils import now_utc
 from ..utils import cleanup_expired_holds
@@ -14,79 +18,94 @@ from ..utils import cleanup_expired_holds
 router = APIRouter()
 
 
-@router.get("/showtimes/{showtime_id}/seats", response_model=List[SeatState])
-def showtime_seats(showtime_id: int, sess: Session = Depends(db)):
+def _seat_map(sess: Session, showtime_id: int, user_id: int | None = None) -> list[dict]:
     show = sess.get(Showtime, showtime_id)
     if not show:
         raise HTTPException(404, "场次不存在")
 
-    cleanup_expired_holds(sess, showtime_id=showtime_id)
-    sess.commit()
+    # 启用了库存服务时状态从服务取：不用清理过期锁座（一次写事务），也不查已售和锁座表
+    states = inventory.seat_states(showtime_id, user_id) if inventory.enabled() else None
+    if states is None:
+        cleanup_expired_holds(sess, showtime_id=showtime_id)
+        sess.commit()
 
-    hall = sess.get(Hall, show.hall_id)
-    seats = sess.scalars(select(Seat).where(Seat.hall_id == hall.id)).all()
+    # 只取需要的列，不构造 ORM 对象
+    seats = sess.execute(
+        select(Seat.id, Seat.label, Seat.row, Seat.col).where(Seat.hall_id == show.hall_id)
+    ).all()
 
-    sold = set(
-        sess.scalars(
-            select(OrderSeat.seat_id)
-            .join(Order, OrderSeat.order_id == Order.id)
-            .where(and_(OrderSeat.showtime_id == showtime_id, Order.status == "PAID"))
+    if states is None and seat_bitmap.enabled():
+        states = seat_bitmap.seat_states(sess, showtime_id, show.hall_id, user_id)
+        sess.commit()  # 场次第一次用到时建的位图
+    if states is None:
+        # 未支付订单占用的座位也不能再锁（见 hold_seats），同样显示为已售
+        sold = set(sess.scalars(select(OrderSeat.seat_id).where(OrderSeat.showtime_id == showtime_id)).all())
+
+        holds = sess.execute(
+            select(SeatHold.seat_id, SeatHold.user_id).where(
+                and_(SeatHold.showtime_id == showtime_id, SeatHold.expires_at >= now_utc())
+            )
         ).all()
-    )
-
-    holds = sess.execute(
-        select(SeatHold.seat_id, SeatHold.user_id).where(
-            and_(SeatHold.showtime_id == showtime_id, SeatHold.expires_at >= now_utc())
-        )
-    ).all()
-    hold_map: Dict[int, int] = {sid: uid for sid, uid in holds}
+        hold_map: Dict[int, int] = {sid: uid for sid, uid in holds}
+        states = {}
+        for sid, _, _, _ in seats:
+            if sid in sold:
+                states[sid] = "SOLD"
+            elif sid in hold_map:
+                states[sid] = "HELD_BY_ME" if user_id is not None and hold_map[sid] == user_id else "HELD"
+    price_of = seat_price_lookup(sess, show)
 
     out = []
-    for s in seats:
-        if s.id in sold:
-            state = "SOLD"
-        elif s.id in hold_map:
-            state = "HELD"
-        else:
-            state = "AVAILABLE"
-        out.append(SeatState(seat_id=s.id, label=s.label, row=s.row, col=s.col, state=state))
+    for sid, label, r, c in seats:
+        state = states.get(sid, "AVAILABLE")
+        out.append({"seat_id": sid, "label": label, "row": r, "col": c, "state": state, "price_cents": price_of(sid)})
     return out
 
 
+@router.get("/showtimes/{showtime_id}/seats", response_model=List[SeatState])
+def showtime_seats(showtime_id: int, sess: Session = Depends(db)):
+    return FastJSONResponse(_seat_map(sess, showtime_id))
+
+
 @router.get("/showtimes/{showtime_id}/seats/me", response_model=List[SeatState])
 def showtime_seats_me(showtime_id: int, sess: Session = Depends(db), u: User = Depends(current_user)):
+    return FastJSONResponse(_seat_map(sess, showtime_id, u.id))
+
+
+@router.get("/showtimes/{showtime_id}/sections", response_model=List[SectionSummary])
+def showtime_sections(showtime_id: int, sess: Session = Depends(db)):
+    """大场馆分区汇总：只读分区计数器，开销与分区数成正比"""
     show = sess.get(Showtime, showtime_id)
     if not show:
         raise HTTPException(404, "场次不存在")
 
     cleanup_expired_holds(sess, showtime_id=showtime_id)
+    out = section_summary(sess, show)
     sess.commit()
+    return out
 
-    hall = sess.get(Hall, show.hall_id)
-    seats = sess.scalars(select(Seat).where(Seat.hall_id == hall.id)).all()
-
-    sold = set(
-        sess.scalars(
-            select(OrderSeat.seat_id)
-            .join(Order, OrderSeat.order_id == Order.id)
-            .where(and_(OrderSeat.showtime_id == showtime_id, Order.status == "PAID"))
-        ).all()
-    )
 
-    holds = sess.execute(
-        select(SeatHold.seat_id, SeatHold.user_id).where(
-            and_(SeatHold.showtime_id == showtime_id, SeatHold.expires_at >= now_utc())
-        )
-    ).all()
-    hold_map: Dict[int, int] = {sid: uid for sid, uid in holds}
+@router.get("/showtimes/{showtime_id}/seats/tile", response_model=List[SeatState])
+def showtime_seats_tile(
+    showtime_id: int,
+    section: str | None = None,
+    row_min: int | None = Query(None, ge=0),
+    row_max: int | None = Query(None, ge=0),
+    col_min: int | None = Query(None, ge=0),
+    col_max: int | None = Query(None, ge=0),
+    sess: Session = Depends(db),
+):
+    """按分区或行列矩形（含端点）取座位状态，用于大场馆逐级下钻"""
+    if section is None and None in (row_min, row_max, col_min, col_max):
+        raise HTTPException(400, "请指定分区或完整的行列范围")
+    show = sess.get(Showtime, showtime_id)
+    if not show:
+        raise HTTPException(404, "场次不存在")
 
-    out = []
-    for s in seats:
-        if s.id in sold:
-            state = "SOLD"
-        elif s.id in hold_map:
-            state = "HELD_BY_ME" if hold_map[s.id] == u.id else "HELD"
-        else:
-            state = "AVAILABLE"
-        out.append(SeatState(seat_id=s.id, label=s.label, row=s.row, col=s.col, state=state))
-    return out
+    cleanup_expired_holds(sess, showtime_id=showtime_id)
+    out = tile_seats(sess, show, section, row_min, row_max, col_min, col_max)
+    sess.commit()
+    price_of = seat_price_lookup(sess, show)
+    for seat in out:
+        seat["price_cents"] = price_of(seat["seat_id"])
+    return FastJSONResponse(out)
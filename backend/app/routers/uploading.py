@@ -1,27 +1,130 @@
-import shutil
-import uuid
-from fastapi import APIRouter, UploadFile, File, HTTPException
+import hashlib
+import os
+import re
+import tempfile
+
+from fastapi import APIRouter, File, HTTPException, UploadFile
+from starlette.responses import JSONResponse
+
+from ..config import PUBLIC_BASE_URL, UPLOAD_DIR, UPLOAD_MAX_BYTES
+from ..static_files import precompress
 
 router = APIRouter()
 
-@router.post("/admin/upload")
-async def upload_image(file: UploadFile = File(...)):
-    # 简单的文件验证
-    if not file.content_type.startswith("image/"):
-        raise HTTPException(400, "仅支持上传图片")
+CHUNK_SIZE = 1024 * 1024
+# multipart 边界和表单头的余量
+FORM_OVERHEAD = 64 * 1024
+UPLOAD_PATH = "/admin/upload"
+
+IMAGE_EXTENSIONS = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/gif": "gif",
+    "image/webp": "webp",
+    "image/svg+xml": "svg",
+    "image/avif": "avif",
+}
+
+
+class UploadSizeLimit:
+    """在请求体被解析、落盘之前就卡住超大上传。
+
+    先看 Content-Length，再在读取请求体时累计字节数，超过上限直接 413，
+    不会把整个文件先缓冲下来。
+    """
+
+    def __init__(self, app, path: str = UPLOAD_PATH, max_bytes: int = UPLOAD_MAX_BYTES + FORM_OVERHEAD):
+        self.app = app
+        self.path = path
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length" and value.isdigit() and int(value) > self.max_bytes:
+                await JSONResponse({"detail": "文件过大"}, status_code=413)(scope, receive, send)
+                return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(413, "文件过大")
+            return message
 
-    # 生成唯一文件名防止覆盖
-    extension = file.filename.split(".")[-1]
-    filename = f"{uuid.uuid4()}.{extension}"
-    file_path = f"static/uploads/{filename}"
+        await self.app(scope, limited_receive, send)
+
+
+def _extension(file: UploadFile) -> str:
+    ext = IMAGE_EXTENSIONS.get(file.content_type or "")
+    if ext:
+        return ext
+    name_ext = (file.filename or "").rsplit(".", 1)[-1].lower()
+    return name_ext if re.fullmatch(r"[a-z0-9]{1,5}", name_ext) else "bin"
+
+
+def store_content_addressed(src, ext: str, max_bytes: int = UPLOAD_MAX_BYTES) -> tuple[str, int, bool]:
+    """分块读 src，边写临时文件边算 SHA-256，最后按哈希命名。
+
+    返回 (文件名, 字节数, 是否已存在)。同样内容再次上传时直接复用已有文件。
+    """
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=UPLOAD_DIR, prefix=".upload-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = src.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(413, "文件过大")
+                digest.update(chunk)
+                out.write(chunk)
+
+        filename = f"{digest.hexdigest()}.{ext}"
+        final_path = UPLOAD_DIR / filename
+        if final_path.exists():
+            os.unlink(tmp_path)
+            return filename, size, True
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, final_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    # 压缩副本在上传时一次生成，之后静态服务直接发送
+    precompress(final_path)
+    return filename, size, False
+
+
+@router.post(UPLOAD_PATH)
+def upload_image(file: UploadFile = File(...)):
+    # 同步接口：FastAPI 会放到线程池执行，读写文件不阻塞事件循环
+    if not (file.content_type or "").startswith("image/"):
+        raise HTTPException(400, "仅支持上传图片")
 
-    # 保存文件到本地
     try:
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-    except Exception as e:
+        filename, size, existed = store_content_addressed(file.file, _extension(file))
+    except HTTPException:
+        raise
+    except OSError as e:
         raise HTTPException(500, f"文件保存失败: {e}")
 
-    # 返回可访问的 URL (假设后端运行在 localhost:8000)
-    # 生产环境中这里可能需要返回完整的域名
-    return {"url": f"http://localhost:8000/{file_path}"}
\ No newline at end of file
+    # 文件名就是内容哈希，URL 不会再指向别的内容，可以长期缓存
+    return {
+        "url": f"{PUBLIC_BASE_URL}/static/uploads/{filename}",
+        "sha256": filename.split(".", 1)[0],
+        "size": size,
+        "deduplicated": existed,
+    }
@@ -0,0 +1,174 @@
+"""批量排片：按 日期 × 时刻 × 影厅 展开场次，用每个影厅的区间索引检测时间冲突。
+
+场次占用区间 = [开始, 开始 + 时长 + 清场时间)，时长取自电影/活动的 duration_min，
+没有时按 DEFAULT_DURATION_MIN。
+"""
+from bisect import bisect_left
+from datetime import date, datetime, time, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from .models import Event, Hall, Movie, Showtime
+from .schemas import BulkScheduleIn
+from .time_utils import iso_utc_z
+
+DEFAULT_DURATION_MIN = 120
+MAX_SLOTS = 5000
+
+
+def event_durations(sess: Session, pairs) -> dict[tuple[str, int], int]:
+    """(event_kind, target_id) -> 时长（分钟），两条查询取完。"""
+    movie_ids = {tid for kind, tid in pairs if kind == "movie"}
+    event_ids = {tid for kind, tid in pairs if kind != "movie"}
+    out: dict[tuple[str, int], int] = {}
+    if movie_ids:
+        for mid, dur in sess.execute(select(Movie.id, Movie.duration_min).where(Movie.id.in_(movie_ids))).all():
+            out[("movie", mid)] = dur or DEFAULT_DURATION_MIN
+    if event_ids:
+        for eid, kind, dur in sess.execute(
+            select(Event.id, Event.kind, Event.duration_min).where(Event.id.in_(event_ids))
+        ).all():
+            out[(kind, eid)] = dur or DEFAULT_DURATION_MIN
+    return out
+
+
+class HallIntervals:
+    """单个影厅的场次区间索引：按开始时间排序，插入和查询都是二分。"""
+
+    def __init__(self):
+        self.starts: list[datetime] = []
+        self.items: list[tuple[datetime, datetime, int | None]] = []
+        self.max_len = timedelta(0)
+
+    def add(self, start: datetime, end: datetime, showtime_id: int | None) -> None:
+        i = bisect_left(self.starts, start)
+        self.starts.insert(i, start)
+        self.items.insert(i, (start, end, showtime_id))
+        self.max_len = max(self.max_len, end - start)
+
+    def find_overlap(self, start: datetime, end: datetime):
+        """返回任意一个与 [start, end) 重叠的区间，没有则 None。"""
+        i = bisect_left(self.starts, start)
+        if i < len(self.items) and self.items[i][0] < end:
+            return self.items[i]
+        # 往前只需要看开始时间落在 start - 最长区间 之后的那些
+        j = i - 1
+        horizon = start - self.max_len
+        while j >= 0 and self.starts[j] > horizon:
+            if self.items[j][1] > start:
+                return self.items[j]
+            j -= 1
+        return None
+
+
+def load_hall_intervals(
+    sess: Session, hall_ids, start: datetime, end: datetime, buffer_min: int = 0
+) -> dict[int, HallIntervals]:
+    # 往前多看一天，覆盖跨越 start 的长场次
+    rows = sess.execute(
+        select(Showtime.id, Showtime.hall_id, Showtime.start_time, Showtime.event_kind, Showtime.target_id).where(
+            Showtime.hall_id.in_(list(hall_ids)),
+            Showtime.start_time >= start - timedelta(days=1),
+            Showtime.start_time < end,
+        )
+    ).all()
+    durations = event_durations(sess, {(kind, tid) for _, _, _, kind, tid in rows})
+    index = {hid: HallIntervals() for hid in hall_ids}
+    buffer = timedelta(minutes=buffer_min)
+    for sid, hid, st, kind, tid in rows:
+        dur = timedelta(minutes=durations.get((kind, tid), DEFAULT_DURATION_MIN))
+        index[hid].add(st, st + dur + buffer, sid)
+    return index
+
+
+def find_hall_conflict(sess: Session, hall_id: int, start: datetime, duration_min: int, buffer_min: int = 0):
+    """单个场次创建前的冲突检查，返回冲突场次 id 或 None。"""
+    end = start + timedelta(minutes=duration_min + buffer_min)
+    index = load_hall_intervals(sess, [hall_id], start, end, buffer_min)[hall_id]
+    hit = index.find_overlap(start, end)
+    return hit[2] if hit else None
+
+
+def _expand_slots(body: BulkScheduleIn) -> list[tuple[int, datetime]]:
+    try:
+        d0 = date.fromisoformat(body.date_from)
+        d1 = date.fromisoformat(body.date_to)
+        times = [time.fromisoformat(t) for t in body.times]
+    except ValueError:
+        raise HTTPException(400, "日期应为 YYYY-MM-DD，时刻应为 HH:MM")
+    if d1 < d0:
+        raise HTTPException(400, "结束日期早于开始日期")
+
+    weekdays = set(body.weekdays)
+    offset = timedelta(minutes=body.tz_offset_min)
+    slots = []
+    d = d0
+    while d <= d1:
+        if not weekdays or d.weekday() in weekdays:
+            for t in times:
+                local = datetime.combine(d, t)
+                for hid in body.hall_ids:
+                    slots.append((hid, local - offset))
+                    if len(slots) > MAX_SLOTS:
+                        raise HTTPException(400, f"一次最多排 {MAX_SLOTS} 个场次")
+        d += timedelta(days=1)
+    slots.sort(key=lambda x: (x[1], x[0]))
+    return slots
+
+
+def bulk_schedule(sess: Session, body: BulkScheduleIn) -> dict:
+    """展开 body 描述的场次，跳过冲突的，其余一次批量写入。调用方负责 commit。"""
+    hall_ids = list(dict.fromkeys(body.hall_ids))
+    found = set(sess.scalars(select(Hall.id).where(Hall.id.in_(hall_ids))).all())
+    missing = [h for h in hall_ids if h not in found]
+    if missing:
+        raise HTTPException(404, f"影厅不存在: {missing}")
+
+    duration_min = body.duration_min
+    if duration_min is None:
+        duration_min = event_durations(sess, {(body.event_kind, body.target_id)}).get(
+            (body.event_kind, body.target_id), DEFAULT_DURATION_MIN
+        )
+    slots = _expand_slots(body)
+    if not slots:
+        return {"created": 0, "conflicts": 0, "slots": []}
+
+    length = timedelta(minutes=duration_min + body.buffer_min)
+    index = load_hall_intervals(sess, hall_ids, slots[0][1], slots[-1][1] + length, body.buffer_min)
+
+    report = []
+    rows = []
+    for hid, start in slots:
+        end = start + length
+        hit = index[hid].find_overlap(start, end)
+        item = {"hall_id": hid, "start_time": iso_utc_z(start), "end_time": iso_utc_z(end), "showtime_id": None}
+        if hit:
+            item["status"] = "CONFLICT"
+            item["conflict_with"] = hit[2]  # None 表示与本次请求里更早的场次冲突
+            item["conflict_start"] = iso_utc_z(hit[0])
+        else:
+            item["status"] = "CREATED"
+            index[hid].add(start, end, None)
+            rows.append(
+                {
+                    "target_id": body.target_id,
+                    "event_kind": body.event_kind,
+                    "hall_id": hid,
+                    "start_time": start,
+                    "price_cents": body.price_cents,
+                }
+            )
+        report.append(item)
+
+    if rows and not body.dry_run:
+        ids = sess.scalars(
+            insert(Showtime).returning(Showtime.id, sort_by_parameter_order=True), rows
+        ).all()
+        created = iter(ids)
+        for item in report:
+            if item["status"] == "CREATED":
+                item["showtime_id"] = next(created)
+
+    return {"created": len(rows), "conflicts": len(report) - len(rows), "dry_run": body.dry_run, "slots": report}
@@ -1,6 +1,6 @@
 from __future__ import annotations
 from pydantic import BaseModel, Field
-from typing import Optional, List, Literal
+from typing import Dict, Optional, List, Literal
 
 class TokenOut(BaseModel):
     access_token: str
@@ -80,6 +80,19 @@ class SeatState(BaseModel):
     row: int
     col: int
     state: str  # AVAILABLE/HELD/HELD_BY_ME/SOLD
+    price_cents: Optional[int] = None
+
+
+class SectionSummary(BaseModel):
+    section: str
+    capacity: int
+    available: int
+    held: int
+    sold: int
+    row_min: int
+    row_max: int
+    col_min: int
+    col_max: int
 
 
 class HoldIn(BaseModel):
@@ -92,6 +105,28 @@ class HoldOut(BaseModel):
     seat_ids: List[int]
 
 
+class GaInventoryIn(BaseModel):
+    capacity: int = Field(ge=0)
+
+
+class GaInventoryOut(BaseModel):
+    showtime_id: int
+    capacity: int
+    reserved: int
+    sold: int
+    available: int
+
+
+class GaHoldIn(BaseModel):
+    quantity: int = Field(ge=1, le=50)
+
+
+class GaHoldOut(BaseModel):
+    hold_token: str
+    expires_at: str
+    quantity: int
+
+
 class CheckoutIn(BaseModel):
     hold_token: str
 
@@ -107,6 +142,7 @@ class OrderOut(BaseModel):
     cinema_name: str
     seats: List[str]
     ticket_code: str = ""
+    pay_deadline: Optional[str] = None
 
 
 # --- 旧版 Admin Schema (为了兼容性补全 category) ---
@@ -129,8 +165,63 @@ class AdminCinemaIn(BaseModel):
 class AdminHallIn(BaseModel):
     cinema_id: int
     name: str = "1号厅"
-    rows: int = 8
-    cols: int = 12
+    # 和 HallSectionIn 的范围一致，超出时在这里返回 422，而不是在处理函数里构造分区时报错
+    rows: int = Field(8, ge=1, le=500)
+    cols: int = Field(12, ge=1, le=500)
+
+
+class HallSectionIn(BaseModel):
+    name: str = Field(min_length=1, max_length=8)
+    rows: int = Field(ge=1, le=500)
+    cols: int = Field(ge=1, le=500)
+    # 分区左上角在整个场馆网格中的位置
+    row_start: int = Field(0, ge=0)
+    col_start: int = Field(0, ge=0)
+    # 以下都是分区内的相对坐标（从 0 开始）
+    aisle_rows: List[int] = []
+    aisle_cols: List[int] = []
+    removed: List[str] = []  # "行:列" 或 "行:起始列-结束列"，如 "0:0-3"
+    zone: str = Field("", max_length=20)  # 整个分区默认的票价区
+
+
+class AdminHallLayoutIn(BaseModel):
+    cinema_id: int
+    name: str = "1号厅"
+    sections: List[HallSectionIn] = Field(min_length=1)
+
+
+class AdminHallOut(BaseModel):
+    id: int
+    rows: int
+    cols: int
+    rows_inserted: int
+    elapsed_ms: float
+
+
+class ZoneRectIn(BaseModel):
+    zone: str = Field(max_length=20)
+    # 不填的边界表示不限
+    section: Optional[str] = None
+    row_min: Optional[int] = None
+    row_max: Optional[int] = None
+    col_min: Optional[int] = None
+    col_max: Optional[int] = None
+
+
+class AdminHallZonesIn(BaseModel):
+    zones: List[ZoneRectIn]
+
+
+class AdminShowtimePricesIn(BaseModel):
+    prices: Dict[str, int]  # zone -> price_cents
+
+
+class ShowtimePricesOut(BaseModel):
+    showtime_id: int
+    base_price_cents: int
+    prices: Dict[str, int]
+    version: int
+    seats: int
 
 
 class AdminShowtimeIn(BaseModel):
@@ -141,6 +232,38 @@ class AdminShowtimeIn(BaseModel):
     price_cents: int = 4500
 
 
+class BulkScheduleIn(BaseModel):
+    target_id: int
+    event_kind: str
+    hall_ids: List[int] = Field(min_length=1)
+    date_from: str  # YYYY-MM-DD（含）
+    date_to: str  # YYYY-MM-DD（含）
+    weekdays: List[int] = []  # 0=周一 ... 6=周日，空表示每天
+    times: List[str] = Field(min_length=1)  # 当地时刻 HH:MM
+    tz_offset_min: int = 0  # 当地时间相对 UTC 的分钟偏移，东京为 540
+    price_cents: int = 4500
+    duration_min: Optional[int] = None  # 不填取电影/活动的时长
+    buffer_min: int = Field(0, ge=0)  # 清场时间
+    dry_run: bool = False
+
+
+class ScheduleSlotOut(BaseModel):
+    hall_id: int
+    start_time: str
+    end_time: str
+    status: str  # CREATED/CONFLICT
+    showtime_id: Optional[int] = None
+    conflict_with: Optional[int] = None
+    conflict_start: Optional[str] = None
+
+
+class BulkScheduleOut(BaseModel):
+    created: int
+    conflicts: int
+    dry_run: bool = False
+    slots: List[ScheduleSlotOut]
+
+
 # --- 新版 Event Schema (核心部分) ---
 
 class EventBase(BaseModel):
@@ -182,6 +305,39 @@ class EventOut(EventBase):
     class Config:
         from_attributes = True
 
+
+class CatalogRowIn(BaseModel):
+    """批量导入的一行；按 (kind, title) 匹配已有条目，空值表示不改这一列。"""
+    kind: Literal["movie", "concert", "exhibition"]
+    title: str = Field(min_length=1, max_length=200)
+    category: Optional[str] = Field(None, max_length=50)
+    description: Optional[str] = Field(None, max_length=2000)
+    poster_url: Optional[str] = Field(None, max_length=500)
+    status: Optional[Literal["ON", "OFF"]] = None
+    duration_min: Optional[int] = Field(None, gt=0, le=24 * 60)
+    rating: Optional[str] = Field(None, max_length=20)
+    venue: Optional[str] = Field(None, max_length=255)
+    price_info: Optional[str] = Field(None, max_length=255)
+
+    model_config = {"str_strip_whitespace": True}
+
+
+class CatalogRowError(BaseModel):
+    line: int
+    error: str
+    kind: Optional[str] = None
+    title: Optional[str] = None
+
+
+class CatalogImportOut(BaseModel):
+    rows: int
+    inserted: int
+    updated: int
+    failed: int
+    dry_run: bool = False
+    errors: List[CatalogRowError]
+    errors_truncated: bool = False
+
 # ✅ 新增：用户更新资料的模型
 class UserUpdate(BaseModel):
     name: Optional[str] = None
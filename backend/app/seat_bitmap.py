@@ -0,0 +1,409 @@
+"""位图座位库存（SEAT_STORE=bitmap）。
+
+默认（rows）每个锁座是一行 seat_holds、每个已售座位是一行 order_seats，座位图要把两张表按场次
+扫一遍，锁 10 个座位就是 10 次插入外加索引维护。位图模式下每个场次在 seat_bitmaps 里只有一行：
+
+- held / sold 两段位图，第 i 位是影厅里 id 第 i 小的座位；version 每次修改 +1。
+- 锁座、释放、下单、取消、过期都是"读一行 -> 在内存里改位 -> UPDATE ... WHERE version = 读到的值"，
+  没命中说明别的事务先改了，重读再试（乐观并发，次数见 ticketing_seat_cas_retries_total）。
+- 锁座的座位列表存在 hold_groups.seat_ids 里，释放和下单不再查 seat_holds；
+  谁锁的、什么时候过期也从 hold_groups 读（一次锁座一行，而不是一个座位一行）。
+- seat_holds 明细在事务提交后交给后台线程批量补写 / 删除，只作审计和切回 rows 模式用，
+  允许短暂落后；同一座位以过期时间更晚（更新的锁座）的那条为准。
+- order_seats 仍和订单同一事务写入：它是订单内容本身（订单详情、导出、报表、取消都读它），
+  uq_sold_seat_once 继续兜底防止重复售出。sold 位图只是它的索引。
+
+场次第一次用到（或影厅座位数变了）时按 order_seats 和未过期的 hold_groups 建位图（不读异步写的
+seat_holds）。当前模式记在 app_meta 里，切换模式要停掉全部 worker 再跑 python -m app.seed：
+模式变了才清空 seat_bitmaps（sync_store），切到 bitmap 后重新按明细建，不会用到过时的位图。
+worker 启动时只比对记录，不一致打 warning。
+"""
+import json
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .config import SEAT_AUDIT_BATCH, SEAT_AUDIT_FLUSH_SECONDS, SEAT_STORE
+from .database import SessionLocal
+from .metrics import SEAT_CAS_RETRIES
+from .models import AppMeta, HoldGroup, OrderSeat, SeatBitmap, SeatHold, Showtime
+from .pricing import hall_seat_index
+from .time_utils import now_utc
+
+log = logging.getLogger(__name__)
+
+_CAS_RETRIES = 10
+# app_meta 里记录上次 python -m app.seed 时的 SEAT_STORE
+STORE_KEY = "seat_store"
+# 审计明细整批写入的尝试次数，之后退回逐条写
+_AUDIT_ATTEMPTS = 2
+
+
+def enabled() -> bool:
+    return SEAT_STORE == "bitmap"
+
+
+class SeatTaken(Exception):
+    """reason: sold / held；重试次数用完时为 busy。"""
+
+    def __init__(self, reason: str, seat_id: int = 0):
+        super().__init__(reason, seat_id)
+        self.reason = reason
+        self.seat_id = seat_id
+
+
+def _test(bits, i: int) -> bool:
+    return bool(bits[i >> 3] & (1 << (i & 7)))
+
+
+def _set(bits: bytearray, i: int) -> None:
+    bits[i >> 3] |= 1 << (i & 7)
+
+
+def _clear(bits: bytearray, i: int) -> None:
+    bits[i >> 3] &= ~(1 << (i & 7)) & 0xFF
+
+
+def group_seat_ids(sess: Session, hg: HoldGroup) -> list[int]:
+    if hg.seat_ids is not None:
+        return json.loads(hg.seat_ids)
+    # 加 seat_ids 列之前建的锁座
+    return list(sess.scalars(select(SeatHold.seat_id).where(SeatHold.hold_group_id == hg.id)))
+
+
+def live_holds(sess: Session, showtime_id: int) -> list[tuple[int, int, datetime, str]]:
+    """未过期的锁座：(seat_id, user_id, expires_at, 锁座令牌)，两种模式都能用。"""
+    now = now_utc()
+    if not enabled():
+        return [
+            tuple(r)
+            for r in sess.execute(
+                select(SeatHold.seat_id, SeatHold.user_id, SeatHold.expires_at, SeatHold.hold_group_id)
+                .where(SeatHold.showtime_id == showtime_id, SeatHold.expires_at >= now)
+            )
+        ]
+    out = []
+    for hg in sess.scalars(
+        select(HoldGroup).where(HoldGroup.showtime_id == showtime_id, HoldGroup.expires_at >= now)
+    ):
+        out.extend((seat_id, hg.user_id, hg.expires_at, hg.id) for seat_id in group_seat_ids(sess, hg))
+    return out
+
+
+def _build(sess: Session, showtime_id: int, index: dict[int, int]) -> None:
+    """按明细表建位图；并发请求已经建好时什么也不做。"""
+    size = (len(index) + 7) // 8
+    held, sold = bytearray(size), bytearray(size)
+    for seat_id in sess.scalars(select(OrderSeat.seat_id).where(OrderSeat.showtime_id == showtime_id)):
+        if seat_id in index:
+            _set(sold, index[seat_id])
+    # 锁座按 hold_groups 算：seat_holds 明细是异步补写的，可能还缺刚锁的座位
+    for seat_id, _, _, _ in live_holds(sess, showtime_id):
+        if seat_id in index:
+            _set(held, index[seat_id])
+    try:
+        with sess.begin_nested():
+            sess.add(SeatBitmap(showtime_id=showtime_id, version=0, seat_count=len(index),
+                                held=bytes(held), sold=bytes(sold)))
+    except IntegrityError:
+        pass
+
+
+def _read(sess: Session, showtime_id: int, index: dict[int, int]):
+    """(version, held, sold)，没有位图或影厅座位数变了时按明细重建。"""
+    for _ in range(2):
+        row = sess.execute(
+            select(SeatBitmap.version, SeatBitmap.seat_count, SeatBitmap.held, SeatBitmap.sold)
+            .where(SeatBitmap.showtime_id == showtime_id)
+        ).first()
+        if row is not None and row.seat_count == len(index):
+            return row.version, row.held, row.sold
+        if row is not None:
+            sess.execute(delete(SeatBitmap).where(SeatBitmap.showtime_id == showtime_id))
+        _build(sess, showtime_id, index)
+    raise RuntimeError(f"场次 {showtime_id} 的座位位图建不起来")
+
+
+def _cas(sess: Session, op: str, showtime_id: int, hall_id: int, change) -> None:
+    """change(index, held, sold) 在内存里改位（可抛 SeatTaken），再按版本号写回。
+
+    index 是 pricing.hall_seat_index 的进程内缓存（座位 id -> 位置），不再每次按影厅扫座位表。
+    """
+    index = hall_seat_index(sess, hall_id)
+    for _ in range(_CAS_RETRIES):
+        version, held, sold = _read(sess, showtime_id, index)
+        held, sold = bytearray(held), bytearray(sold)
+        change(index, held, sold)
+        res = sess.execute(
+            update(SeatBitmap)
+            .where(SeatBitmap.showtime_id == showtime_id, SeatBitmap.version == version)
+            .values(version=version + 1, held=bytes(held), sold=bytes(sold))
+            .execution_options(synchronize_session=False)
+        )
+        if res.rowcount:
+            return
+        SEAT_CAS_RETRIES.inc(op)
+    raise SeatTaken("busy")
+
+
+def hold(sess: Session, showtime_id: int, hall_id: int, seat_ids) -> None:
+    """把座位标为锁定；有已售或已被锁的座位时抛 SeatTaken，位图不变。"""
+    def change(index, held, sold):
+        for sid in seat_ids:
+            i = index[sid]
+            if _test(sold, i):
+                raise SeatTaken("sold", sid)
+            if _test(held, i):
+                raise SeatTaken("held", sid)  # 请求里重复的座位也会在这里被拦下
+            _set(held, i)
+
+    _cas(sess, "hold", showtime_id, hall_id, change)
+
+
+def release(sess: Session, showtime_id: int, hall_id: int, seat_ids, op: str = "release") -> None:
+    def change(index, held, sold):
+        for sid in seat_ids:
+            if sid in index:
+                _clear(held, index[sid])
+
+    _cas(sess, op, showtime_id, hall_id, change)
+
+
+def sell(sess: Session, showtime_id: int, hall_id: int, seat_ids) -> None:
+    """锁定 -> 已售；座位已经卖出时抛 SeatTaken。"""
+    def change(index, held, sold):
+        for sid in seat_ids:
+            if _test(sold, index[sid]):
+                raise SeatTaken("sold", sid)
+        for sid in seat_ids:
+            _clear(held, index[sid])
+            _set(sold, index[sid])
+
+    _cas(sess, "sell", showtime_id, hall_id, change)
+
+
+def unsell(sess: Session, seats_by_showtime: dict[int, list[int]]) -> None:
+    """取消 / 超时释放已售座位。还没有位图的场次跳过，以后按 order_seats 建。"""
+    built = dict(
+        sess.execute(
+            select(SeatBitmap.showtime_id, Showtime.hall_id)
+            .join(Showtime, SeatBitmap.showtime_id == Showtime.id)
+            .where(SeatBitmap.showtime_id.in_(list(seats_by_showtime)))
+        ).all()
+    )
+    for showtime_id, hall_id in sorted(built.items()):
+        seat_ids = seats_by_showtime[showtime_id]
+
+        def change(index, held, sold, seat_ids=seat_ids):
+            for sid in seat_ids:
+                if sid in index:
+                    _clear(sold, index[sid])
+
+        _cas(sess, "unsell", showtime_id, hall_id, change)
+
+
+def seat_states(sess: Session, showtime_id: int, hall_id: int, user_id: int | None = None) -> dict[int, str]:
+    """座位 id -> HELD/HELD_BY_ME/SOLD，可选的座位不在结果里。
+
+    匿名请求只读位图一行；带用户时再读一次该场次未过期的 hold_groups 找出自己锁的座位。
+    """
+    index = hall_seat_index(sess, hall_id)
+    _, held, sold = _read(sess, showtime_id, index)
+    out = {}
+    for sid, i in index.items():
+        if _test(sold, i):
+            out[sid] = "SOLD"
+        elif _test(held, i):
+            out[sid] = "HELD"
+    if user_id is not None:
+        for seat_id, uid, _, _ in live_holds(sess, showtime_id):
+            if uid == user_id and out.get(seat_id) == "HELD":
+                out[seat_id] = "HELD_BY_ME"
+    return out
+
+
+def expired_groups(sess: Session, showtime_id: int | None = None) -> list[tuple[str, int, int, list[int]]]:
+    """已过期的锁座：(令牌, 场次, 用户, 座位 id)。"""
+    q = select(HoldGroup).where(HoldGroup.expires_at < now_utc())
+    if showtime_id is not None:
+        q = q.where(HoldGroup.showtime_id == showtime_id)
+    return [(hg.id, hg.showtime_id, hg.user_id, group_seat_ids(sess, hg)) for hg in sess.scalars(q)]
+
+
+def release_groups(sess: Session, groups) -> None:
+    """把过期锁座从位图里清掉；groups 同 expired_groups 的返回值。"""
+    per_show: dict[int, list[int]] = defaultdict(list)
+    for _, showtime_id, _, seat_ids in groups:
+        per_show[showtime_id].extend(seat_ids)
+    halls = dict(sess.execute(select(Showtime.id, Showtime.hall_id).where(Showtime.id.in_(list(per_show)))).all())
+    for showtime_id, seat_ids in sorted(per_show.items()):
+        if showtime_id in halls:
+            release(sess, showtime_id, halls[showtime_id], seat_ids, op="expire")
+
+
+def sync_store(sess: Session) -> int | None:
+    """模式和 app_meta 里记录的不同时清空位图并记下当前模式，返回清掉的行数；没变返回 None。
+
+    rows 模式不更新位图，留着会在切回 bitmap 时用到过时的状态；反过来 bitmap 模式下建的位图
+    到了 rows 模式也不再维护。记录缺失（老库）按变了处理。调用方提交。
+    """
+    if sess.scalar(select(AppMeta.value).where(AppMeta.key == STORE_KEY)) == SEAT_STORE:
+        return None
+    discarded = sess.execute(delete(SeatBitmap)).rowcount
+    sess.merge(AppMeta(key=STORE_KEY, value=SEAT_STORE))
+    return discarded
+
+
+# ---------------------------------------------------------------- 审计明细
+
+
+def audit_hold(sess: Session, token: str, showtime_id: int, user_id: int, expires_at: datetime, seat_ids) -> None:
+    """提交后补写 seat_holds；事务回滚时丢弃。"""
+    sess.info.setdefault("seat_audit", []).append(("hold", token, showtime_id, user_id, expires_at, list(seat_ids)))
+
+
+def audit_drop(sess: Session, tokens) -> None:
+    """提交后删除这些锁座的 seat_holds。"""
+    tokens = list(tokens)
+    if tokens:
+        sess.info.setdefault("seat_audit", []).append(("drop", tokens))
+
+
+def _write(sess: Session, ops) -> None:
+    for op in ops:
+        if op[0] == "drop":
+            sess.execute(delete(SeatHold).where(SeatHold.hold_group_id.in_(op[1])))
+            continue
+        _, token, showtime_id, user_id, expires_at, seat_ids = op
+        # 别的 worker 的明细可能后到：同一座位只保留过期时间更晚的那条
+        existing = dict(
+            sess.execute(
+                select(SeatHold.seat_id, SeatHold.expires_at)
+                .where(SeatHold.showtime_id == showtime_id, SeatHold.seat_id.in_(seat_ids))
+            ).all()
+        )
+        stale = [sid for sid, exp in existing.items() if exp < expires_at]
+        if stale:
+            sess.execute(delete(SeatHold).where(SeatHold.showtime_id == showtime_id, SeatHold.seat_id.in_(stale)))
+        rows = [
+            {"hold_group_id": token, "showtime_id": showtime_id, "seat_id": sid, "user_id": user_id,
+             "expires_at": expires_at}
+            for sid in seat_ids
+            if sid not in existing or sid in stale
+        ]
+        if rows:
+            sess.execute(SeatHold.__table__.insert(), rows)
+
+
+def _write_batch(ops, retry_delay: float = SEAT_AUDIT_FLUSH_SECONDS) -> int:
+    """整批一个事务写入，失败（库被锁等）隔一会重试一次；还失败就按顺序每条操作单独提交，
+    只跳过写不进去的那条，同批其它锁座的明细照常落库。返回跳过的条数。"""
+    for attempt in range(_AUDIT_ATTEMPTS):
+        if attempt:
+            time.sleep(retry_delay)
+        try:
+            with SessionLocal() as sess:
+                _write(sess, ops)
+                sess.commit()
+            return 0
+        except Exception:
+            log.warning("写入锁座审计明细失败（%d 条操作，第 %d 次）", len(ops), attempt + 1, exc_info=True)
+    skipped = 0
+    for op in ops:
+        try:
+            with SessionLocal() as sess:
+                _write(sess, [op])
+                sess.commit()
+        except Exception:
+            skipped += 1
+            log.exception("锁座审计明细写入失败，已跳过：%s %s", op[0], op[1])
+    return skipped
+
+
+class AuditWriter:
+    """后台线程，按 SEAT_AUDIT_FLUSH_SECONDS 攒批写 seat_holds 明细。"""
+
+    def __init__(self, interval: float = SEAT_AUDIT_FLUSH_SECONDS, batch: int = SEAT_AUDIT_BATCH):
+        self.interval = interval
+        self.batch = batch
+        self._queue: queue.Queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="seat-audit", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        # 先把队列里剩下的写完，切回 rows 模式时明细才是完整的
+        self._stop.set()
+        self._thread.join(timeout=self.interval + 10)
+
+    def submit(self, ops) -> None:
+        self._queue.put(ops)
+
+    def backlog(self) -> int:
+        return self._queue.qsize()
+
+    def _drain(self) -> list:
+        ops = []
+        while len(ops) < self.batch:
+            try:
+                ops.extend(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return ops
+
+    def _run(self) -> None:
+        while True:
+            stopping = self._stop.wait(self.interval)
+            while True:
+                ops = self._drain()
+                if not ops:
+                    break
+                _write_batch(ops, self.interval)
+            if stopping:
+                return
+
+
+_writer: AuditWriter | None = None
+
+
+def start_audit_writer() -> AuditWriter:
+    global _writer
+    _writer = AuditWriter()
+    _writer.start()
+    return _writer
+
+
+def stop_audit_writer() -> None:
+    global _writer
+    if _writer is not None:
+        _writer.stop()
+        _writer = None
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _flush_audit(sess: Session) -> None:
+    if sess.in_nested_transaction():
+        return  # 只是释放了 SAVEPOINT，外层事务还没提交
+    ops = sess.info.pop("seat_audit", None)
+    if not ops:
+        return
+    if _writer is not None:
+        _writer.submit(ops)
+        return
+    # 没有后台线程（命令行工具里跑 reaper 等），直接同步写
+    _write_batch(ops)
+
+
+@event.listens_for(SessionLocal, "after_soft_rollback")
+def _drop_audit(sess: Session, previous_transaction) -> None:
+    if not previous_transaction.nested:
+        sess.info.pop("seat_audit", None)
@@ -0,0 +1,228 @@
+"""分区座位图：分区容量、每场次分区计数器和按区域/矩形取座位状态。
+
+计数器口径：held = 未过期的锁座数，sold = 有订单占用的座位数（CREATED 或 PAID），
+available = capacity - held - sold。
+"""
+from sqlalchemy import and_, bindparam, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from . import seat_bitmap
+from .models import HallSection, OrderSeat, Seat, SeatHold, SectionCounter, Showtime
+from .time_utils import now_utc
+
+
+def ensure_hall_sections(sess: Session, hall_id: int) -> list[HallSection]:
+    sections = sess.scalars(select(HallSection).where(HallSection.hall_id == hall_id).order_by(HallSection.name)).all()
+    if sections:
+        return list(sections)
+
+    # 老影厅没有分区记录，按座位表补算一次
+    rows = sess.execute(
+        select(
+            func.coalesce(Seat.section, ""),
+            func.count(Seat.id),
+            func.min(Seat.row),
+            func.max(Seat.row),
+            func.min(Seat.col),
+            func.max(Seat.col),
+        )
+        .where(Seat.hall_id == hall_id)
+        .group_by(func.coalesce(Seat.section, ""))
+    ).all()
+    add_hall_sections(sess, hall_id, rows)
+    return list(
+        sess.scalars(select(HallSection).where(HallSection.hall_id == hall_id).order_by(HallSection.name)).all()
+    )
+
+
+def add_hall_sections(sess: Session, hall_id: int, rows) -> None:
+    """rows: (name, capacity, row_min, row_max, col_min, col_max)"""
+    if not rows:
+        return
+    params = [
+        {
+            "hall_id": hall_id,
+            "name": name,
+            "capacity": capacity,
+            "row_min": r0,
+            "row_max": r1,
+            "col_min": c0,
+            "col_max": c1,
+        }
+        for name, capacity, r0, r1, c0, c1 in rows
+    ]
+    try:
+        with sess.begin_nested():
+            sess.execute(insert(HallSection), params)
+    except IntegrityError:
+        pass  # 并发请求已经补算过
+
+
+def _section_counts(sess: Session, stmt) -> dict[str, int]:
+    return {name or "": n for name, n in sess.execute(stmt).all()}
+
+
+def ensure_counters(sess: Session, show: Showtime) -> None:
+    """场次第一次用到分区计数时，从锁座/订单表全量算一次；之后增量维护。"""
+    exists = sess.scalar(select(SectionCounter.section).where(SectionCounter.showtime_id == show.id).limit(1))
+    if exists is not None:
+        return
+
+    sections = ensure_hall_sections(sess, show.hall_id)
+    section_col = func.coalesce(Seat.section, "")
+    if seat_bitmap.enabled():
+        # 位图模式的 seat_holds 是异步写的，锁座按 hold_groups 数
+        held_ids = [seat_id for seat_id, _, _, _ in seat_bitmap.live_holds(sess, show.id)]
+        held = _section_counts(
+            sess, select(section_col, func.count()).where(Seat.id.in_(held_ids)).group_by(section_col)
+        ) if held_ids else {}
+    else:
+        held = _section_counts(
+            sess,
+            select(section_col, func.count())
+            .select_from(SeatHold)
+            .join(Seat, SeatHold.seat_id == Seat.id)
+            .where(and_(SeatHold.showtime_id == show.id, SeatHold.expires_at >= now_utc()))
+            .group_by(section_col),
+        )
+    sold = _section_counts(
+        sess,
+        select(section_col, func.count())
+        .select_from(OrderSeat)
+        .join(Seat, OrderSeat.seat_id == Seat.id)
+        .where(OrderSeat.showtime_id == show.id)
+        .group_by(section_col),
+    )
+    params = [
+        {"showtime_id": show.id, "section": s.name, "held": held.get(s.name, 0), "sold": sold.get(s.name, 0)}
+        for s in sections
+    ]
+    if not params:
+        return
+    try:
+        with sess.begin_nested():
+            sess.execute(insert(SectionCounter), params)
+    except IntegrityError:
+        pass
+
+
+def _bump_stmt():
+    section_col = func.coalesce(Seat.section, "")
+    per_section = (
+        select(section_col.label("section"), func.count().label("n"))
+        .where(Seat.id.in_(bindparam("seat_ids", expanding=True)))
+        .group_by(section_col)
+        .subquery()
+    )
+    # 一条 UPDATE ... FROM 改完所有分区，不用先查每区座位数再逐区更新
+    return (
+        update(SectionCounter)
+        .where(SectionCounter.showtime_id == bindparam("sid"), SectionCounter.section == per_section.c.section)
+        .values(
+            held=SectionCounter.held + bindparam("d_held") * per_section.c.n,
+            sold=SectionCounter.sold + bindparam("d_sold") * per_section.c.n,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+# 锁座、下单、过期清理都会调，语句只构造一次，每次只换参数
+_BUMP = _bump_stmt()
+
+
+def bump_counters(sess: Session, showtime_id: int, seat_ids, held: int = 0, sold: int = 0) -> None:
+    """按座位所在分区调整计数；held/sold 为每个座位的增量（+1/-1/0）。
+
+    场次计数器尚未初始化时 UPDATE 不命中任何行，首次 ensure_counters 会按真实数据算。
+    """
+    seat_ids = list(seat_ids)
+    if not seat_ids or (not held and not sold):
+        return
+    sess.execute(_BUMP, {"seat_ids": seat_ids, "sid": showtime_id, "d_held": held, "d_sold": sold})
+
+
+def section_summary(sess: Session, show: Showtime) -> list[dict]:
+    ensure_counters(sess, show)
+    rows = sess.execute(
+        select(HallSection, SectionCounter)
+        .join(
+            SectionCounter,
+            and_(SectionCounter.showtime_id == show.id, SectionCounter.section == HallSection.name),
+        )
+        .where(HallSection.hall_id == show.hall_id)
+        .order_by(HallSection.name)
+    ).all()
+    return [
+        {
+            "section": hs.name,
+            "capacity": hs.capacity,
+            "available": max(hs.capacity - sc.held - sc.sold, 0),
+            "held": sc.held,
+            "sold": sc.sold,
+            "row_min": hs.row_min,
+            "row_max": hs.row_max,
+            "col_min": hs.col_min,
+            "col_max": hs.col_max,
+        }
+        for hs, sc in rows
+    ]
+
+
+def tile_seats(
+    sess: Session,
+    show: Showtime,
+    section: str | None = None,
+    row_min: int | None = None,
+    row_max: int | None = None,
+    col_min: int | None = None,
+    col_max: int | None = None,
+    user_id: int | None = None,
+) -> list[dict]:
+    """只取某个分区或行列矩形（含端点）内的座位状态。"""
+    conds = [Seat.hall_id == show.hall_id]
+    if section is not None:
+        conds.append(func.coalesce(Seat.section, "") == section)
+    if row_min is not None:
+        conds.append(Seat.row >= row_min)
+    if row_max is not None:
+        conds.append(Seat.row <= row_max)
+    if col_min is not None:
+        conds.append(Seat.col >= col_min)
+    if col_max is not None:
+        conds.append(Seat.col <= col_max)
+
+    seats = sess.execute(
+        select(Seat.id, Seat.label, Seat.row, Seat.col).where(*conds).order_by(Seat.row, Seat.col)
+    ).all()
+    if seat_bitmap.enabled():
+        states = seat_bitmap.seat_states(sess, show.id, show.hall_id, user_id)
+        return [
+            {"seat_id": sid, "label": label, "row": r, "col": c, "state": states.get(sid, "AVAILABLE")}
+            for sid, label, r, c in seats
+        ]
+    sold = set(
+        sess.scalars(
+            select(OrderSeat.seat_id)
+            .join(Seat, OrderSeat.seat_id == Seat.id)
+            .where(OrderSeat.showtime_id == show.id, *conds)
+        ).all()
+    )
+    hold_map = dict(
+        sess.execute(
+            select(SeatHold.seat_id, SeatHold.user_id)
+            .join(Seat, SeatHold.seat_id == Seat.id)
+            .where(SeatHold.showtime_id == show.id, SeatHold.expires_at >= now_utc(), *conds)
+        ).all()
+    )
+
+    out = []
+    for sid, label, r, c in seats:
+        if sid in sold:
+            state = "SOLD"
+        elif sid in hold_map:
+            state = "HELD_BY_ME" if user_id is not None and hold_map[sid] == user_id else "HELD"
+        else:
+            state = "AVAILABLE"
+        out.append({"seat_id": sid, "label": label, "row": r, "col": c, "state": state})
+    return out
@@ -0,0 +1,150 @@
+"""按请求统计 SQL：查询次数、数据库耗时、N+1 和慢查询。
+
+引擎上挂 before/after_cursor_execute，把每条语句记到当前请求的 QueryStats 上。
+QueryStats 放在 contextvar 里；同步接口在线程池执行时会带上这份上下文，
+所以 QueryProfiler 中间件里放进去的对象在处理函数里改的就是同一个。
+
+同一请求里同一条 SQL（参数化后的文本相同）执行次数达到 SQL_N_PLUS_ONE 就打 N+1 警告；
+单条超过 SQL_SLOW_MS 连同参数打日志。响应带 Server-Timing: db;dur=..;desc="N queries"。
+
+测试里断言接口查询次数（tests/conftest.py 里有同名 fixture）：
+
+    with query_budget(6):
+        client.get("/orders", headers=h)
+"""
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+from .config import SQL_N_PLUS_ONE, SQL_PROFILE, SQL_SLOW_MS
+
+log = logging.getLogger(__name__)
+
+_PARAMS_LOG_MAX = 500
+
+
+class QueryStats:
+    __slots__ = ("count", "db_ms", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.db_ms = 0.0
+        # SQL 文本 -> 执行次数
+        self.statements: Counter = Counter()
+
+    def repeated(self, threshold: int = SQL_N_PLUS_ONE) -> list[tuple[str, int]]:
+        return [(sql, n) for sql, n in self.statements.most_common() if n >= threshold]
+
+
+_current: ContextVar[QueryStats | None] = ContextVar("sql_query_stats", default=None)
+# query_budget 打开期间，中间件把每个请求结束时的统计追加到这里。
+# TestClient 在另一个线程里跑应用，contextvar 传不过去，只能这样收集。
+_observers: list[list[tuple[str, QueryStats]]] = []
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+    stats = _current.get()
+    if stats is not None:
+        stats.count += 1
+        stats.db_ms += elapsed_ms
+        stats.statements[statement] += 1
+    if elapsed_ms >= SQL_SLOW_MS:
+        params = repr(parameters)
+        if len(params) > _PARAMS_LOG_MAX:
+            params = params[:_PARAMS_LOG_MAX] + "..."
+        log.warning("慢查询 %.1fms: %s | 参数: %s", elapsed_ms, " ".join(statement.split()), params)
+
+
+def _on_error(context):
+    # 语句执行失败时 after_cursor_execute 不会触发，这里把开始时间弹掉，否则连接回池后越积越多
+    if context.connection is None:
+        return
+    starts = context.connection.info.get("query_start")
+    if starts:
+        starts.pop()
+
+
+def attach(engine) -> None:
+    if not SQL_PROFILE:
+        return
+    event.listen(engine, "before_cursor_execute", _before_execute)
+    event.listen(engine, "after_cursor_execute", _after_execute)
+    event.listen(engine, "handle_error", _on_error)
+
+
+@contextmanager
+def capture_queries():
+    """在 with 块内统计查询（块内是新的统计对象，结束后恢复外层的）。"""
+    stats = QueryStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def query_budget(max_queries: int):
+    """with 块内每个请求（以及块内直接执行）的查询次数都不能超过 max_queries，
+    否则抛 QueryBudgetExceeded 并列出执行过的语句。"""
+    requests: list[tuple[str, QueryStats]] = []
+    _observers.append(requests)
+    try:
+        with capture_queries() as direct:
+            yield direct
+    finally:
+        _observers.remove(requests)
+
+    for name, stats in [*requests, ("<direct>", direct)]:
+        if stats.count > max_queries:
+            detail = "\n".join(
+                f"  {n} x {' '.join(sql.split())[:200]}" for sql, n in stats.statements.most_common()
+            )
+            raise QueryBudgetExceeded(f"{name} 查询 {stats.count} 次，预算 {max_queries} 次:\n{detail}")
+
+
+class QueryProfiler:
+    """ASGI 中间件：给每个请求一份 QueryStats，响应头加 Server-Timing，结束时检查 N+1。"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not SQL_PROFILE:
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                total_ms = (time.perf_counter() - start) * 1000
+                timing = f'db;dur={stats.db_ms:.1f};desc="{stats.count} queries", app;dur={total_ms:.1f}'
+                message["headers"] = [*message.get("headers", []), (b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            name = f'{scope["method"]} {route.path if route is not None else scope["path"]}'
+            for sql, n in stats.repeated():
+                log.warning("疑似 N+1：%s 同一语句执行 %d 次: %s", name, n, " ".join(sql.split())[:300])
+            for requests in _observers:
+                requests.append((name, stats))
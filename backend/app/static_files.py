@@ -0,0 +1,207 @@
+"""静态文件：内容哈希文件名长期缓存 + 预压缩副本。
+
+- 文件名形如 <sha256>.<ext>（上传接口生成的）内容永远不变，返回
+  Cache-Control: immutable；路径解析、stat 和 ETag 只算一次，之后直接用缓存。
+- 其它文件照常每次 stat，返回 no-cache，让浏览器带 ETag 回源校验。
+- 同目录下有 .br / .gz 副本且客户端接受时，直接发送压缩副本。
+  副本在上传时生成（precompress），已有文件可用 `python -m app.static_files` 补齐。
+"""
+import gzip
+import os
+import re
+import stat
+import sys
+import tempfile
+from email.utils import formatdate
+from mimetypes import guess_type
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+try:
+    import brotli
+except ImportError:  # 可选依赖，没有就只生成 .gz
+    brotli = None
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "no-cache"
+
+HASHED_NAME = re.compile(r"^[0-9a-f]{64}\.[A-Za-z0-9]+$")
+# 已经是压缩格式的图片再压一遍没有收益
+COMPRESSIBLE_EXTENSIONS = {"svg", "css", "js", "json", "html", "txt", "xml", "map", "ico"}
+# 压缩后至少要小这么多才保留副本
+MIN_SAVING = 0.9
+# (Accept-Encoding 名, 副本后缀)，按优先级排列
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+_CACHE_MAX = 8192
+
+
+def is_hashed_name(path: str) -> bool:
+    return bool(HASHED_NAME.match(os.path.basename(path)))
+
+
+def accepted_encodings(header: str) -> set[str]:
+    out = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            out.add(name.strip().lower())
+    return out
+
+
+class _Asset:
+    """一个可发送的文件及其全部副本，headers 只在构造时算一次。"""
+
+    __slots__ = ("variants",)
+
+    def __init__(self, full_path: str, stat_result: os.stat_result, immutable: bool):
+        media_type = guess_type(full_path)[0] or "application/octet-stream"
+        if immutable:
+            base_etag = '"' + os.path.basename(full_path).split(".", 1)[0] + '"'
+        else:
+            base_etag = '"%x-%x"' % (int(stat_result.st_mtime_ns), stat_result.st_size)
+        cache_control = IMMUTABLE_CACHE if immutable else REVALIDATE_CACHE
+
+        # encoding -> (路径, stat, 响应头)，None 表示原文件
+        self.variants: dict[str | None, tuple[str, os.stat_result, dict[str, str]]] = {}
+        for encoding, suffix in (*ENCODINGS, (None, "")):
+            path = full_path + suffix
+            try:
+                st = stat_result if encoding is None else os.stat(path)
+            except OSError:
+                continue
+            etag = base_etag if encoding is None else f'{base_etag[:-1]}-{suffix[1:]}"'
+            headers = {
+                "cache-control": cache_control,
+                "etag": etag,
+                "last-modified": formatdate(st.st_mtime, usegmt=True),
+                "content-type": media_type,
+            }
+            if encoding is not None:
+                headers["content-encoding"] = encoding
+            self.variants[encoding] = (path, st, headers)
+        if len(self.variants) > 1:
+            for _, _, headers in self.variants.values():
+                headers["vary"] = "Accept-Encoding"
+
+    def pick(self, accept: set[str]):
+        for encoding, _ in ENCODINGS:
+            if encoding in accept and encoding in self.variants:
+                return self.variants[encoding]
+        return self.variants[None]
+
+
+class AssetStaticFiles(StaticFiles):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 相对路径 -> _Asset，只缓存内容哈希命名的文件
+        self._assets: dict[str, _Asset] = {}
+
+    def _resolve(self, path: str) -> _Asset | None:
+        full_path, stat_result = self.lookup_path(path)
+        if stat_result is None or not stat.S_ISREG(stat_result.st_mode):
+            return None
+        return _Asset(full_path, stat_result, is_hashed_name(full_path))
+
+    async def get_response(self, path: str, scope) -> Response:
+        if scope["method"] not in ("GET", "HEAD"):
+            raise HTTPException(status_code=405, headers={"Allow": "GET, HEAD"})
+
+        asset = self._assets.get(path)
+        if asset is None:
+            try:
+                asset = await anyio.to_thread.run_sync(self._resolve, path)
+            except (OSError, ValueError):
+                asset = None
+            if asset is None:
+                # 目录、html 模式、错误处理都交给 StaticFiles 原逻辑
+                return await super().get_response(path, scope)
+            if is_hashed_name(path):
+                if len(self._assets) >= _CACHE_MAX:
+                    self._assets.clear()
+                self._assets[path] = asset
+
+        request_headers = Headers(scope=scope)
+        full_path, stat_result, headers = asset.pick(
+            accepted_encodings(request_headers.get("accept-encoding", ""))
+        )
+        if self.is_not_modified(Headers(headers=headers), request_headers):
+            return NotModifiedResponse(Headers(headers=headers))
+        return FileResponse(full_path, stat_result=stat_result, headers=headers, media_type=headers["content-type"])
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".precompress-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def precompress(path, force: bool = False) -> list[str]:
+    """为可压缩的文件生成 .gz（以及装了 brotli 时的 .br）副本，返回生成的后缀。
+
+    压缩收益不足 MIN_SAVING 的不生成；已存在的副本不重复生成。
+    """
+    path = str(path)
+    ext = path.rsplit(".", 1)[-1].lower()
+    if ext not in COMPRESSIBLE_EXTENSIONS:
+        return []
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data:
+        return []
+
+    compressors = [(".gz", lambda b: gzip.compress(b, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        compressors.insert(0, (".br", lambda b: brotli.compress(b, quality=11)))
+
+    made = []
+    for suffix, compress in compressors:
+        target = path + suffix
+        if not force and os.path.exists(target):
+            continue
+        packed = compress(data)
+        if len(packed) > len(data) * MIN_SAVING:
+            continue
+        _write_atomic(target, packed)
+        made.append(suffix)
+    return made
+
+
+def main(argv=None) -> None:
+    """给目录下已有的静态文件补齐压缩副本：python -m app.static_files [目录]"""
+    from .config import STATIC_DIR
+
+    argv = sys.argv[1:] if argv is None else argv
+    root = argv[0] if argv else str(STATIC_DIR)
+    total = 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            if name.startswith(".") or name.endswith((".gz", ".br")):
+                continue
+            made = precompress(os.path.join(dirpath, name))
+            if made:
+                total += 1
+                print(f"{os.path.join(dirpath, name)}: {' '.join(made)}")
+    print(f"生成压缩副本的文件数: {total}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,84 @@
-from sqlalchemy import delete
+from sqlalchemy import bindparam, delete
 from sqlalchemy.orm import Session
 
+from . import seat_bitmap
+from .metrics import HOLDS_EXPIRED
 from .models import HoldGroup, SeatHold
+from .outbox import emit_many
+from .sections import bump_counters
 from .time_utils import now_utc
 
 
+def row_letters(r: int) -> str:
+    """0 -> A, 25 -> Z, 26 -> AA，超过 26 排的大场馆也能生成排号。"""
+    out = ""
+    r += 1
+    while r:
+        r, rem = divmod(r - 1, 26)
+        out = chr(ord("A") + rem) + out
+    return out
+
+
 def seat_label(r: int, c: int) -> str:
-    return f"{chr(ord('A') + r)}{c + 1}"
+    return f"{row_letters(r)}{c + 1}"
+
+
+def _expiry_stmts(by_showtime: bool):
+    """(删过期锁座并返回明细, 删过期锁座组)，now 和 sid 作参数传入。"""
+    q = delete(SeatHold).where(SeatHold.expires_at < bindparam("now"))
+    qg = delete(HoldGroup).where(HoldGroup.expires_at < bindparam("now"))
+    if by_showtime:
+        q = q.where(SeatHold.showtime_id == bindparam("sid"))
+        qg = qg.where(HoldGroup.showtime_id == bindparam("sid"))
+    q = q.returning(SeatHold.hold_group_id, SeatHold.showtime_id, SeatHold.user_id, SeatHold.seat_id)
+    return (
+        q.execution_options(synchronize_session=False),
+        qg.execution_options(synchronize_session=False),
+    )
+
+
+# 锁座前都会按场次清一次，语句预先构造好，每次只换参数
+_EXPIRY = {False: _expiry_stmts(False), True: _expiry_stmts(True)}
 
 
 def cleanup_expired_holds(sess: Session, showtime_id: int | None = None):
-    q = delete(SeatHold).where(SeatHold.expires_at < now_utc())
-    if showtime_id is not None:
-        q = q.where(SeatHold.showtime_id == showtime_id)
-    sess.execute(q)
-
-    qg = delete(HoldGroup).where(HoldGroup.expires_at < now_utc())
-    if showtime_id is not None:
-        qg = qg.where(HoldGroup.showtime_id == showtime_id)
-    sess.execute(qg)
+    if seat_bitmap.enabled():
+        _cleanup_expired_groups(sess, showtime_id)
+        return
+    q, qg = _EXPIRY[showtime_id is not None]
+    params = {"now": now_utc(), "sid": showtime_id}
+    groups: dict[str, tuple[int, int, list[int]]] = {}
+    freed: dict[int, list[int]] = {}
+    for token, sid, uid, seat_id in sess.execute(q, params).all():
+        groups.setdefault(token, (sid, uid, []))[2].append(seat_id)
+        freed.setdefault(sid, []).append(seat_id)
+    # held 计数按实际删掉的行扣：并发清理时后到的 DELETE 删不到行，也就不会重复扣
+    for sid, seat_ids in freed.items():
+        bump_counters(sess, sid, seat_ids, held=-1)
+    if groups:
+        HOLDS_EXPIRED.inc("seat", amount=sum(len(g[2]) for g in groups.values()))
+        emit_many(
+            sess,
+            "hold.expired",
+            ((sid, uid, token, {"seat_ids": seat_ids}) for token, (sid, uid, seat_ids) in groups.items()),
+        )
+    sess.execute(qg, params)
+
+
+def _cleanup_expired_groups(sess: Session, showtime_id: int | None):
+    """位图模式：过期锁座按 hold_groups 找（一次锁座一行），没有过期的就不写库。"""
+    groups = seat_bitmap.expired_groups(sess, showtime_id)
+    if not groups:
+        return
+    for _, sid, _, seat_ids in groups:
+        bump_counters(sess, sid, seat_ids, held=-1)
+    seat_bitmap.release_groups(sess, groups)
+    tokens = [token for token, _, _, _ in groups]
+    sess.execute(delete(HoldGroup).where(HoldGroup.id.in_(tokens)))
+    seat_bitmap.audit_drop(sess, tokens)
+    HOLDS_EXPIRED.inc("seat", amount=sum(len(g[3]) for g in groups))
+    emit_many(
+        sess,
+        "hold.expired",
+        ((sid, uid, token, {"seat_ids": seat_ids}) for token, sid, uid, seat_ids in groups),
+    )
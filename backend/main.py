@@ -1,5 +1,49 @@
-from app.main import app
-from app.routers import auth
-app.include_router(auth.router, prefix="/auth", tags=["auth"])
+"""uvicorn 入口：uvicorn main:app
 
-__all__ = ["app"]
+多 worker 时可以一起拉起座位库存服务（见 app/inventory.py），各 worker 共用：
+
+    python main.py --workers 4 --inventory /tmp/ticketing-inventory.sock
+"""
+import os
+import sys
+
+if __name__ == "__main__":
+    import argparse
+    import subprocess
+    import time
+
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="启动 API 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--inventory", metavar="SOCKET", help="同时启动座位库存服务，监听这个 Unix socket")
+    args = parser.parse_args()
+
+    inventory = None
+    if args.inventory:
+        # 配置在导入时读取环境变量，worker 进程会继承
+        os.environ["INVENTORY_SOCKET"] = args.inventory
+        if os.path.exists(args.inventory):
+            os.unlink(args.inventory)
+        inventory = subprocess.Popen([sys.executable, "-m", "app.inventory", "--socket", args.inventory],
+                                     cwd=os.path.dirname(os.path.abspath(__file__)))
+        deadline = time.monotonic() + 10
+        while not os.path.exists(args.inventory) and inventory.poll() is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+        if not os.path.exists(args.inventory):
+            # 服务没起来也照常启动，worker 会退回数据库路径
+            print("库存服务未能启动，座位状态走数据库", file=sys.stderr)
+    try:
+        uvicorn.run("main:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        if inventory is not None:
+            inventory.terminate()
+            inventory.wait(timeout=5)
+else:
+    from app.main import app
+    from app.routers import auth
+    app.include_router(auth.router, prefix="/auth", tags=["auth"])
+
+    __all__ = ["app"]
@@ -0,0 +1,60 @@
+"""接口测试的公共 fixture：临时 SQLite 库 + TestClient + 查询预算。
+
+    cd backend
+    python -m pytest -q
+
+需要 pytest 和 httpx（TestClient 依赖）。配置在导入时读环境变量，所以先设好再导入应用。
+"""
+import os
+import sys
+import tempfile
+import uuid
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_TMP_DIR = tempfile.mkdtemp(prefix="ticketing-test-")
+os.environ.update(
+    DB_URL=f"sqlite:///{os.path.join(_TMP_DIR, 'test.db')}",
+    AUTO_SEED="1",
+    REAPER_INTERVAL_SECONDS="0",
+    REPLICA_DB_URL="",
+    INVENTORY_SOCKET="",
+    CAPTURE_PATH="",
+    SQL_PROFILE="1",
+)
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app import sql_profiler  # noqa: E402
+from main import app  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture
+def query_budget():
+    """返回 sql_profiler.query_budget：with 块内每个请求的查询次数不能超过给定值。"""
+    return sql_profiler.query_budget
+
+
+@pytest.fixture
+def user_headers(client):
+    """新注册一个用户，返回带 token 的请求头。"""
+    email = f"u{uuid.uuid4().hex[:12]}@example.com"
+    client.post("/auth/register", json={"email": email, "password": "secret12"})
+    token = client.post("/auth/login", json={"email": email, "password": "secret12"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture
+def showtime_id(client):
+    """第一部电影的第一个场次。"""
+    movie_id = client.get("/movies").json()[0]["id"]
+    return client.get(f"/movies/{movie_id}/showtimes").json()[0]["id"]
@@ -0,0 +1,41 @@
+"""过期锁座清理：分区 held 计数按实际删掉的锁座扣减。"""
+from datetime import timedelta
+
+from sqlalchemy import func, select, update
+
+from app.database import SessionLocal
+from app.models import HoldGroup, SeatHold, SectionCounter, Showtime
+from app.sections import ensure_counters
+from app.time_utils import now_utc
+from app.utils import cleanup_expired_holds
+
+
+def _held(sess, showtime_id):
+    return sess.scalar(select(func.sum(SectionCounter.held)).where(SectionCounter.showtime_id == showtime_id))
+
+
+def test_cleanup_releases_held_counts_once(client, user_headers, showtime_id):
+    with SessionLocal() as sess:
+        ensure_counters(sess, sess.get(Showtime, showtime_id))
+        sess.commit()
+        before = _held(sess, showtime_id)
+
+    seats = [s["seat_id"] for s in client.get(f"/showtimes/{showtime_id}/seats").json() if s["state"] == "AVAILABLE"]
+    r = client.post(f"/showtimes/{showtime_id}/hold", json={"seat_ids": seats[:3]}, headers=user_headers)
+    assert r.status_code == 200, r.text
+    token = r.json()["hold_token"]
+
+    with SessionLocal() as sess:
+        assert _held(sess, showtime_id) == before + 3
+        past = now_utc() - timedelta(minutes=1)
+        sess.execute(update(SeatHold).where(SeatHold.hold_group_id == token).values(expires_at=past))
+        sess.execute(update(HoldGroup).where(HoldGroup.id == token).values(expires_at=past))
+        sess.commit()
+
+        cleanup_expired_holds(sess, showtime_id)
+        sess.commit()
+        assert _held(sess, showtime_id) == before
+        # 再清一次没有可删的行，计数不能再往下扣
+        cleanup_expired_holds(sess, showtime_id)
+        sess.commit()
+        assert _held(sess, showtime_id) == before
@@ -0,0 +1,44 @@
+"""热点接口的查询次数预算：超出说明多了查询或出现了 N+1，见 app/sql_profiler.py。"""
+import pytest
+
+from app.sql_profiler import QueryBudgetExceeded
+
+# 当前实测值；改了接口确实要多查时连同原因一起调整
+ORDERS_BUDGET = 4
+CHECKOUT_BUDGET = 24
+
+
+def _available(client, showtime_id):
+    return [s["seat_id"] for s in client.get(f"/showtimes/{showtime_id}/seats").json() if s["state"] == "AVAILABLE"]
+
+
+def _hold(client, headers, showtime_id, seat_ids):
+    r = client.post(f"/showtimes/{showtime_id}/hold", json={"seat_ids": seat_ids}, headers=headers)
+    assert r.status_code == 200, r.text
+    return r.json()["hold_token"]
+
+
+def test_checkout_budget(client, query_budget, user_headers, showtime_id):
+    token = _hold(client, user_headers, showtime_id, _available(client, showtime_id)[:2])
+    with query_budget(CHECKOUT_BUDGET):
+        r = client.post("/orders/checkout", json={"hold_token": token}, headers=user_headers)
+    assert r.status_code == 200, r.text
+    assert len(r.json()["seats"]) == 2
+
+
+def test_list_orders_budget_does_not_grow_with_orders(client, query_budget, user_headers, showtime_id):
+    for n in range(1, 4):
+        token = _hold(client, user_headers, showtime_id, _available(client, showtime_id)[:2])
+        assert client.post("/orders/checkout", json={"hold_token": token}, headers=user_headers).status_code == 200
+        with query_budget(ORDERS_BUDGET):
+            r = client.get("/orders", headers=user_headers)
+        assert r.status_code == 200
+        orders = r.json()
+        assert len(orders) == n
+        assert all(len(o["seats"]) == 2 for o in orders)
+
+
+def test_query_budget_reports_excess(client, query_budget, user_headers):
+    with pytest.raises(QueryBudgetExceeded):
+        with query_budget(1):
+            client.get("/orders", headers=user_headers)
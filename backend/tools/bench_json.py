@@ -0,0 +1,106 @@
+"""对比热点接口两种返回方式的序列化耗时（不含数据库查询）。
+
+    旧：构造 Pydantic 模型 -> response_model 再校验 -> 转成 JSON 兼容对象 -> json.dumps
+    新：直接拼 dict -> FastJSONResponse（orjson，没装则标准库 json）
+
+用法（在 backend 目录下）：python tools/bench_json.py [--repeat 200]
+同时会用 schema 校验新路径输出的字段形状，不一致直接报错。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydantic import TypeAdapter  # noqa: E402
+
+from app.fast_json import FastJSONResponse, orjson  # noqa: E402
+from app.schemas import EventOut, OrderOut, SeatState, ShowtimeOut  # noqa: E402
+
+
+def seat_rows(n=500):
+    states = ("AVAILABLE", "HELD", "SOLD", "AVAILABLE")
+    return [
+        {"seat_id": i + 1, "label": f"{chr(65 + i // 25 % 26)}{i % 25 + 1}", "row": i // 25, "col": i % 25,
+         "state": states[i % 4], "price_cents": 4500}
+        for i in range(n)
+    ]
+
+
+def event_rows(n=100):
+    return [
+        {"id": i, "kind": "concert", "title": f"演唱会 {i}", "category": "流行", "description": "描述" * 40,
+         "poster_url": f"/static/uploads/{i:064x}.jpg", "status": "ON", "duration_min": None, "rating": None,
+         "venue": "体育馆", "price_info": "380-1280"}
+        for i in range(n)
+    ]
+
+
+def showtime_rows(n=100):
+    return [
+        {"id": i, "target_id": 1, "event_kind": "movie", "hall_id": i % 5 + 1,
+         "start_time": "2026-10-19T12:00:00Z", "price_cents": 4500, "hall_name": "1号厅", "cinema_name": "万达影城"}
+        for i in range(n)
+    ]
+
+
+def order_rows(n=50):
+    return [
+        {"id": f"{i:032x}", "status": "PAID", "total_cents": 9000, "created_at": "2026-10-19T12:00:00Z",
+         "movie_title": "电影", "start_time": "2026-10-20T12:00:00Z", "hall_name": "1号厅",
+         "cinema_name": "万达影城", "seats": ["A1", "A2"], "ticket_code": "ABC123"}
+        for i in range(n)
+    ]
+
+
+CASES = (
+    ("GET /showtimes/{id}/seats (500)", SeatState, seat_rows),
+    ("GET /concerts (100)", EventOut, event_rows),
+    ("GET /movies/{id}/showtimes (100)", ShowtimeOut, showtime_rows),
+    ("GET /orders (50)", OrderOut, order_rows),
+)
+
+
+def old_path(model, adapter, rows) -> bytes:
+    items = [model(**r) for r in rows]
+    content = adapter.dump_python(adapter.validate_python(items, from_attributes=True), mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def new_path(rows) -> bytes:
+    return FastJSONResponse(rows).body
+
+
+def timed(fn, repeat: int) -> float:
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat * 1000
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    print(f"encoder: {'orjson' if orjson is not None else 'json (stdlib)'}")
+    print(f"{'route':36} {'old ms':>9} {'new ms':>9} {'speedup':>8}")
+    for name, model, make in CASES:
+        rows = make()
+        adapter = TypeAdapter(List[model])
+        # 新路径的输出必须能通过原 schema 校验，并且和旧路径结果一致
+        new = json.loads(new_path(rows))
+        adapter.validate_python(new)
+        assert new == json.loads(old_path(model, adapter, rows)), name
+
+        old_ms = timed(lambda: old_path(model, adapter, rows), args.repeat)
+        new_ms = timed(lambda: new_path(rows), args.repeat)
+        print(f"{name:36} {old_ms:9.3f} {new_ms:9.3f} {old_ms / new_ms:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
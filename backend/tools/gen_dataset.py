@@ -0,0 +1,385 @@
+"""生成大规模合成数据，用于基准测试和索引实验。
+
+在 seed 之后用 sqlite3 的 executemany 批量写入电影、活动、影院/影厅/座位、场次、用户、
+订单/订单座位和有效锁座。主键显式分配，所有随机数来自 --seed，同样的参数生成的库完全一样。
+写入期间关闭日志和同步、暂时删掉二级索引，写完再重建索引、ANALYZE，最后重算销售汇总。
+
+    cd backend
+    python tools/gen_dataset.py --db /tmp/big.db --preset large   # 10 万活动、100 万场次、1000 万订单
+    python tools/gen_dataset.py --db /tmp/mid.db --users 200000 --orders 2000000
+    DB_URL=sqlite:////tmp/big.db uvicorn app.main:app
+
+生成的用户密码都是 password123（共用一个 bcrypt 哈希）。
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from array import array
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = "password123"
+SLOT_HOURS = 3
+
+PRESETS = {
+    "small": dict(movies=200, events=1000, cinemas=10, halls_per_cinema=4, showtimes=10_000,
+                  users=10_000, orders=100_000, holds=2_000),
+    "medium": dict(movies=2_000, events=10_000, cinemas=50, halls_per_cinema=6, showtimes=100_000,
+                   users=100_000, orders=1_000_000, holds=20_000),
+    "large": dict(movies=20_000, events=100_000, cinemas=200, halls_per_cinema=8, showtimes=1_000_000,
+                  users=1_000_000, orders=10_000_000, holds=200_000),
+}
+
+# 批量写入的表；这些表上的二级索引在写入期间先删掉
+LOADED_TABLES = (
+    "movies", "events", "cinemas", "halls", "seats", "showtimes",
+    "users", "orders", "order_seats", "hold_groups", "seat_holds",
+)
+
+KIND_CHOICES = ("concert", "exhibition")
+CATEGORIES = {
+    "movie": ("科幻", "动作", "喜剧", "动画", "剧情", "悬疑"),
+    "concert": ("流行", "摇滚", "民谣", "古典", "电子"),
+    "exhibition": ("漫展", "车展", "艺术展", "科技展"),
+}
+CITIES = ("北京", "上海", "广州", "深圳", "成都", "杭州", "东京", "大阪")
+
+
+def fmt_dt(dt: datetime) -> str:
+    # SQLAlchemy 在 SQLite 里存 DateTime 的格式（微秒为 0 时省略），比 strftime 快一倍
+    return str(dt)
+
+
+def seq_key(i: int, rng: random.Random) -> str:
+    # 订单号、锁座令牌是 32 位十六进制字符串主键。前 8 位用递增序号，插入总落在 B 树末尾，
+    # 不会像完全随机的 uuid 那样到处分裂页，后 24 位仍是随机数。
+    return "%08x%024x" % (i, rng.getrandbits(96))
+
+
+class Loader:
+    def __init__(self, conn: sqlite3.Connection, batch: int):
+        self.conn = conn
+        self.batch = batch
+        self.report: list[tuple[str, int, float]] = []
+
+    def next_id(self, table: str) -> int:
+        return (self.conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0] or 0) + 1
+
+    def load(self, table: str, columns: tuple[str, ...], rows) -> int:
+        """rows 是生成器，按 batch 切块写入，返回行数。"""
+        sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        t0 = time.perf_counter()
+        total = 0
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.batch:
+                self.conn.executemany(sql, chunk)
+                total += len(chunk)
+                chunk.clear()
+        if chunk:
+            self.conn.executemany(sql, chunk)
+            total += len(chunk)
+        self._done(table, total, t0)
+        return total
+
+    def load_pair(self, first, second, rows) -> tuple[int, int]:
+        """同时写两张表（订单 + 订单座位），rows 产出 (表1行, [表2行...])。"""
+        sql = []
+        for table, columns in (first, second):
+            sql.append(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})")
+        t0 = time.perf_counter()
+        n1 = n2 = 0
+        a, b = [], []
+        for row, children in rows:
+            a.append(row)
+            b.extend(children)
+            if len(a) >= self.batch:
+                self.conn.executemany(sql[0], a)
+                self.conn.executemany(sql[1], b)
+                n1 += len(a)
+                n2 += len(b)
+                a.clear()
+                b.clear()
+        if a:
+            self.conn.executemany(sql[0], a)
+            self.conn.executemany(sql[1], b)
+            n1 += len(a)
+            n2 += len(b)
+        self._done(f"{first[0]} + {second[0]}", n1 + n2, t0)
+        return n1, n2
+
+    def _done(self, name: str, rows: int, t0: float) -> None:
+        elapsed = time.perf_counter() - t0
+        self.report.append((name, rows, elapsed))
+        rate = rows / elapsed if elapsed else 0
+        print(f"  {name:28} {rows:>12,} 行 {elapsed:8.1f}s {rate:>12,.0f} 行/秒", flush=True)
+
+
+def drop_indexes(conn: sqlite3.Connection) -> list[str]:
+    placeholders = ", ".join("?" * len(LOADED_TABLES))
+    rows = conn.execute(
+        f"SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL AND tbl_name IN ({placeholders})",
+        LOADED_TABLES,
+    ).fetchall()
+    for name, _ in rows:
+        conn.execute(f'DROP INDEX "{name}"')
+    return [sql for _, sql in rows]
+
+
+def generate(conn: sqlite3.Connection, args, hashed_password: str) -> Loader:
+    rng = random.Random(args.seed)
+    loader = Loader(conn, args.batch)
+    now = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+
+    # --- 电影和活动 ---
+    movie_start = loader.next_id("movies")
+    loader.load(
+        "movies",
+        ("id", "title", "description", "category", "duration_min", "rating", "poster_url", "status"),
+        (
+            (movie_start + i, f"电影 {i}", "合成数据", rng.choice(CATEGORIES["movie"]), rng.randint(80, 180),
+             rng.choice(("G", "PG", "PG-13", "R")), "", "ON")
+            for i in range(args.movies)
+        ),
+    )
+    event_start = loader.next_id("events")
+    event_kinds = [KIND_CHOICES[rng.getrandbits(1)] for _ in range(args.events)]
+    loader.load(
+        "events",
+        ("id", "kind", "title", "description", "category", "poster_url", "status", "venue", "price_info"),
+        (
+            (event_start + i, kind, f"{'演唱会' if kind == 'concert' else '展览'} {i}", "合成数据",
+             rng.choice(CATEGORIES[kind]), "", "ON", f"{rng.choice(CITIES)}场馆{i % 100}", "￥100-800")
+            for i, kind in enumerate(event_kinds)
+        ),
+    )
+
+    # --- 影院、影厅、座位（座位 id 按影厅连续分配，位置 p 的座位 id = 影厅起始 id + p） ---
+    from app.utils import seat_label
+
+    cinema_start = loader.next_id("cinemas")
+    loader.load(
+        "cinemas",
+        ("id", "name", "address", "city"),
+        ((cinema_start + i, f"影城 {i}", f"合成路 {i} 号", rng.choice(CITIES)) for i in range(args.cinemas)),
+    )
+    hall_start = loader.next_id("halls")
+    n_halls = args.cinemas * args.halls_per_cinema
+    capacity = args.hall_rows * args.hall_cols
+    loader.load(
+        "halls",
+        ("id", "cinema_id", "name", "rows", "cols"),
+        (
+            (hall_start + h, cinema_start + h // args.halls_per_cinema, f"{h % args.halls_per_cinema + 1}号厅",
+             args.hall_rows, args.hall_cols)
+            for h in range(n_halls)
+        ),
+    )
+    seat_start = loader.next_id("seats")
+    labels = [seat_label(r, c) for r in range(args.hall_rows) for c in range(args.hall_cols)]
+    positions = [(p // args.hall_cols, p % args.hall_cols) for p in range(capacity)]
+    loader.load(
+        "seats",
+        ("id", "hall_id", "row", "col", "label", "section", "zone"),
+        (
+            (seat_start + h * capacity + p, hall_start + h, positions[p][0], positions[p][1], labels[p], "", "")
+            for h in range(n_halls)
+            for p in range(capacity)
+        ),
+    )
+
+    # --- 场次：按影厅轮转排时间槽，同一影厅内不重叠 ---
+    show_start = loader.next_id("showtimes")
+    slots_per_hall = -(-args.showtimes // n_halls)
+    first_slot = now - timedelta(hours=SLOT_HOURS * (slots_per_hall // 3))  # 约三分之一是过去的场次
+    show_price = array("I", bytes(4 * args.showtimes))
+    show_time = []
+    movie_share = args.movies / max(args.movies + args.events, 1)
+
+    def showtime_rows():
+        for i in range(args.showtimes):
+            if args.events == 0 or (args.movies and rng.random() < movie_share):
+                kind, target = "movie", movie_start + rng.randrange(args.movies)
+            else:
+                j = rng.randrange(args.events)
+                kind, target = event_kinds[j], event_start + j
+            start = first_slot + timedelta(hours=SLOT_HOURS * (i // n_halls))
+            price = 3000 + rng.randrange(0, 9000, 100)
+            show_price[i] = price
+            show_time.append(start)
+            yield (show_start + i, target, kind, hall_start + i % n_halls, fmt_dt(start), price)
+
+    loader.load("showtimes", ("id", "target_id", "event_kind", "hall_id", "start_time", "price_cents"), showtime_rows())
+
+    # --- 用户 ---
+    user_start = loader.next_id("users")
+    loader.load(
+        "users",
+        ("id", "email", "name", "hashed_password", "is_admin", "is_active"),
+        ((user_start + i, f"user{i}@gen.example", f"用户{i}", hashed_password, 0, 1) for i in range(args.users)),
+    )
+
+    # --- 订单 + 订单座位：每个场次维护已售游标，座位不会重复 ---
+    cursor = array("I", bytes(4 * args.showtimes))
+    order_seat_start = loader.next_id("order_seats")
+    from app.config import ORDER_PAY_MINUTES
+
+    pay_window = timedelta(minutes=ORDER_PAY_MINUTES)
+
+    def order_rows():
+        seat_row_id = order_seat_start
+        for i in range(args.orders):
+            s = rng.randrange(args.showtimes)
+            k = rng.randint(1, args.max_seats_per_order)
+            r = rng.random()
+            status = "PAID" if r < 0.8 else ("CREATED" if r < 0.85 else "CANCELED")
+            if cursor[s] + k > capacity:
+                status = "CANCELED"  # 满场：记成取消单，不占座位
+            created = show_time[s] - timedelta(minutes=rng.randrange(14 * 24 * 60))
+            oid = seq_key(i, rng)
+            ticket = "%012X" % rng.getrandbits(48) if status == "PAID" else ""
+            children = []
+            if status != "CANCELED":
+                hall_base = seat_start + (s % n_halls) * capacity
+                for p in range(cursor[s], cursor[s] + k):
+                    children.append((seat_row_id, oid, show_start + s, hall_base + p))
+                    seat_row_id += 1
+                cursor[s] += k
+            deadline = fmt_dt(created + pay_window) if status == "CREATED" else None
+            yield (
+                (oid, user_start + rng.randrange(args.users), show_start + s, status, show_price[s] * k,
+                 ticket, fmt_dt(created), 0, deadline),
+                children,
+            )
+
+    loader.load_pair(
+        ("orders", ("id", "user_id", "showtime_id", "status", "total_cents", "ticket_code", "created_at", "quantity",
+                    "pay_deadline")),
+        ("order_seats", ("id", "order_id", "showtime_id", "seat_id")),
+        order_rows(),
+    )
+
+    # --- 有效锁座：只锁未来场次、游标之后的空座 ---
+    future = [i for i, t in enumerate(show_time) if t > now]
+    expires = fmt_dt(now + timedelta(days=1))
+    created = fmt_dt(now)
+    seat_hold_start = loader.next_id("seat_holds")
+
+    def hold_rows():
+        seat_row_id = seat_hold_start
+        for i in range(args.holds if future else 0):
+            s = rng.choice(future)
+            k = rng.randint(1, args.max_seats_per_order)
+            if cursor[s] + k > capacity:
+                continue
+            token = seq_key(i, rng)
+            uid = user_start + rng.randrange(args.users)
+            hall_base = seat_start + (s % n_halls) * capacity
+            children = []
+            for p in range(cursor[s], cursor[s] + k):
+                children.append((seat_row_id, token, show_start + s, hall_base + p, uid, expires))
+                seat_row_id += 1
+            cursor[s] += k
+            yield (token, uid, show_start + s, expires, created), children
+
+    loader.load_pair(
+        ("hold_groups", ("id", "user_id", "showtime_id", "expires_at", "created_at")),
+        ("seat_holds", ("id", "hold_group_id", "showtime_id", "seat_id", "user_id", "expires_at")),
+        hold_rows(),
+    )
+    return loader
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="生成大规模合成数据")
+    parser.add_argument("--db", required=True, help="SQLite 文件路径")
+    parser.add_argument("--force", action="store_true", help="文件已存在时删除重建")
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="small")
+    parser.add_argument("--movies", type=int)
+    parser.add_argument("--events", type=int)
+    parser.add_argument("--cinemas", type=int)
+    parser.add_argument("--halls-per-cinema", type=int)
+    parser.add_argument("--hall-rows", type=int, default=15)
+    parser.add_argument("--hall-cols", type=int, default=20)
+    parser.add_argument("--showtimes", type=int)
+    parser.add_argument("--users", type=int)
+    parser.add_argument("--orders", type=int)
+    parser.add_argument("--max-seats-per-order", type=int, default=4)
+    parser.add_argument("--holds", type=int, help="有效锁座组数")
+    parser.add_argument("--seed", type=int, default=20240601)
+    parser.add_argument("--batch", type=int, default=50_000)
+    args = parser.parse_args(argv)
+    for key, value in PRESETS[args.preset].items():
+        if getattr(args, key) is None:
+            setattr(args, key, value)
+    if args.showtimes and not (args.movies or args.events):
+        parser.error("有场次就至少要有一部电影或一个活动")
+    if args.users < 1:
+        parser.error("--users 至少为 1")
+
+    db_path = os.path.abspath(args.db)
+    if os.path.exists(db_path):
+        if not args.force:
+            parser.error(f"{db_path} 已存在，加 --force 覆盖")
+        for suffix in ("", "-wal", "-shm", "-journal"):
+            if os.path.exists(db_path + suffix):
+                os.unlink(db_path + suffix)
+
+    os.environ["DB_URL"] = f"sqlite:///{db_path}"
+    os.environ.setdefault("SQL_PROFILE", "0")
+    sys.path.insert(0, BACKEND_DIR)
+    from app.database import engine
+    from app.security import hash_pw
+    from app.seed import run_seed
+
+    t0 = time.perf_counter()
+    run_seed()  # 建表、版本号和基础种子数据，生成的库可以直接启动应用
+    engine.dispose()
+    hashed = hash_pw(PASSWORD)
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA locking_mode = EXCLUSIVE")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    conn.execute("PRAGMA cache_size = -262144")  # 256 MiB
+
+    print(f"生成到 {db_path}（seed={args.seed}）")
+    index_sql = drop_indexes(conn)
+    conn.execute("BEGIN")
+    loader = generate(conn, args, hashed)
+    conn.execute("COMMIT")
+
+    t_idx = time.perf_counter()
+    for sql in index_sql:
+        conn.execute(sql)
+    print(f"  重建 {len(index_sql)} 个索引 {time.perf_counter() - t_idx:8.1f}s", flush=True)
+    t_an = time.perf_counter()
+    conn.execute("ANALYZE")
+    print(f"  ANALYZE {time.perf_counter() - t_an:8.1f}s")
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.close()
+
+    # 订单绕过了应用写入，销售汇总按生成的订单重算
+    from app.database import SessionLocal
+    from app.reports import rebuild
+
+    with SessionLocal() as sess:
+        stats = rebuild(sess)
+        sess.commit()
+    print(f"  销售汇总 {stats['ms'] / 1000:8.1f}s")
+
+    rows = sum(n for _, n, _ in loader.report)
+    load_s = sum(s for _, _, s in loader.report)
+    print(
+        f"完成：共 {rows:,} 行，写入 {load_s:.1f}s（{rows / load_s if load_s else 0:,.0f} 行/秒），"
+        f"总耗时 {time.perf_counter() - t0:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""开售压测：大量用户同时抢同一场次的座位。
+
+在临时目录建一个全新的 SQLite 库（seed + 批量造用户），用 uvicorn 子进程启动应用，
+再用线程池模拟用户：登录 -> 拉座位图 -> 抢座（重叠座位，409 后刷新重试）-> 下单 -> 支付。
+结束后报告吞吐、各接口 p50/p95/p99、409 比例，并直接查库检查是否有一座多卖。
+只依赖标准库和 backend 本身，不需要任何外部服务。
+
+    cd backend
+    python tools/loadtest.py --users 5000 --concurrency 64
+    python tools/loadtest.py --users 500 --json result.json
+
+bcrypt 校验很慢（每次约 0.2 秒），5000 个用户全部走 /auth/login 会把压测变成测 bcrypt。
+默认只有 --login-ratio 比例的用户真实登录，其余用户直接用同一个 JWT_SECRET 签发令牌。
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = "loadtest123"
+JWT_SECRET = "loadtest-secret"
+
+
+def percentile(sorted_values, p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[k]
+
+
+class Recorder:
+    """按接口记录耗时和状态码，线程安全。"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = defaultdict(list)
+        self.status = defaultdict(Counter)
+        self.errors = Counter()
+
+    def add(self, name: str, status: int, ms: float) -> None:
+        with self.lock:
+            self.latency[name].append(ms)
+            self.status[name][status] += 1
+
+    def error(self, name: str, exc: Exception) -> None:
+        with self.lock:
+            self.errors[f"{name}: {type(exc).__name__}"] += 1
+
+    def summary(self, elapsed_s: float) -> dict:
+        routes = {}
+        total = 0
+        for name, values in self.latency.items():
+            values = sorted(values)
+            total += len(values)
+            routes[name] = {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 50), 2),
+                "p95_ms": round(percentile(values, 95), 2),
+                "p99_ms": round(percentile(values, 99), 2),
+                "max_ms": round(values[-1], 2),
+                "status": dict(sorted(self.status[name].items())),
+            }
+        return {
+            "elapsed_s": round(elapsed_s, 2),
+            "requests": total,
+            "throughput_rps": round(total / elapsed_s, 1) if elapsed_s else 0,
+            "routes": routes,
+            "errors": dict(self.errors),
+        }
+
+
+class Client:
+    """每个线程一条 keep-alive 连接。"""
+
+    _local = threading.local()
+
+    def __init__(self, port: int, recorder: Recorder):
+        self.port = port
+        self.recorder = recorder
+
+    def _conn(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=60)
+            self._local.conn = conn
+        return conn
+
+    def request(self, name: str, method: str, path: str, body=None, token: str | None = None):
+        headers = {"Content-Type": "application/json"}
+        if token:
+            headers["Authorization"] = f"Bearer {token}"
+        payload = json.dumps(body).encode() if body is not None else None
+        for attempt in range(2):
+            conn = self._conn()
+            start = time.perf_counter()
+            try:
+                conn.request(method, path, body=payload, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+            except (ConnectionError, http.client.HTTPException, socket.timeout) as exc:
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    self.recorder.error(name, exc)
+                    return 0, None
+                continue
+            self.recorder.add(name, resp.status, (time.perf_counter() - start) * 1000)
+            try:
+                return resp.status, json.loads(data) if data else None
+            except ValueError:
+                return resp.status, None
+        return 0, None
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def prepare_db(db_path: str, users: int) -> list[dict]:
+    """seed 后批量插入压测用户，返回 [{id, email, token}]。"""
+    os.environ["DB_URL"] = f"sqlite:///{db_path}"
+    os.environ["JWT_SECRET"] = JWT_SECRET
+    sys.path.insert(0, BACKEND_DIR)
+    from app.seed import run_seed
+    from app.security import hash_pw, make_jwt
+
+    run_seed()
+    hashed = hash_pw(PASSWORD)  # 所有压测用户共用一个哈希，bcrypt 只算一次
+    conn = sqlite3.connect(db_path)
+    with conn:
+        start_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM users").fetchone()[0] + 1
+        conn.executemany(
+            "INSERT INTO users (id, email, name, hashed_password, is_admin, is_active) VALUES (?, ?, ?, ?, 0, 1)",
+            [(start_id + i, f"load{i}@example.com", f"压测{i}", hashed) for i in range(users)],
+        )
+    conn.close()
+    out = []
+    for i in range(users):
+        u = SimpleNamespace(id=start_id + i, email=f"load{i}@example.com", is_admin=False)
+        out.append({"id": u.id, "email": u.email, "token": make_jwt(u)})
+    return out
+
+
+def start_server(db_path: str, port: int, workers: int, app_dir: str = BACKEND_DIR) -> subprocess.Popen:
+    env = dict(os.environ, DB_URL=f"sqlite:///{db_path}", JWT_SECRET=JWT_SECRET, AUTO_SEED="0")
+    cmd = [
+        sys.executable, "-m", "uvicorn", "app.main:app",
+        "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--workers", str(workers),
+    ]
+    proc = subprocess.Popen(cmd, cwd=app_dir, env=env)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"uvicorn 启动失败，退出码 {proc.returncode}")
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/movies")
+            if conn.getresponse().status == 200:
+                return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise SystemExit("uvicorn 30 秒内没有就绪")
+
+
+def create_showtime(client: Client, admin_token: str, hall_id: int) -> int:
+    status, body = client.request(
+        "admin",
+        "POST",
+        "/admin/showtimes",
+        {"target_id": 1, "event_kind": "movie", "hall_id": hall_id,
+         "start_time": "2099-01-01T12:00:00Z", "price_cents": 4500},
+        admin_token,
+    )
+    if status != 200:
+        raise SystemExit(f"创建压测场次失败: {status} {body}")
+    return body["id"]
+
+
+def pick_seats(seat_map: list[dict], k: int, rng: random.Random) -> list[int]:
+    """从可选座位里挑 k 个相邻的，偏向中间位置，让大家抢同一片座位。"""
+    available = [s for s in seat_map if s["state"] == "AVAILABLE"]
+    if not available:
+        return []
+    k = min(k, len(available))
+    center = rng.triangular(0, len(available) - k, (len(available) - k) / 2)
+    start = int(center)
+    return [s["seat_id"] for s in available[start:start + k]]
+
+
+def user_flow(client: Client, user: dict, args, showtime_id: int, rng: random.Random, sold: dict) -> str:
+    token = user["token"]
+    if rng.random() < args.login_ratio:
+        status, body = client.request("login", "POST", "/auth/login", {"email": user["email"], "password": PASSWORD})
+        if status != 200:
+            return "login_failed"
+        token = body["access_token"]
+
+    for _ in range(args.retries + 1):
+        status, seat_map = client.request("seats", "GET", f"/showtimes/{showtime_id}/seats")
+        if status != 200:
+            return "seats_failed"
+        seat_ids = pick_seats(seat_map, rng.randint(1, args.max_seats), rng)
+        if not seat_ids:
+            return "sold_out"
+        status, hold = client.request("hold", "POST", f"/showtimes/{showtime_id}/hold", {"seat_ids": seat_ids}, token)
+        if status == 409:
+            continue
+        if status != 200:
+            return f"hold_{status}"
+
+        status, order = client.request("checkout", "POST", "/orders/checkout", {"hold_token": hold["hold_token"]}, token)
+        if status != 200:
+            return f"checkout_{status}"
+        if rng.random() >= args.pay_ratio:
+            return "unpaid"
+        status, paid = client.request("pay", "POST", f"/orders/{order['id']}/mock_pay", token=token)
+        if status != 200:
+            return f"pay_{status}"
+        with client.recorder.lock:
+            for label in paid["seats"]:
+                sold[label].append(user["id"])
+        return "paid"
+    return "gave_up"
+
+
+def check_db(db_path: str, showtime_id: int) -> dict:
+    conn = sqlite3.connect(db_path)
+    dup = conn.execute(
+        """
+        SELECT os.seat_id, COUNT(*) FROM order_seats os JOIN orders o ON o.id = os.order_id
+        WHERE os.showtime_id = ? AND o.status IN ('CREATED', 'PAID')
+        GROUP BY os.seat_id HAVING COUNT(*) > 1
+        """,
+        (showtime_id,),
+    ).fetchall()
+    capacity = conn.execute(
+        "SELECT COUNT(*) FROM seats WHERE hall_id = (SELECT hall_id FROM showtimes WHERE id = ?)", (showtime_id,)
+    ).fetchone()[0]
+    taken = conn.execute("SELECT COUNT(*) FROM order_seats WHERE showtime_id = ?", (showtime_id,)).fetchone()[0]
+    paid = conn.execute(
+        "SELECT COUNT(*) FROM order_seats os JOIN orders o ON o.id = os.order_id "
+        "WHERE os.showtime_id = ? AND o.status = 'PAID'",
+        (showtime_id,),
+    ).fetchone()[0]
+    # 分区计数器与真实数据的偏差（计数器未初始化时为空）
+    counter_sold = conn.execute(
+        "SELECT SUM(sold) FROM section_counters WHERE showtime_id = ?", (showtime_id,)
+    ).fetchone()[0]
+    conn.close()
+    return {
+        "capacity": capacity,
+        "seats_taken": taken,
+        "seats_paid": paid,
+        "double_sold_seats": len(dup),
+        "oversold": max(taken - capacity, 0),
+        "section_counter_drift": None if counter_sold is None else counter_sold - taken,
+    }
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="开售抢座压测")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--hall-id", type=int, default=2, help="seed 里的影厅，2 号厅 140 座")
+    parser.add_argument("--max-seats", type=int, default=4, help="每人最多抢几个座")
+    parser.add_argument("--retries", type=int, default=3, help="锁座 409 后刷新重试次数")
+    parser.add_argument("--login-ratio", type=float, default=0.02, help="真实走 /auth/login 的用户比例")
+    parser.add_argument("--pay-ratio", type=float, default=0.9, help="下单后继续支付的比例")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker 数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="保留临时数据库目录")
+    parser.add_argument("--json", help="把结果另存为 JSON")
+    args = parser.parse_args(argv)
+
+    tmp = tempfile.mkdtemp(prefix="ticket-loadtest-")
+    db_path = os.path.join(tmp, "loadtest.db")
+    print(f"准备数据库 {db_path}，用户数 {args.users} ...")
+    users = prepare_db(db_path, args.users)
+
+    port = free_port()
+    proc = start_server(db_path, port, args.workers)
+    recorder = Recorder()
+    client = Client(port, recorder)
+    try:
+        status, body = client.request("login", "POST", "/auth/login", {"email": "admin@example.com", "password": "admin123"})
+        showtime_id = create_showtime(client, body["access_token"], args.hall_id)
+        recorder = client.recorder = Recorder()  # 准备阶段的请求不计入结果
+
+        sold = defaultdict(list)
+        outcomes = Counter()
+        master = random.Random(args.seed)
+        seeds = [master.random() for _ in users]
+        print(f"场次 {showtime_id}，并发 {args.concurrency}，开始压测 ...")
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            for outcome in pool.map(
+                lambda pair: user_flow(client, pair[0], args, showtime_id, random.Random(pair[1]), sold),
+                zip(users, seeds),
+            ):
+                outcomes[outcome] += 1
+        elapsed = time.perf_counter() - t0
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+
+    result = recorder.summary(elapsed)
+    result["showtime_id"] = showtime_id
+    result["outcomes"] = dict(outcomes.most_common())
+    holds = recorder.status.get("hold", Counter())
+    result["hold_409_rate"] = round(holds[409] / sum(holds.values()), 4) if holds else 0
+    result["client_double_sold"] = {label: ids for label, ids in sold.items() if len(ids) > 1}
+    result["db_check"] = check_db(db_path, showtime_id)
+
+    print(f"\n用时 {result['elapsed_s']}s，请求 {result['requests']}，吞吐 {result['throughput_rps']} req/s")
+    print(f"{'route':10} {'count':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  status")
+    for name, r in sorted(result["routes"].items()):
+        print(
+            f"{name:10} {r['count']:7d} {r['p50_ms']:8.1f} {r['p95_ms']:8.1f} {r['p99_ms']:8.1f} "
+            f"{r['max_ms']:8.1f}  {r['status']}"
+        )
+    print(f"锁座 409 比例: {result['hold_409_rate']:.1%}")
+    print(f"用户结果: {result['outcomes']}")
+    if result["errors"]:
+        print(f"连接错误: {result['errors']}")
+    check = result["db_check"]
+    print(f"库内核对: {check}")
+    violations = check["double_sold_seats"] + check["oversold"] + len(result["client_double_sold"])
+    print("一座多卖: " + ("无" if not violations else f"发现 {violations} 处！"))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if not args.keep:
+        for name in os.listdir(tmp):
+            os.unlink(os.path.join(tmp, name))
+        os.rmdir(tmp)
+    else:
+        print(f"数据库保留在 {db_path}")
+    if violations:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+"""热点路径的微基准：直接调用处理函数（不走 HTTP），在可调规模的合成数据上计时。
+
+覆盖 showtime_seats、hold_seats、checkout、list_orders、get_event_showtimes、
+cleanup_expired_holds。每个基准用自己的场次，互不干扰；数据集由参数和随机种子唯一决定。
+
+    cd backend
+    python tools/microbench.py --save tools/microbench_baseline.json
+    # 改完代码后对比，任一基准中位数变慢超过 --threshold 即退出码 1
+    python tools/microbench.py --compare tools/microbench_baseline.json
+
+对比时两次的数据集参数应一致，不一致会提示。
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DATASET_PARAMS = ("hall_rows", "hall_cols", "holds", "orders", "showtimes", "hold_size", "seed")
+
+
+def summarize(samples_ms: list[float]) -> dict:
+    samples = sorted(samples_ms)
+    return {
+        "median_ms": round(statistics.median(samples), 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        "min_ms": round(samples[0], 4),
+        "runs": len(samples),
+    }
+
+
+class Dataset:
+    """在临时 SQLite 库里按参数造数据。"""
+
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.now = datetime.utcnow()
+
+        from sqlalchemy import insert, select
+
+        from app.database import SessionLocal
+        from app.models import Cinema, Hall, Movie, Order, OrderSeat, Seat, Showtime, User
+        from app.seed import run_seed
+        from app.utils import seat_label
+
+        run_seed()
+        self.SessionLocal = SessionLocal
+        with SessionLocal() as sess:
+            cinema_id = sess.scalar(select(Cinema.id).limit(1))
+            hall = Hall(cinema_id=cinema_id, name="bench", rows=args.hall_rows, cols=args.hall_cols)
+            sess.add(hall)
+            movie = Movie(title="bench", duration_min=120)
+            sess.add(movie)
+            users = [User(email=f"bench{i}@example.com", name=f"bench{i}", hashed_password="-") for i in range(2)]
+            sess.add_all(users)
+            sess.flush()
+            self.hall_id, self.movie_id = hall.id, movie.id
+            self.user_id, self.other_user_id = users[0].id, users[1].id
+
+            sess.execute(
+                insert(Seat),
+                [
+                    {"hall_id": hall.id, "row": r, "col": c, "label": seat_label(r, c)}
+                    for r in range(args.hall_rows)
+                    for c in range(args.hall_cols)
+                ],
+            )
+            self.seat_ids = list(sess.scalars(select(Seat.id).where(Seat.hall_id == hall.id).order_by(Seat.id)))
+
+            def new_showtime(offset_min: int) -> int:
+                return sess.scalar(
+                    insert(Showtime)
+                    .values(
+                        target_id=movie.id,
+                        event_kind="movie",
+                        hall_id=hall.id,
+                        start_time=self.now + timedelta(days=30, minutes=offset_min),
+                        price_cents=4500,
+                    )
+                    .returning(Showtime.id)
+                )
+
+            # 每个基准单独一个场次，各自带 --holds 个其他用户的有效锁座
+            self.showtimes = {}
+            for i, name in enumerate(("seats", "hold", "checkout", "cleanup")):
+                sid = new_showtime(i * 240)
+                self.showtimes[name] = sid
+                self._add_holds(sess, sid, self.rng.sample(self.seat_ids, args.holds), expired=False)
+
+            # get_event_showtimes：同一部电影再排 --showtimes 场
+            for i in range(args.showtimes):
+                new_showtime(10000 + i * 240)
+
+            # list_orders：用户有 --orders 个订单，每单 2 座，按需要铺到多个历史场次上
+            per_show = len(self.seat_ids) // 2
+            order_rows, order_seat_rows = [], []
+            show_id = None
+            for i in range(args.orders):
+                if i % per_show == 0:
+                    show_id = new_showtime(-100000 - i)
+                oid = uuid.UUID(int=self.rng.getrandbits(128)).hex
+                order_rows.append(
+                    {"id": oid, "user_id": self.user_id, "showtime_id": show_id, "status": "PAID",
+                     "total_cents": 9000, "ticket_code": "", "created_at": self.now - timedelta(minutes=i), "quantity": 0}
+                )
+                k = i % per_show
+                for seat_id in self.seat_ids[2 * k:2 * k + 2]:
+                    order_seat_rows.append({"order_id": oid, "showtime_id": show_id, "seat_id": seat_id})
+            if order_rows:
+                sess.execute(insert(Order), order_rows)
+                sess.execute(insert(OrderSeat), order_seat_rows)
+            sess.commit()
+
+    def _add_holds(self, sess, showtime_id: int, seat_ids, expired: bool) -> None:
+        from sqlalchemy import insert
+
+        from app.models import HoldGroup, SeatHold
+
+        expires_at = self.now + (timedelta(minutes=-5) if expired else timedelta(days=1))
+        groups, holds = [], []
+        for seat_id in seat_ids:
+            token = uuid.UUID(int=self.rng.getrandbits(128)).hex
+            groups.append({"id": token, "user_id": self.other_user_id, "showtime_id": showtime_id, "expires_at": expires_at})
+            holds.append(
+                {"hold_group_id": token, "showtime_id": showtime_id, "seat_id": seat_id,
+                 "user_id": self.other_user_id, "expires_at": expires_at}
+            )
+        if groups:
+            sess.execute(insert(HoldGroup), groups)
+            sess.execute(insert(SeatHold), holds)
+
+    def free_seats(self, showtime_id: int) -> list[int]:
+        from sqlalchemy import select
+
+        from app.models import OrderSeat, SeatHold
+
+        with self.SessionLocal() as sess:
+            taken = set(sess.scalars(select(SeatHold.seat_id).where(SeatHold.showtime_id == showtime_id)))
+            taken |= set(sess.scalars(select(OrderSeat.seat_id).where(OrderSeat.showtime_id == showtime_id)))
+        return [s for s in self.seat_ids if s not in taken]
+
+
+def _timed(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return (time.perf_counter() - t0) * 1000
+
+
+def bench_showtime_seats(ds: Dataset, repeat: int) -> list[float]:
+    from app.routers.seats import showtime_seats
+
+    sid = ds.showtimes["seats"]
+    out = []
+    for _ in range(repeat):
+        with ds.SessionLocal() as sess:
+            out.append(_timed(lambda: showtime_seats(sid, sess)))
+    return out
+
+
+def bench_hold_seats(ds: Dataset, repeat: int) -> list[float]:
+    from app.models import User
+    from app.routers.holds import hold_seats
+    from app.schemas import HoldIn
+
+    sid = ds.showtimes["hold"]
+    free = ds.free_seats(sid)
+    size = ds.args.hold_size
+    out = []
+    for i in range(repeat):
+        body = HoldIn(seat_ids=free[i * size:(i + 1) * size])
+        with ds.SessionLocal() as sess:
+            u = sess.get(User, ds.user_id)
+            out.append(_timed(lambda: hold_seats(sid, body, sess, u)))
+    return out
+
+
+def bench_checkout(ds: Dataset, repeat: int) -> list[float]:
+    from app.models import User
+    from app.routers.holds import hold_seats
+    from app.routers.orders import checkout
+    from app.schemas import CheckoutIn, HoldIn
+
+    sid = ds.showtimes["checkout"]
+    free = ds.free_seats(sid)
+    size = ds.args.hold_size
+    tokens = []
+    for i in range(repeat):  # 锁座不计时
+        with ds.SessionLocal() as sess:
+            u = sess.get(User, ds.user_id)
+            tokens.append(hold_seats(sid, HoldIn(seat_ids=free[i * size:(i + 1) * size]), sess, u).hold_token)
+    out = []
+    for token in tokens:
+        with ds.SessionLocal() as sess:
+            u = sess.get(User, ds.user_id)
+            out.append(_timed(lambda: checkout(CheckoutIn(hold_token=token), sess, u)))
+    return out
+
+
+def bench_list_orders(ds: Dataset, repeat: int) -> list[float]:
+    from app.models import User
+    from app.routers.orders import list_orders
+
+    out = []
+    for _ in range(repeat):
+        with ds.SessionLocal() as sess:
+            u = sess.get(User, ds.user_id)
+            out.append(_timed(lambda: list_orders(sess, u)))
+    return out
+
+
+def bench_get_event_showtimes(ds: Dataset, repeat: int) -> list[float]:
+    from app.routers.events import get_event_showtimes
+
+    out = []
+    for _ in range(repeat):
+        with ds.SessionLocal() as sess:
+            out.append(_timed(lambda: get_event_showtimes(ds.movie_id, sess, "movie")))
+    return out
+
+
+def bench_cleanup_expired_holds(ds: Dataset, repeat: int) -> list[float]:
+    from app.utils import cleanup_expired_holds
+
+    sid = ds.showtimes["cleanup"]
+    free = ds.free_seats(sid)
+    n = min(ds.args.holds, len(free))
+    out = []
+    for _ in range(repeat):
+        with ds.SessionLocal() as sess:
+            ds._add_holds(sess, sid, free[:n], expired=True)  # 每轮重新造过期锁座，不计时
+            sess.commit()
+
+            def run():
+                cleanup_expired_holds(sess, showtime_id=sid)
+                sess.commit()
+
+            out.append(_timed(run))
+    return out
+
+
+BENCHMARKS = {
+    "showtime_seats": bench_showtime_seats,
+    "hold_seats": bench_hold_seats,
+    "checkout": bench_checkout,
+    "list_orders": bench_list_orders,
+    "get_event_showtimes": bench_get_event_showtimes,
+    "cleanup_expired_holds": bench_cleanup_expired_holds,
+}
+
+
+# 只读基准可以先空跑几次预热；写入类的每跑一次都会消耗座位
+READ_ONLY = {"showtime_seats", "list_orders", "get_event_showtimes"}
+
+
+def compare(current: dict, baseline: dict, threshold: float, noise_ms: float) -> list[str]:
+    """返回变慢的基准名。中位数比基线慢 threshold 以上、且绝对差超过 noise_ms 才算。"""
+    base_params = baseline.get("params", {})
+    cur_params = current["params"]
+    diff = {k: (base_params.get(k), cur_params.get(k)) for k in DATASET_PARAMS if base_params.get(k) != cur_params.get(k)}
+    if diff:
+        print(f"注意：数据集参数与基线不同 {diff}，对比结果仅供参考")
+
+    regressions = []
+    print(f"\n{'benchmark':24} {'base ms':>10} {'now ms':>10} {'change':>9}")
+    for name, cur in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if base is None:
+            print(f"{name:24} {'-':>10} {cur['median_ms']:10.3f} {'new':>9}")
+            continue
+        b, c = base["median_ms"], cur["median_ms"]
+        change = (c - b) / b if b else 0.0
+        flag = ""
+        if change > threshold and c - b > noise_ms:
+            regressions.append(name)
+            flag = "  <-- 变慢"
+        print(f"{name:24} {b:10.3f} {c:10.3f} {change:+8.1%}{flag}")
+    return regressions
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="热点路径微基准")
+    parser.add_argument("--hall-rows", type=int, default=20)
+    parser.add_argument("--hall-cols", type=int, default=30)
+    parser.add_argument("--holds", type=int, default=100, help="每个场次预置的他人锁座数")
+    parser.add_argument("--orders", type=int, default=50, help="压测用户的历史订单数")
+    parser.add_argument("--showtimes", type=int, default=100, help="同一部电影的场次数")
+    parser.add_argument("--hold-size", type=int, default=2, help="每次锁几个座")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", nargs="*", choices=sorted(BENCHMARKS), help="只跑这些基准")
+    parser.add_argument("--save", help="结果写入 JSON（作为新基线）")
+    parser.add_argument("--compare", help="与基线 JSON 对比")
+    parser.add_argument("--threshold", type=float, default=0.2, help="中位数变慢超过这个比例算退化")
+    parser.add_argument("--noise-ms", type=float, default=0.05, help="绝对差小于这个值不算退化")
+    args = parser.parse_args(argv)
+
+    capacity = args.hall_rows * args.hall_cols
+    if args.holds + args.repeat * args.hold_size > capacity:
+        parser.error(f"影厅只有 {capacity} 座，放不下 --holds + --repeat * --hold-size 个锁座")
+
+    tmp = tempfile.mkdtemp(prefix="ticket-microbench-")
+    db_path = os.path.join(tmp, "bench.db")
+    os.environ["DB_URL"] = f"sqlite:///{db_path}"
+    os.environ.setdefault("SQL_PROFILE", "0")
+    sys.path.insert(0, BACKEND_DIR)
+
+    import sqlalchemy
+
+    t0 = time.perf_counter()
+    ds = Dataset(args)
+    print(f"数据集就绪（{(time.perf_counter() - t0) * 1000:.0f} ms）：{db_path}")
+
+    results = {}
+    for name, fn in BENCHMARKS.items():
+        if args.only and name not in args.only:
+            continue
+        if name in READ_ONLY:
+            fn(ds, 2)  # 预热进程内缓存（价格数组、语句编译缓存）
+        results[name] = summarize(fn(ds, args.repeat))
+        r = results[name]
+        print(f"{name:24} median {r['median_ms']:8.3f} ms  p95 {r['p95_ms']:8.3f} ms  min {r['min_ms']:8.3f} ms")
+
+    current = {
+        "params": {k: getattr(args, k) for k in (*DATASET_PARAMS, "repeat")},
+        "env": {"python": platform.python_version(), "sqlalchemy": sqlalchemy.__version__, "machine": platform.machine()},
+        "created_at": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "results": results,
+    }
+
+    regressions = []
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(current, json.load(f), args.threshold, args.noise_ms)
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(current, f, ensure_ascii=False, indent=2)
+        print(f"已保存到 {args.save}")
+
+    shutil.rmtree(tmp, ignore_errors=True)
+    if regressions:
+        print(f"\n性能退化: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+"""回放 app/capture.py 录下的流量，对比延迟分布和返回结果。
+
+录制：线上设 CAPTURE_PATH=/var/log/ticket/capture.ndjson（可配 CAPTURE_SAMPLE 抽样），
+同时留一份当时的数据库快照。回放：
+
+    cd backend
+    # 拷一份快照起本地实例，按原速回放
+    python tools/replay.py capture.ndjson --db snapshot.db --json before.json
+    # 换成另一个版本的代码（另一个 worktree），10 倍速回放并和上次对比
+    python tools/replay.py capture.ndjson --db snapshot.db --app-dir ../../other/backend --speed 10 \\
+        --json after.json --compare before.json
+    # 打已经在跑的实例（令牌用该实例的 JWT_SECRET 签）
+    python tools/replay.py capture.ndjson --url http://127.0.0.1:8000 --jwt-secret dev-secret-change-me
+
+回放规则：
+- 按录制时间间隔 / --speed 发请求，--speed 0 表示不等待。同一用户的请求（包括录制时
+  认出用户的注册、登录）严格按录制顺序串行，上一个返回才发下一个；不同用户并发，
+  并发上限 --concurrency。
+- 令牌按录制里的用户 id 用目标实例的密钥重新签发；录成 invalid 的发一个无效令牌。
+- 录制时新生成的订单号、锁座令牌，回放时换成新返回的值再填进后续请求的路径、参数和请求体。
+  自增 id 不替换：每次都从同一份快照开始，顺序一致时自增 id 本身就一致。
+- 被脱敏的密码用 --password 填回（批量造的测试用户密码相同），不给就跳过这些请求；
+  超长请求体、表单登录也跳过，汇总里列出跳过原因。
+
+--concurrency 1 --speed 0 时请求顺序完全确定，两次回放的状态码应当逐条一致；
+并发回放下不同用户之间的先后会有出入，抢同一批座位的结果可能不同。
+"""
+import argparse
+import base64
+import http.client
+import json
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from jose import jwt
+
+from loadtest import JWT_SECRET as LOADTEST_JWT_SECRET
+from loadtest import free_port, percentile, start_server
+
+REDACTED = "<redacted>"
+
+
+def load_capture(path: str) -> list[dict]:
+    records = []
+    bad = 0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                bad += 1  # 进程被杀时最后一行可能不完整
+    if bad:
+        print(f"忽略 {bad} 行无法解析的记录", file=sys.stderr)
+    records.sort(key=lambda r: r["t"])  # 多个 worker 写同一文件，按时间重排
+    return records
+
+
+class IdMap:
+    """录制时的 id -> 回放时的 id。"""
+
+    def __init__(self):
+        self._map: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def learn(self, old: dict, new: dict) -> None:
+        with self._lock:
+            for key, value in old.items():
+                if isinstance(new.get(key), str):
+                    self._map[value] = new[key]
+
+    def path(self, path: str) -> str:
+        return "/".join(self._map.get(part, part) for part in path.split("/"))
+
+    def query(self, query: str) -> str:
+        if not query:
+            return query
+        parts = []
+        for pair in query.split("&"):
+            key, eq, value = pair.partition("=")
+            parts.append(f"{key}{eq}{self._map.get(value, value)}")
+        return "&".join(parts)
+
+    def body(self, value, password: str | None):
+        if isinstance(value, dict):
+            return {k: self.body(v, password) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self.body(v, password) for v in value]
+        if value == REDACTED:
+            return password
+        if isinstance(value, str):
+            return self._map.get(value, value)
+        return value
+
+
+class Target:
+    """每个线程一条 keep-alive 连接。"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._local = threading.local()
+
+    def send(self, method: str, url: str, body: bytes | None, headers: dict) -> tuple[int, bytes, float]:
+        for attempt in range(2):
+            conn = getattr(self._local, "conn", None)
+            if conn is None:
+                conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            start = time.perf_counter()
+            try:
+                conn.request(method, url, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+            except (ConnectionError, http.client.HTTPException, socket.timeout):
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    return 0, b"", (time.perf_counter() - start) * 1000
+                continue
+            return resp.status, data, (time.perf_counter() - start) * 1000
+        return 0, b"", 0.0
+
+
+class Replayer:
+    def __init__(self, target: Target, records: list[dict], args):
+        self.target = target
+        self.records = records
+        self.speed = args.speed
+        self.password = args.password
+        self.jwt_secret = args.jwt_secret
+        self.ids = IdMap()
+        self.tokens: dict[int, str] = {}
+        self.results: list[tuple | None] = [None] * len(records)
+        self.skipped = Counter()
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(max_workers=args.concurrency)
+        # 同一用户正在执行时，后到的请求排在这里
+        self.pending: dict[object, deque] = defaultdict(deque)
+        self.busy: set = set()
+
+    def token(self, user) -> str:
+        if user == "invalid":
+            return "invalid"
+        with self.lock:
+            tok = self.tokens.get(user)
+            if tok is None:
+                now = int(time.time())
+                tok = self.tokens[user] = jwt.encode(
+                    {"sub": str(user), "iat": now, "exp": now + 3600 * 24}, self.jwt_secret, algorithm="HS256"
+                )
+        return tok
+
+    def prepare(self, rec: dict) -> tuple[bytes | None, dict] | str:
+        """返回 (body, headers)，不能回放时返回跳过原因。"""
+        if "bl" in rec:
+            return "body_truncated"
+        headers = {}
+        if rec.get("ct"):
+            headers["Content-Type"] = rec["ct"]
+        if rec.get("u") is not None:
+            headers["Authorization"] = f"Bearer {self.token(rec['u'])}"
+        if "b64" in rec:
+            return base64.b64decode(rec["b64"]), headers
+        body = rec.get("b")
+        if body is None:
+            return None, headers
+        if body == REDACTED:
+            return "redacted_form"
+        if "json" in rec.get("ct", ""):
+            data = json.loads(body)
+            if REDACTED in body and self.password is None:
+                return "redacted_password"
+            return json.dumps(self.ids.body(data, self.password)).encode(), headers
+        return body.encode(), headers
+
+    def execute(self, index: int, due: float) -> None:
+        rec = self.records[index]
+        prepared = self.prepare(rec)
+        if isinstance(prepared, str):
+            with self.lock:
+                self.skipped[prepared] += 1
+            return
+        body, headers = prepared
+        url = self.ids.path(rec["p"])
+        query = self.ids.query(rec.get("q", ""))
+        if query:
+            url = f"{url}?{query}"
+        lag_ms = max(0.0, (time.perf_counter() - due) * 1000) if self.speed > 0 else 0.0
+        status, data, ms = self.target.send(rec["m"], url, body, headers)
+        if rec.get("ids") and 200 <= status < 300:
+            try:
+                new = json.loads(data)
+            except ValueError:
+                new = None
+            if isinstance(new, dict):
+                self.ids.learn(rec["ids"], new)
+        self.results[index] = (status, ms, lag_ms)
+
+    def chain(self, key, index: int, due: float) -> None:
+        while True:
+            try:
+                self.execute(index, due)
+            except Exception as exc:  # 一条出错不影响后面的回放
+                print(f"第 {index} 条回放出错: {exc!r}", file=sys.stderr)
+            with self.lock:
+                if not self.pending[key]:
+                    self.busy.discard(key)
+                    del self.pending[key]
+                    return
+                index, due = self.pending[key].popleft()
+
+    def run(self) -> float:
+        if not self.records:
+            return 0.0
+        t0 = self.records[0]["t"]
+        start = time.perf_counter()
+        for index, rec in enumerate(self.records):
+            due = start + (rec["t"] - t0) / self.speed if self.speed > 0 else start
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            user = rec.get("u")
+            if user is None:
+                user = rec.get("as")
+            # 匿名请求之间没有先后依赖，各自一条链
+            key = user if user is not None else ("anon", index)
+            with self.lock:
+                if key in self.busy:
+                    self.pending[key].append((index, due))
+                    continue
+                self.busy.add(key)
+            self.pool.submit(self.chain, key, index, due)
+        self.pool.shutdown(wait=True)
+        return time.perf_counter() - start
+
+
+def summarize(records: list[dict], results: list, skipped: Counter, elapsed_s: float) -> dict:
+    replay_ms = defaultdict(list)
+    recorded_ms = defaultdict(list)
+    status = defaultdict(Counter)
+    matched = Counter()
+    lags = []
+    statuses = []
+    for rec, res in zip(records, results):
+        if res is None:
+            statuses.append(None)
+            continue
+        name = f"{rec['m']} {rec['r']}"
+        code, ms, lag_ms = res
+        statuses.append(code)
+        replay_ms[name].append(ms)
+        recorded_ms[name].append(rec["ms"])
+        status[name][code] += 1
+        matched[name] += code == rec["s"]
+        lags.append(lag_ms)
+
+    def dist(values):
+        values = sorted(values)
+        return {f"p{p}_ms": round(percentile(values, p), 2) for p in (50, 95, 99)}
+
+    routes = {}
+    for name in sorted(replay_ms):
+        n = len(replay_ms[name])
+        routes[name] = {
+            "count": n,
+            "replay": dist(replay_ms[name]),
+            "recorded": dist(recorded_ms[name]),
+            "status": {str(k): v for k, v in sorted(status[name].items())},
+            "status_match": round(matched[name] / n, 4),
+        }
+    sent = len(lags)
+    lags.sort()
+    return {
+        "elapsed_s": round(elapsed_s, 2),
+        "records": len(records),
+        "sent": sent,
+        "skipped": dict(skipped),
+        "status_match": round(sum(matched.values()) / sent, 4) if sent else 0.0,
+        "lag_p50_ms": round(percentile(lags, 50), 2),
+        "lag_p99_ms": round(percentile(lags, 99), 2),
+        "routes": routes,
+        "statuses": statuses,
+    }
+
+
+def _pct(new: float, old: float) -> str:
+    return f"{(new - old) / old * 100:+.0f}%" if old else "-"
+
+
+def print_summary(result: dict) -> None:
+    print(
+        f"\n回放 {result['sent']}/{result['records']} 条，用时 {result['elapsed_s']}s，"
+        f"状态码与录制一致 {result['status_match']:.1%}，发送滞后 p50 {result['lag_p50_ms']}ms / "
+        f"p99 {result['lag_p99_ms']}ms"
+    )
+    if result["skipped"]:
+        print("跳过:", ", ".join(f"{k} {v}" for k, v in sorted(result["skipped"].items())))
+    print(f"\n{'接口':<48} {'次数':>6} {'回放 p50/p95/p99 ms':>24} {'录制 p50/p95/p99 ms':>24} {'一致':>7}")
+    for name, r in result["routes"].items():
+        rp, rc = r["replay"], r["recorded"]
+        print(
+            f"{name:<48} {r['count']:>6} "
+            f"{rp['p50_ms']:>8}/{rp['p95_ms']}/{rp['p99_ms']:<8} "
+            f"{rc['p50_ms']:>8}/{rc['p95_ms']}/{rc['p99_ms']:<8} {r['status_match']:>7.1%}"
+        )
+
+
+def print_compare(result: dict, baseline: dict) -> None:
+    print(f"\n与基线对比（基线 -> 本次）")
+    print(f"{'接口':<48} {'p50':>20} {'p95':>20} {'p99':>20}")
+    for name, r in result["routes"].items():
+        b = baseline["routes"].get(name)
+        if b is None:
+            print(f"{name:<48} 基线中没有")
+            continue
+        cells = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            old, new = b["replay"][key], r["replay"][key]
+            cells.append(f"{old}->{new} {_pct(new, old)}")
+        print(f"{name:<48} {cells[0]:>20} {cells[1]:>20} {cells[2]:>20}")
+
+    old_statuses = baseline.get("statuses", [])
+    if len(old_statuses) != len(result["statuses"]):
+        print("\n两次回放的录制文件不同，不逐条比较状态码")
+        return
+    diffs = Counter()
+    for old, new in zip(old_statuses, result["statuses"]):
+        if old is not None and new is not None and old != new:
+            diffs[(old, new)] += 1
+    if diffs:
+        print("\n状态码不一致的请求（基线 -> 本次）:", ", ".join(f"{o}->{n} x{c}" for (o, n), c in diffs.most_common()))
+    else:
+        print("\n所有请求的状态码与基线一致")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="回放录制的流量")
+    parser.add_argument("capture", help="CAPTURE_PATH 录下的 NDJSON 文件")
+    where = parser.add_mutually_exclusive_group(required=True)
+    where.add_argument("--db", help="数据库快照；拷一份到临时目录后起本地实例")
+    where.add_argument("--url", help="直接打已经在跑的实例，如 http://127.0.0.1:8000")
+    parser.add_argument("--app-dir", default=None, help="用 --db 时从这个 backend 目录启动（对比不同版本）")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker 数")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速，0 表示不等待")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--jwt-secret", default=None, help="--url 时目标实例的 JWT_SECRET")
+    parser.add_argument("--password", default=None, help="填回被脱敏的密码")
+    parser.add_argument("--json", help="把结果另存为 JSON")
+    parser.add_argument("--compare", help="和之前 --json 保存的结果对比")
+    args = parser.parse_args(argv)
+
+    records = load_capture(args.capture)
+    print(f"读取 {len(records)} 条录制记录")
+
+    proc = None
+    tmp = None
+    if args.db:
+        tmp = tempfile.mkdtemp(prefix="ticket-replay-")
+        db_path = os.path.join(tmp, "replay.db")
+        shutil.copyfile(args.db, db_path)
+        port = free_port()
+        kwargs = {"app_dir": os.path.abspath(args.app_dir)} if args.app_dir else {}
+        proc = start_server(db_path, port, args.workers, **kwargs)
+        host = "127.0.0.1"
+        args.jwt_secret = LOADTEST_JWT_SECRET
+    else:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+        if args.jwt_secret is None:
+            args.jwt_secret = os.getenv("JWT_SECRET", "dev-secret-change-me")
+
+    try:
+        replayer = Replayer(Target(host, port), records, args)
+        elapsed = replayer.run()
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=10)
+        if tmp is not None:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    result = summarize(records, replayer.results, replayer.skipped, elapsed)
+    print_summary(result)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print_compare(result, json.load(f))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
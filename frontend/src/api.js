@@ -14,7 +14,9 @@ export function clearToken() {
 
 export const api = axios.create({
     baseURL: API_BASE,
-    timeout: 15000
+    timeout: 15000,
+    // 带上后端种的 rw_at cookie：刚写过的读请求走主库（read-your-writes）
+    withCredentials: true
 });
 
 api.interceptors.request.use((config) => {